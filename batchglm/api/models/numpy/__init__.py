@@ -1 +1,3 @@
 from . import glm_nb
+from . import glm_norm
+from . import glm_beta
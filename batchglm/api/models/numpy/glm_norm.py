@@ -0,0 +1,2 @@
+from batchglm.models.glm_norm import InputDataGLM, Model, Simulator
+from batchglm.train.numpy.glm_norm import Estimator
@@ -1 +1,2 @@
-from batchglm.utils.linalg import stacked_lstsq, groupwise_solve_lm
+from batchglm.utils.linalg import stacked_lstsq, groupwise_solve_lm, batched_cholesky, batched_spd_solve, \
+    batched_xtwx, batched_xtwy
@@ -0,0 +1 @@
+from batchglm.utils.telemetry import PhaseTimer, ProgressPrinter, TrainingRecorder, iteration_record, peak_memory
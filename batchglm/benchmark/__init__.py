@@ -0,0 +1,10 @@
+"""
+Benchmarks of estimator run time and memory on simulated data sets.
+
+Run the quick grid and write results to a JSON file that can be compared across versions:
+
+    python -m batchglm.benchmark --grid quick --out results.json
+    python -m batchglm.benchmark --grid quick --out results_new.json --compare results.json
+"""
+from .cases import GRIDS, benchmark_cases, case_id
+from .run import run_case, run_benchmarks, read_results, write_results, compare_results, simulate
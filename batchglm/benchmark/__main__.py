@@ -0,0 +1,47 @@
+import argparse
+import sys
+
+from .cases import GRIDS, benchmark_cases
+from .run import run_benchmarks, read_results, compare_results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m batchglm.benchmark",
+        description="Benchmark estimator run time and memory on simulated data sets."
+    )
+    parser.add_argument("--grid", default="quick", choices=list(GRIDS.keys()), help="benchmark grid")
+    parser.add_argument("--backend", nargs="+", default=None, help="restrict grid to these backends")
+    parser.add_argument("--noise-model", nargs="+", default=None, help="restrict grid to these noise models")
+    parser.add_argument("--repeats", type=int, default=1, help="number of runs per case")
+    parser.add_argument("--no-isolate", action="store_true", help="run all cases in this process")
+    parser.add_argument("--out", default=None, help="JSON file to write results to")
+    parser.add_argument("--compare", default=None, help="JSON file of a reference run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative increase reported as regression")
+    args = parser.parse_args(args)
+
+    restrict = {}
+    if args.backend is not None:
+        restrict["backend"] = args.backend
+    if args.noise_model is not None:
+        restrict["noise_model"] = args.noise_model
+    document = run_benchmarks(
+        cases=benchmark_cases(grid=args.grid, **restrict),
+        repeats=args.repeats,
+        isolate=not args.no_isolate,
+        path=args.out
+    )
+    if args.compare is not None:
+        regressions = compare_results(
+            baseline=read_results(args.compare),
+            current=document,
+            tolerance=args.tolerance
+        )
+        for case_id, key, reference, value in regressions:
+            sys.stdout.write("regression %s %s: %g -> %g\n" % (case_id, key, reference, value))
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import itertools
+
+# Parameters of a benchmark case:
+#   - backend: training backend, a subpackage of batchglm.train ("numpy", "tf1").
+#   - noise_model: noise model, "nb", "norm" or "beta".
+#   - n_obs, n_features: size of the simulated data set.
+#   - sparsity: fraction of entries that are set to zero after simulation. Data are passed as
+#     scipy.sparse.csr_matrix if this is larger than zero and as dense numpy array otherwise.
+#   - n_conditions, n_batches: number of conditions and batches of the simulated design, the location model has
+#     n_conditions + n_batches - 1 coefficients.
+#   - as_dask: whether input data are held as dask arrays.
+#   - training_strategy: training strategy passed to train_sequence().
+# Cases of a grid whose simulated data are not in the support of the noise model are left out, see _in_support().
+GRIDS = {
+    "quick": {
+        "backend": ["numpy", "tf1"],
+        "noise_model": ["nb"],
+        "n_obs": [1000],
+        "n_features": [100],
+        "sparsity": [0., 0.9],
+        "n_conditions": [2],
+        "n_batches": [2],
+        "as_dask": [False],
+        "training_strategy": ["DEFAULT"]
+    },
+    "full": {
+        "backend": ["numpy", "tf1"],
+        "noise_model": ["nb", "norm", "beta"],
+        "n_obs": [1000, 10000],
+        "n_features": [100, 1000],
+        "sparsity": [0., 0.9],
+        "n_conditions": [2, 8],
+        "n_batches": [2, 8],
+        "as_dask": [False, True],
+        "training_strategy": ["DEFAULT"]
+    },
+}
+
+
+def benchmark_cases(
+        grid="quick",
+        **kwargs
+) -> list:
+    """
+    Cases of a benchmark grid as the cartesian product of all parameter values.
+
+    :param grid: Name of a grid in GRIDS or dictionary of lists of parameter values.
+    :param kwargs: Lists of parameter values that override those of the grid, eg. backend=["numpy"].
+    :return: List of dictionaries of parameter values, one per case.
+    """
+    if isinstance(grid, str):
+        grid = GRIDS[grid]
+    grid = dict(grid)
+    grid.update(kwargs)
+    keys = list(grid.keys())
+    cases = [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+    return [x for x in cases if _in_support(x)]
+
+
+def _in_support(case: dict) -> bool:
+    """
+    Whether the simulated data of a case are in the support of its noise model.
+
+    Beta distributed data lie in the open interval (0, 1), so that the zeros that sparsity introduces are not.
+    """
+    return not (case.get("noise_model") == "beta" and case.get("sparsity", 0.) > 0)
+
+
+def case_id(case: dict) -> str:
+    """
+    Identifier of a case that is stable across runs, used to match results of different runs.
+    """
+    return "%s-%s-obs%i-feat%i-sparsity%.2f-cond%i-batch%i-%s-%s" % (
+        case["backend"],
+        case["noise_model"],
+        case["n_obs"],
+        case["n_features"],
+        case["sparsity"],
+        case["n_conditions"],
+        case["n_batches"],
+        "dask" if case["as_dask"] else "memory",
+        case["training_strategy"]
+    )
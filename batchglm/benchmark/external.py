@@ -0,0 +1,2 @@
+from batchglm.utils.telemetry import TrainingRecorder, peak_memory
+from batchglm import __version__
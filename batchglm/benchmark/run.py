@@ -0,0 +1,263 @@
+import concurrent.futures
+import datetime
+import importlib
+import json
+import logging
+import multiprocessing
+import numpy as np
+import platform
+import scipy
+import scipy.sparse
+import sys
+import time
+import traceback
+
+from .cases import benchmark_cases, case_id
+from .external import TrainingRecorder, peak_memory, __version__
+
+logger = logging.getLogger("batchglm")
+
+SCHEMA = "batchglm-benchmark"
+SCHEMA_VERSION = 1
+
+
+def simulate(
+        case: dict,
+        seed: int = 0
+):
+    """
+    Simulate the data set of a benchmark case.
+
+    :param case: Parameters of the case, see GRIDS.
+    :param seed: Seed of the numpy random number generator.
+    :return: InputDataGLM of the noise model of the case.
+    """
+    module = importlib.import_module("batchglm.models.glm_%s" % case["noise_model"])
+    np.random.seed(seed)
+    sim = module.Simulator(num_observations=case["n_obs"], num_features=case["n_features"])
+    sim.generate_sample_description(
+        num_conditions=case["n_conditions"],
+        num_batches=case["n_batches"],
+        intercept_scale=True
+    )
+    sim.generate_params()
+    sim.generate_data()
+    x = np.asarray(sim.input_data.x)
+    if case["sparsity"] > 0:
+        x = np.where(np.random.uniform(0, 1, x.shape) < case["sparsity"], 0., x)
+        x = scipy.sparse.csr_matrix(x)
+    return module.InputDataGLM(
+        data=x,
+        design_loc=sim.input_data.design_loc,
+        design_scale=sim.input_data.design_scale,
+        as_dask=case["as_dask"]
+    )
+
+
+def run_case(
+        case: dict,
+        seed: int = 0
+) -> dict:
+    """
+    Time initialization, training and finalization of an estimator on the simulated data set of a case.
+
+    Initialization comprises the construction of the estimator, which includes initial parameter values from
+    init_par(), and initialize(). Peak memory is the peak resident memory of the process after the run,
+    run cases in a fresh process to obtain the peak memory of a single case, see run_benchmarks().
+
+    :param case: Parameters of the case, see GRIDS.
+    :param seed: Seed of the numpy random number generator used for simulation.
+    :return: Result record, see run_benchmarks().
+    """
+    result = {"case_id": case_id(case), "case": case}
+    try:
+        estimator_class = importlib.import_module(
+            "batchglm.train.%s.glm_%s" % (case["backend"], case["noise_model"])
+        ).Estimator
+    except ImportError as e:
+        result["status"] = "skipped"
+        result["error"] = str(e)
+        return result
+
+    try:
+        input_data = simulate(case=case, seed=seed)
+        recorder = TrainingRecorder()
+        t0 = time.perf_counter()
+        estimator = estimator_class(input_data=input_data, init_a="standard", init_b="standard")
+        estimator.initialize()
+        t1 = time.perf_counter()
+        estimator.train_sequence(training_strategy=case["training_strategy"], callbacks=[recorder])
+        t2 = time.perf_counter()
+        estimator.finalize()
+        t3 = time.perf_counter()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+        return result
+
+    # Times by phase of training iterations, see batchglm.utils.telemetry:
+    time_phases = {}
+    for record in recorder.records:
+        for k, v in record.items():
+            if k.startswith("time_wall_"):
+                time_phases[k[len("time_wall_"):]] = time_phases.get(k[len("time_wall_"):], 0.) + v
+    result.update({
+        "status": "ok",
+        "time_init": t1 - t0,
+        "time_train": t2 - t1,
+        "time_finalize": t3 - t2,
+        "time_phases": time_phases,
+        "n_iterations": len(recorder.records),
+        "log_likelihood": float(np.sum(estimator.log_likelihood)),
+        "peak_memory": peak_memory()
+    })
+    return result
+
+
+def _summarize_repeats(results: list) -> dict:
+    """
+    Merge results of repeated runs of a case: Times are reported as minimum over runs, all runs are kept as lists.
+    """
+    ok = [x for x in results if x["status"] == "ok"]
+    if len(ok) < len(results):
+        return [x for x in results if x["status"] != "ok"][0]
+    summary = dict(ok[0])
+    summary["repeats"] = len(ok)
+    for k in ["time_init", "time_train", "time_finalize"]:
+        summary[k + "_runs"] = [x[k] for x in ok]
+        summary[k] = min(summary[k + "_runs"])
+    summary["peak_memory"] = max([x["peak_memory"] or 0 for x in ok]) or None
+    return summary
+
+
+def run_benchmarks(
+        cases: list = None,
+        repeats: int = 1,
+        isolate: bool = True,
+        path: str = None
+) -> dict:
+    """
+    Run benchmark cases and collect results in a versioned JSON-compatible document.
+
+    The document has the fields:
+
+        - "schema", "schema_version": format identifier, the version is incremented on incompatible changes.
+        - "created": ISO 8601 time stamp of the start of the run.
+        - "environment": versions of batchglm, python, numpy and scipy, platform and number of CPUs.
+        - "results": list of result records by case with the fields:
+
+            * "case_id": stable identifier of the case, see case_id().
+            * "case": parameters of the case.
+            * "status": "ok", "skipped" if the backend is not available or "error".
+            * "error": error message if status is not "ok".
+            * "time_init", "time_train", "time_finalize": minimum wall time in seconds over repeated runs of
+              estimator construction and initialization, train_sequence() and finalize().
+            * "time_init_runs", "time_train_runs", "time_finalize_runs": wall times of all runs.
+            * "time_phases": wall time in seconds by training phase summed over iterations, see
+              batchglm.utils.telemetry.PhaseTimer.
+            * "n_iterations": number of training iterations.
+            * "log_likelihood": log-likelihood of the fit.
+            * "peak_memory": peak resident memory in bytes.
+
+    :param cases: List of cases, see benchmark_cases(). Defaults to the "quick" grid.
+    :param repeats: Number of runs per case.
+    :param isolate: Whether to run each case in a fresh process, so that peak memory is measured by case and
+        cases do not share caches. Processes are started with the "spawn" method.
+    :param path: File to write results to as JSON. Not written if None.
+    :return: Results document.
+    """
+    if cases is None:
+        cases = benchmark_cases(grid="quick")
+    document = {
+        "schema": SCHEMA,
+        "schema_version": SCHEMA_VERSION,
+        "created": datetime.datetime.now().isoformat(),
+        "environment": {
+            "batchglm": __version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "n_cpus": multiprocessing.cpu_count()
+        },
+        "results": []
+    }
+    for i, case in enumerate(cases):
+        runs = []
+        for j in range(repeats):
+            if isolate:
+                with concurrent.futures.ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    runs.append(executor.submit(run_case, case).result())
+            else:
+                runs.append(run_case(case))
+            if runs[-1]["status"] != "ok":
+                break
+        result = _summarize_repeats(runs)
+        document["results"].append(result)
+        sys.stdout.write("benchmark %i/%i %s: %s%s\n" % (
+            i + 1,
+            len(cases),
+            result["case_id"],
+            result["status"],
+            ", init %.2fsec, train %.2fsec, finalize %.2fsec" %
+            (result["time_init"], result["time_train"], result["time_finalize"])
+            if result["status"] == "ok" else ""
+        ))
+        if path is not None:
+            write_results(document, path)
+    return document
+
+
+def write_results(
+        document: dict,
+        path: str
+):
+    with open(path, "w") as f:
+        json.dump(document, f, indent=1)
+
+
+def read_results(path: str) -> dict:
+    with open(path, "r") as f:
+        document = json.load(f)
+    if document.get("schema") != SCHEMA:
+        raise ValueError("%s is not a batchglm benchmark result file" % path)
+    if document["schema_version"] > SCHEMA_VERSION:
+        raise ValueError(
+            "%s has schema version %i, only versions up to %i are supported" %
+            (path, document["schema_version"], SCHEMA_VERSION)
+        )
+    return document
+
+
+def compare_results(
+        baseline: dict,
+        current: dict,
+        tolerance: float = 0.2,
+        keys=("time_init", "time_train", "time_finalize", "peak_memory")
+) -> list:
+    """
+    Find regressions between two benchmark runs.
+
+    Cases are matched by case_id, cases that did not succeed in both runs are ignored.
+
+    :param baseline: Results document of the reference run.
+    :param current: Results document of the run to check.
+    :param tolerance: Relative increase of a measure above which it is reported as regression.
+    :param keys: Measures to compare.
+    :return: List of tuples (case_id, measure, baseline value, current value) of regressions.
+    """
+    baseline_by_id = dict([(x["case_id"], x) for x in baseline["results"] if x["status"] == "ok"])
+    regressions = []
+    for result in current["results"]:
+        if result["status"] != "ok" or result["case_id"] not in baseline_by_id:
+            continue
+        reference = baseline_by_id[result["case_id"]]
+        for k in keys:
+            if reference.get(k) is None or result.get(k) is None:
+                continue
+            if result[k] > reference[k] * (1. + tolerance):
+                regressions.append((result["case_id"], k, reference[k], result[k]))
+    return regressions
@@ -6,12 +6,14 @@ import numpy as np
 import pandas as pd
 import pprint
 import sys
+from typing import Union
 
 try:
     import anndata
 except ImportError:
     anndata = None
 
+from .external import save_checkpoint, load_checkpoint
 from .input import InputDataBase
 from .model import _ModelBase
 
@@ -43,6 +45,9 @@ class _EstimatorBase(metaclass=abc.ABCMeta):
         self._fisher_inv = None
         self._error_codes = None
         self._niter = None
+        # Checkpoint settings and state of train() to resume from, set by train_sequence() while it runs train():
+        self._checkpoint = None
+        self._resume_state = None
 
     @property
     def error_codes(self):
@@ -100,6 +105,73 @@ class _EstimatorBase(metaclass=abc.ABCMeta):
     def train_sequence(
             self,
             training_strategy,
+            checkpoint_path: str = None,
+            checkpoint_every: int = 10,
+            **kwargs
+    ):
+        """
+        Run the training steps of a training strategy one after another.
+
+        :param training_strategy: Name or value of a training strategy, see self.TrainingStrategies.
+        :param checkpoint_path: File to periodically write training state to, see save_checkpoint().
+            Training can be continued from this file with resume_sequence(). Not used if None.
+        :param checkpoint_every: Number of iterations of a training step between two checkpoints. A checkpoint
+            is also written at the end of each training step.
+        :param kwargs: Arguments passed to train(), these override arguments set by the training strategy.
+        """
+        self._run_sequence(
+            training_strategy=training_strategy,
+            checkpoint_path=checkpoint_path,
+            checkpoint_every=checkpoint_every,
+            **kwargs
+        )
+
+    def resume_sequence(
+            self,
+            checkpoint_path: str,
+            training_strategy,
+            checkpoint_every: int = 10,
+            **kwargs
+    ):
+        """
+        Continue train_sequence() from the state saved in a checkpoint.
+
+        Parameters, convergence status and optimizer state are restored from the checkpoint, training steps of the
+        training strategy that were completed before the checkpoint was written are skipped and the interrupted
+        training step is continued from its last checkpointed iteration. The same training strategy and arguments
+        as in the interrupted call of train_sequence() should be used. New checkpoints are written to the same file.
+
+        Parameters are overwritten, so the estimator can be created with the checkpointed parameters as
+        init_a and init_b to skip the computation of initial values:
+
+            checkpoint = load_checkpoint(checkpoint_path)
+            estimator = Estimator(input_data, init_a=checkpoint["a_var"], init_b=checkpoint["b_var"])
+            estimator.initialize()
+            estimator.resume_sequence(checkpoint_path, training_strategy)
+
+        :param checkpoint_path: File written by train_sequence().
+        :param training_strategy: Training strategy of the interrupted call of train_sequence().
+        :param checkpoint_every: Number of iterations of a training step between two checkpoints.
+        :param kwargs: Arguments passed to train(), see train_sequence().
+        """
+        checkpoint = load_checkpoint(checkpoint_path)
+        self._restore_checkpoint(checkpoint)
+        self._run_sequence(
+            training_strategy=training_strategy,
+            checkpoint_path=checkpoint_path,
+            checkpoint_every=checkpoint_every,
+            first_step=checkpoint["training_step"],
+            resume_state=checkpoint if checkpoint["step_complete"] == 0 else None,
+            **kwargs
+        )
+
+    def _run_sequence(
+            self,
+            training_strategy,
+            checkpoint_path: str = None,
+            checkpoint_every: int = 10,
+            first_step: int = 0,
+            resume_state: dict = None,
             **kwargs
     ):
         if isinstance(training_strategy, Enum):
@@ -112,6 +184,9 @@ class _EstimatorBase(metaclass=abc.ABCMeta):
 
         logger.debug("training strategy:\n%s", pprint.pformat(training_strategy))
         for idx, d in enumerate(training_strategy):
+            if idx < first_step:
+                logger.debug("Skipping training sequence #%d, completed before checkpoint", idx + 1)
+                continue
             logger.debug("Beginning with training sequence #%d", idx + 1)
             # Override duplicate arguments with user choice:
             if np.any([x in list(d.keys()) for x in list(kwargs.keys())]):
@@ -121,9 +196,76 @@ class _EstimatorBase(metaclass=abc.ABCMeta):
                         "overrding %s from training strategy with value %s with new value %s\n" %
                         (x, str(d[x]), str(kwargs[x]))
                     )
-            self.train(**d, **kwargs)
+            if checkpoint_path is not None:
+                self._checkpoint = {"path": checkpoint_path, "every": checkpoint_every, "training_step": idx}
+                self._resume_state = resume_state if idx == first_step else None
+            try:
+                self.train(**d, **kwargs)
+            finally:
+                self._checkpoint = None
+                self._resume_state = None
+            if checkpoint_path is not None:
+                self.save_checkpoint(path=checkpoint_path, training_step=idx + 1)
             logger.debug("Training sequence #%d complete", idx + 1)
 
+    def save_checkpoint(
+            self,
+            path: str,
+            training_step: int,
+            train_state: dict = None
+    ):
+        """
+        Write parameters, training strategy position and optimizer state to a checkpoint file.
+
+        :param path: File to write to.
+        :param training_step: Index of the current step of the training strategy.
+        :param train_state: State of the optimizer within the current training step, as kept by train().
+            If None, training_step is considered complete and is not continued on resume.
+        """
+        state = self._checkpoint_state()
+        state["training_step"] = training_step
+        state["step_complete"] = int(train_state is None)
+        if train_state is not None:
+            state.update(train_state)
+        save_checkpoint(path, state)
+        logger.debug("Wrote checkpoint of training sequence #%d to %s", training_step + 1, path)
+
+    def _checkpoint_due(self, iteration: int) -> bool:
+        """
+        Whether train() should pass its state to save_checkpoint() after the given iteration.
+        """
+        return self._checkpoint is not None and iteration % self._checkpoint["every"] == 0
+
+    def _write_checkpoint(self, train_state: dict):
+        """
+        Write a checkpoint of the state of train() within the running step of train_sequence().
+        """
+        self.save_checkpoint(
+            path=self._checkpoint["path"],
+            training_step=self._checkpoint["training_step"],
+            train_state=train_state
+        )
+
+    def _pop_resume_state(self) -> Union[dict, None]:
+        """
+        State of train() saved in the checkpoint that training is resumed from, only returned once.
+        """
+        resume_state = self._resume_state
+        self._resume_state = None
+        return resume_state
+
+    def _checkpoint_state(self) -> dict:
+        """
+        Parameters and settings of the estimator that are saved in checkpoints.
+        """
+        return {"a_var": self.a_var, "b_var": self.b_var}
+
+    def _restore_checkpoint(self, checkpoint: dict):
+        """
+        Restore parameters and settings saved by _checkpoint_state().
+        """
+        raise NotImplementedError("resuming from checkpoints is not supported by %s" % type(self).__name__)
+
     @abc.abstractmethod
     def train(self, **kwargs):
         """
@@ -1,2 +1,4 @@
 import batchglm.pkg_constants as pkg_constants
 import batchglm.data as data_utils
+
+from batchglm.utils.checkpoint import save_checkpoint, load_checkpoint
@@ -1,7 +1,9 @@
+import copy
 import dask.array
 import logging
 import numpy as np
 import scipy.sparse
+import scipy.special
 import sparse
 from typing import List
 
@@ -11,13 +13,144 @@ try:
         from anndata.base import Raw
     except ImportError:
         from anndata import Raw
+    try:
+        from anndata._core.sparse_dataset import BaseCompressedSparseDataset as SparseDataset
+    except ImportError:
+        try:
+            from anndata._core.sparse_dataset import SparseDataset
+        except ImportError:
+            SparseDataset = None
 except ImportError:
     anndata = None
     Raw = None
+    SparseDataset = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
 
 logger = logging.getLogger(__name__)
 
 
+def _sum_log_factorial(x):
+    """
+    Sum of log(x!) over observations of a block of count data.
+
+    :param x: Count data block (observations x features) as numpy array or scipy.sparse matrix.
+    :return: (1 x features), evaluated and summed in double precision also for single precision counts.
+    """
+    if isinstance(x, scipy.sparse.spmatrix):
+        # Zero counts do not contribute as log(0!) = 0.
+        x = scipy.sparse.coo_matrix(x)
+        x.sum_duplicates()
+        return np.bincount(
+            x.col, weights=scipy.special.gammaln(x.data + 1., dtype=np.float64), minlength=x.shape[1]
+        )[np.newaxis, :]
+    else:
+        return np.sum(scipy.special.gammaln(np.asarray(x) + 1., dtype=np.float64), axis=0, keepdims=True)
+
+
+def _feature_statistics_block(x):
+    """
+    Sums, sums of squares, numbers of non-zero entries and maxima over observations of a block of data.
+
+    :param x: Data block (observations x features) as numpy array or scipy.sparse matrix.
+    :return: (4 x features), evaluated in double precision also for single precision data.
+    """
+    if isinstance(x, scipy.sparse.spmatrix):
+        x = scipy.sparse.csr_matrix(x, dtype=np.float64)
+        x.sum_duplicates()
+        x.eliminate_zeros()
+        x_sq = x.copy()
+        x_sq.data = np.square(x_sq.data)
+        return np.vstack([
+            np.asarray(x.sum(axis=0)),
+            np.asarray(x_sq.sum(axis=0)),
+            x.getnnz(axis=0)[np.newaxis, :],
+            # Implicit zeros are taken into account by the maximum of a sparse matrix:
+            x.max(axis=0).toarray() if x.shape[0] > 0 else np.full([1, x.shape[1]], -np.inf)
+        ])
+    else:
+        x = np.asarray(x, dtype=np.float64)
+        return np.vstack([
+            np.sum(x, axis=0),
+            np.sum(np.square(x), axis=0),
+            np.sum(x != 0, axis=0),
+            np.max(x, axis=0, initial=-np.inf)
+        ])
+
+
+def _is_backed(x) -> bool:
+    """
+    Whether x is an on-disk array: a h5py dataset, a zarr array or the sparse matrix of a backed AnnData object.
+    """
+    return (h5py is not None and isinstance(x, h5py.Dataset)) or \
+        (zarr is not None and isinstance(x, zarr.Array)) or \
+        (SparseDataset is not None and isinstance(x, SparseDataset))
+
+
+class _BackedSparseBlocks:
+    """
+    Array-like wrapper of an on-disk sparse matrix that returns blocks as scipy.sparse.csr_matrix.
+
+    This allows wrapping backed sparse AnnData matrices into dask arrays of sparse blocks.
+    """
+
+    def __init__(self, x):
+        self.x = x
+        self.shape = tuple(x.shape)
+        self.dtype = np.dtype(x.dtype)
+        self.ndim = 2
+
+    def __getitem__(self, key):
+        rows, cols = key
+        # Read full rows first, sparse datasets are stored row-major for CSR:
+        block = self.x[rows]
+        return scipy.sparse.csr_matrix(block)[:, cols]
+
+
+def _backed_to_dask(x, chunks, cast_dtype=None):
+    """
+    Wrap an on-disk array into a lazily evaluated dask array.
+
+    Blocks are only read from disk when they are computed, no copy of the data is held in memory.
+
+    :param x: On-disk array, see _is_backed().
+    :param chunks: Block shape (observations, features).
+    :param cast_dtype: Type that blocks are cast to when they are read, not cast if None.
+    :return: dask array, with scipy.sparse.csr_matrix blocks if x is sparse.
+    """
+    if SparseDataset is not None and isinstance(x, SparseDataset):
+        x = dask.array.from_array(
+            _BackedSparseBlocks(x),
+            chunks=chunks,
+            asarray=False,
+            fancy=False,
+            meta=scipy.sparse.csr_matrix((0, 0), dtype=x.dtype)
+        )
+    else:
+        x = dask.array.from_array(x, chunks=chunks, fancy=False)
+    if cast_dtype is not None:
+        x = x.astype(cast_dtype)
+    return x
+
+
+def _backed_to_memory(x):
+    """
+    Load an on-disk array into memory as numpy array or scipy.sparse.csr_matrix.
+    """
+    if SparseDataset is not None and isinstance(x, SparseDataset):
+        return scipy.sparse.csr_matrix(x.to_memory())
+    else:
+        return np.asarray(x[...])
+
+
 class InputDataBase:
     """
     Base class for all input data types.
@@ -35,7 +168,8 @@ class InputDataBase:
             chunk_size_cells: int = 100000,
             chunk_size_genes: int = 100,
             as_dask: bool = True,
-            cast_dtype=None
+            cast_dtype=None,
+            sparse_csc: bool = False
     ):
         """
         Create a new InputData object.
@@ -45,10 +179,17 @@ class InputDataBase:
         Can be either:
             - np.ndarray: NumPy array containing the raw data
             - anndata.AnnData: AnnData object containing the count data and optional the design models
-                stored as data.obsm[design_loc] and data.obsm[design_scale]
+                stored as data.obsm[design_loc] and data.obsm[design_scale]. This may be a backed AnnData object.
+            - h5py.Dataset or zarr.Array: On-disk array containing the count data.
+
+            On-disk data (backed AnnData, h5py, zarr) are wrapped into lazily evaluated dask arrays if as_dask is
+            set, so that only blocks of chunk_size_cells x chunk_size_genes are read into memory at a time.
         :param observation_names: (optional) names of the observations.
         :param feature_names: (optional) names of the features.
         :param cast_dtype: data type of all data; should be either float32 or float64
+        :param sparse_csc: Whether to keep a copy of sparse data in compressed sparse column format in memory, in
+            addition to the blocks in compressed sparse row format. This speeds up access to subsets of features,
+            see fetch_x_features(), at the cost of memory for a second copy of the data.
         :return: InputData object
         """
         self.observations = observation_names
@@ -61,36 +202,94 @@ class InputDataBase:
             self.x = data.X
         elif isinstance(data, InputDataBase):
             self.x = data.x
+        elif _is_backed(data):
+            self.x = data
         else:
             raise ValueError("type of data %s not recognized" % type(data))
 
-        if as_dask:
-            if isinstance(self.x, dask.array.core.Array):
-                self.x = self.x.compute()
-            # Need to wrap dask around the COO matrix version of the sparse package if matrix is sparse.
-            if isinstance(self.x, scipy.sparse.spmatrix):
-                self.x = dask.array.from_array(
-                    sparse.COO.from_scipy_sparse(
-                        self.x.astype(cast_dtype if cast_dtype is not None else self.x.dtype)
-                    ),
-                    chunks=(chunk_size_cells, chunk_size_genes),
-                    asarray=False
-                )
+        if _is_backed(self.x):
+            if as_dask:
+                self.x = _backed_to_dask(self.x, chunks=(chunk_size_cells, chunk_size_genes), cast_dtype=cast_dtype)
             else:
-                self.x = dask.array.from_array(
-                    self.x.astype(cast_dtype if cast_dtype is not None else self.x.dtype),
-                    chunks=(chunk_size_cells, chunk_size_genes),
-                )
+                self.x = _backed_to_memory(self.x)
+                if cast_dtype is not None:
+                    self.x = self.x.astype(cast_dtype)
         else:
             if isinstance(self.x, dask.array.core.Array):
                 self.x = self.x.compute()
-            if cast_dtype is not None:
+            # Dask arrays with sparse.COO blocks compute to sparse.COO arrays, all sparse data are held in compressed
+            # sparse row format from here on:
+            if isinstance(self.x, sparse.COO):
+                self.x = self.x.tocsr()
+            if as_dask:
+                # Sparse matrices are wrapped with blocks in compressed sparse row format.
+                if isinstance(self.x, scipy.sparse.spmatrix):
+                    self.x = dask.array.from_array(
+                        scipy.sparse.csr_matrix(self.x.astype(cast_dtype if cast_dtype is not None else self.x.dtype)),
+                        chunks=(chunk_size_cells, chunk_size_genes),
+                        asarray=False,
+                        fancy=False
+                    )
+                else:
+                    self.x = dask.array.from_array(
+                        self.x.astype(cast_dtype if cast_dtype is not None else self.x.dtype),
+                        chunks=(chunk_size_cells, chunk_size_genes),
+                    )
+            elif cast_dtype is not None:
                 self.x = self.x.astype(cast_dtype)
 
-        self._feature_allzero = np.sum(self.x, axis=0) == 0
+        # Per-feature statistics of the data are computed on first use:
+        self._feature_statistics = None
+        self._feature_sum_log_factorial = None
+        self.sparse_csc = sparse_csc
+        self._x_csc = None
         self.chunk_size_cells = chunk_size_cells
         self.chunk_size_genes = chunk_size_genes
 
+    @property
+    def is_sparse(self) -> bool:
+        """
+        Whether the data are held as scipy.sparse matrix or as dask array of scipy.sparse blocks.
+        """
+        if isinstance(self.x, dask.array.core.Array):
+            return isinstance(self.x._meta, scipy.sparse.spmatrix)
+        return isinstance(self.x, scipy.sparse.spmatrix)
+
+    @property
+    def x_csc(self):
+        """
+        Copy of sparse data in compressed sparse column format, computed on first use if sparse_csc is set.
+
+        :return: scipy.sparse.csc_matrix (observations x features), None if sparse_csc is not set or data are dense.
+        """
+        if self._x_csc is None and self.sparse_csc and self.is_sparse:
+            if isinstance(self.x, dask.array.core.Array):
+                # Convert block by block, so that the data are only held once in row format at a time:
+                self._x_csc = scipy.sparse.vstack([
+                    scipy.sparse.hstack([scipy.sparse.csc_matrix(b) for b in row]).tocsc()
+                    for row in dask.compute(self.x.to_delayed().tolist())[0]
+                ], format="csc")
+            else:
+                self._x_csc = scipy.sparse.csc_matrix(self.x)
+            self._x_csc.sort_indices()
+        return self._x_csc
+
+    def fetch_x_features(self, idx):
+        """
+        Data of a subset of features.
+
+        Features are sliced from the copy in compressed sparse column format if sparse_csc is set, which only
+        touches the stored entries of the selected features. Otherwise, the data are sliced as stored, which may
+        return a lazily evaluated dask array.
+
+        :param idx: Indices of features.
+        :return: (observations x features)
+        """
+        x_csc = self.x_csc
+        if x_csc is not None:
+            return x_csc[:, idx]
+        return self.x[:, idx]
+
     @property
     def num_observations(self):
         return self.x.shape[0]
@@ -101,11 +300,127 @@ class InputDataBase:
 
     @property
     def feature_isnonzero(self):
-        return ~self._feature_allzero
+        return ~self.feature_isallzero
+
+    @property
+    def feature_isallzero(self) -> np.ndarray:
+        """
+        Whether all observations of a feature are zero.
+
+        :return: (features,)
+        """
+        return self.feature_nnz == 0
+
+    @property
+    def feature_statistics(self) -> dict:
+        """
+        Statistics of the data by feature, computed in a single pass over the data on first use and kept for the
+        lifetime of this object:
+
+            - "sum", "sum_sq": sums of the data and of the squared data over observations
+            - "nnz": number of non-zero observations
+            - "max": maximum over observations
+            - "mean", "var": mean and (biased) variance over observations
+
+        :return: dictionary of arrays of shape (features,), in double precision.
+        """
+        if self._feature_statistics is None:
+            if isinstance(self.x, dask.array.core.Array):
+                blocks = self.x.map_blocks(
+                    _feature_statistics_block,
+                    chunks=((4,) * len(self.x.chunks[0]), self.x.chunks[1]),
+                    dtype=np.float64
+                ).compute()
+                blocks = blocks.reshape([len(self.x.chunks[0]), 4, self.x.shape[1]])
+                stats = np.concatenate([np.sum(blocks[:, :3], axis=0), np.max(blocks[:, 3:], axis=0)])
+            else:
+                stats = _feature_statistics_block(self.x)
+            n = float(self.num_observations)
+            mean = stats[0] / n
+            self._feature_statistics = {
+                "sum": stats[0],
+                "sum_sq": stats[1],
+                "nnz": stats[2].astype(np.int64),
+                "max": stats[3],
+                "mean": mean,
+                "var": np.maximum(stats[1] / n - np.square(mean), 0.)
+            }
+        return self._feature_statistics
 
     @property
-    def feature_isallzero(self):
-        return self._feature_allzero
+    def feature_nnz(self) -> np.ndarray:
+        """
+        Number of non-zero observations by feature, see feature_statistics.
+
+        :return: (features,)
+        """
+        return self.feature_statistics["nnz"]
+
+    @property
+    def feature_sum_log_factorial(self) -> np.ndarray:
+        """
+        Sum of log(x!) over all observations by feature.
+
+        This only depends on the count data, it is computed on first use and kept for the lifetime of this object.
+
+        :return: (features,)
+        """
+        if self._feature_sum_log_factorial is None:
+            if isinstance(self.x, dask.array.core.Array):
+                self._feature_sum_log_factorial = self.x.map_blocks(
+                    _sum_log_factorial,
+                    chunks=((1,) * len(self.x.chunks[0]), self.x.chunks[1]),
+                    dtype=np.float64
+                ).sum(axis=0).compute()
+            else:
+                self._feature_sum_log_factorial = _sum_log_factorial(self.x)[0]
+        return self._feature_sum_log_factorial
+
+    def subset_features(self, idx):
+        """
+        Copy of this input data object that is restricted to a subset of features.
+
+        The count data of the selected features is copied into a new, compact array.
+
+        :param idx: Indices of features to keep.
+        :return: InputData object
+        """
+        input_data = copy.copy(self)
+        x = self.x[:, idx]
+        if isinstance(x, dask.array.core.Array):
+            x = x.rechunk(self.x.chunksize).persist()
+        input_data.x = x
+        if self._x_csc is not None:
+            input_data._x_csc = self._x_csc[:, idx]
+        if self._feature_statistics is not None:
+            input_data._feature_statistics = dict([(k, v[idx]) for k, v in self._feature_statistics.items()])
+        if self._feature_sum_log_factorial is not None:
+            input_data._feature_sum_log_factorial = self._feature_sum_log_factorial[idx]
+        if self.features is not None:
+            input_data.features = np.asarray(self.features)[idx]
+        return input_data
+
+    def subset_observations(self, start, end):
+        """
+        Copy of this input data object that is restricted to a contiguous range of observations.
+
+        The count data of the selected observations are loaded into memory.
+
+        :param start: First observation to keep.
+        :param end: Observation after the last observation to keep.
+        :return: InputData object
+        """
+        input_data = copy.copy(self)
+        x = self.x[start:end]
+        if isinstance(x, dask.array.core.Array):
+            x = x.compute()
+        input_data.x = x
+        input_data._x_csc = None
+        input_data._feature_statistics = None
+        input_data._feature_sum_log_factorial = None
+        if self.observations is not None:
+            input_data.observations = np.asarray(self.observations)[start:end]
+        return input_data
 
     def fetch_x_dense(self, idx):
         assert isinstance(self.x, np.ndarray), "tried to fetch dense from non ndarray"
@@ -113,9 +428,12 @@ class InputDataBase:
         return self.x[idx, :]
 
     def fetch_x_sparse(self, idx):
-        assert isinstance(self.x, scipy.sparse.csr_matrix), "tried to fetch sparse from non csr_matrix"
+        assert self.is_sparse, "tried to fetch sparse from non sparse data"
 
         data = self.x[idx, :]
+        if isinstance(data, dask.array.core.Array):
+            data = data.compute()
+        data = scipy.sparse.csr_matrix(data)
 
         data_idx = np.asarray(np.vstack(data.nonzero()).T, np.int64)
         data_val = np.asarray(data.data, np.float64)
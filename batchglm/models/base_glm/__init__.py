@@ -4,3 +4,5 @@ from .model import _ModelGLM
 from .simulator import _SimulatorGLM
 from .utils import parse_design
 from .utils import closedform_glm_mean, closedform_glm_scale
+from .utils import lstsq_glm_mean, lstsq_glm_scale
+from .utils import intercept_param
@@ -10,7 +10,7 @@ import patsy
 import scipy.sparse
 from typing import Union
 
-from .utils import parse_constraints, parse_design
+from .utils import parse_constraints, parse_design, _grouping_key, _groupwise_moments_cached
 from .external import InputDataBase
 
 
@@ -38,7 +38,8 @@ class InputDataGLM(InputDataBase):
             chunk_size_cells: int = 1e6,
             chunk_size_genes: int = 100,
             as_dask: bool = True,
-            cast_dtype="float64"
+            cast_dtype="float64",
+            sparse_csc: bool = False
     ):
         """
         Create a new InputData object.
@@ -47,7 +48,9 @@ class InputDataGLM(InputDataBase):
             Can be either:
                 - np.ndarray: NumPy array containing the raw data
                 - anndata.AnnData: AnnData object containing the count data and optional the design models
-                    stored as data.obsm[design_loc] and data.obsm[design_scale]
+                    stored as data.obsm[design_loc] and data.obsm[design_scale]. This may be a backed AnnData
+                    object, which is read lazily if as_dask is set.
+                - h5py.Dataset or zarr.Array: On-disk array containing the count data, read lazily if as_dask is set.
         :param design_loc: Some matrix format (observations x mean model parameters)
             The location design model. Optional if already specified in `data`
         :param design_loc_names: (optional)
@@ -78,6 +81,8 @@ class InputDataGLM(InputDataBase):
             Names of the features.
         :param cast_dtype:
             If this option is set, all provided data will be casted to this data type.
+        :param sparse_csc: Whether to keep a copy of sparse data in compressed sparse column format for access to
+            subsets of features, see InputDataBase.
         :return: InputData object
         """
         InputDataBase.__init__(
@@ -88,7 +93,8 @@ class InputDataGLM(InputDataBase):
             chunk_size_cells=chunk_size_cells,
             chunk_size_genes=chunk_size_genes,
             cast_dtype=cast_dtype,
-            as_dask=as_dask
+            as_dask=as_dask,
+            sparse_csc=sparse_csc
         )
 
         design_loc, design_loc_names = parse_design(
@@ -157,6 +163,96 @@ class InputDataGLM(InputDataBase):
         else:
             self.size_factors =  size_factors.astype(cast_dtype if cast_dtype is not None else self.x.dtype) \
                 if size_factors is not None else None
+        # Group-wise moments of the data by grouping of observations, computed on first use:
+        self._groupwise_moments = {}
+
+    @property
+    def groupwise_moments(self) -> dict:
+        """
+        Group-wise moments of the data divided by the size factors by grouping of observations, which are shared
+        by all closed-form initializations on this data, see _groupwise_moments_cached().
+
+        The moments of the single group of all observations are taken from feature_statistics if these were already
+        computed and if there are no size factors, so that these do not require another pass over the data.
+
+        :return: dictionary that is filled by _groupwise_moments_cached()
+        """
+        if self._feature_statistics is not None and self.size_factors is None:
+            key = _grouping_key(grouping=None, n_obs=self.num_observations)
+            if key not in self._groupwise_moments:
+                self._groupwise_moments[key] = (
+                    None,
+                    np.array([float(self.num_observations)]),
+                    self._feature_statistics["sum"][np.newaxis, :],
+                    self._feature_statistics["sum_sq"][np.newaxis, :]
+                )
+        return self._groupwise_moments
+
+    def feature_statistics_by_group(self, grouping) -> dict:
+        """
+        Statistics of the data divided by the size factors by feature and group of observations, computed in a
+        single pass over the data on first use of a grouping and kept for the lifetime of this object.
+
+        :param grouping: Group index in 0, ..., groups - 1 of each observation.
+        :return: dictionary with number of observations "group_size" (groups,) and "sum", "sum_sq", "mean" and
+            (biased) "var" (groups x features).
+        """
+        group_size, sums, sums_sq = _groupwise_moments_cached(
+            x=self.x,
+            grouping=grouping,
+            size_factors=self.size_factors,
+            moments=self.groupwise_moments
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = sums / group_size[:, np.newaxis]
+            var = np.maximum(sums_sq / group_size[:, np.newaxis] - np.square(mean), 0.)
+        return {
+            "group_size": group_size,
+            "sum": sums,
+            "sum_sq": sums_sq,
+            "mean": mean,
+            "var": var
+        }
+
+    def subset_features(self, idx):
+        """
+        Copy of this input data object that is restricted to a subset of features.
+
+        :param idx: Indices of features to keep.
+        :return: InputData object
+        """
+        input_data = InputDataBase.subset_features(self, idx=idx)
+        input_data._groupwise_moments = dict([
+            (k, (grouping, group_size, sums[:, idx], sums_sq[:, idx]))
+            for k, (grouping, group_size, sums, sums_sq) in self._groupwise_moments.items()
+        ])
+        return input_data
+
+    def subset_observations(self, start, end):
+        """
+        Copy of this input data object that is restricted to a contiguous range of observations.
+
+        Count data, design matrices, constraints and size factors of the selected observations are loaded into memory.
+
+        :param start: First observation to keep.
+        :param end: Observation after the last observation to keep.
+        :return: InputData object
+        """
+        input_data = InputDataBase.subset_observations(self, start=start, end=end)
+
+        def fetch(value):
+            if isinstance(value, dask.array.core.Array):
+                value = value.compute()
+            return value
+
+        input_data.design_loc = fetch(self.design_loc[start:end])
+        input_data.design_scale = fetch(self.design_scale[start:end])
+        input_data.constraints_loc = fetch(self.constraints_loc)
+        input_data.constraints_scale = fetch(self.constraints_scale)
+        if self.size_factors is not None:
+            input_data.size_factors = fetch(self.size_factors[start:end])
+        input_data._groupwise_moments = {}
+        return input_data
 
     @property
     def design_loc_names(self):
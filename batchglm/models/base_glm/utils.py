@@ -5,7 +5,9 @@ try:
 except ImportError:
     anndata = None
 
+import dask
 import dask.array
+import hashlib
 import numpy as np
 import pandas as pd
 import patsy
@@ -82,13 +84,174 @@ def parse_constraints(
     return constraints, constraint_params
 
 
+def _reduce_observations(x, fun):
+    """
+    Sum of a reduction over observations of the data, evaluated block by block for dask arrays.
+
+    :param x: The input data array (observations x features): numpy array, scipy.sparse matrix or dask array with
+        dense or scipy.sparse.csr_matrix blocks.
+    :param fun: Function of a data block and the slices of observations and features that it covers, which returns
+        a dense (k x block features) array.
+    :return: (k x features)
+    """
+    if isinstance(x, dask.array.core.Array):
+        rows = np.cumsum((0,) + x.chunks[0])
+        cols = np.cumsum((0,) + x.chunks[1])
+        blocks = x.to_delayed()
+        parts = dask.compute([
+            [
+                dask.delayed(fun)(blocks[i, k], slice(rows[i], rows[i + 1]), slice(cols[k], cols[k + 1]))
+                for k in range(blocks.shape[1])
+            ]
+            for i in range(blocks.shape[0])
+        ])[0]
+        return np.sum([np.hstack(row) for row in parts], axis=0)
+    else:
+        return fun(x, slice(0, x.shape[0]), slice(0, x.shape[1]))
+
+
+def _as_float64(x):
+    """
+    Data block in double precision as scipy.sparse.csr_matrix if sparse and as numpy array otherwise.
+    """
+    if isinstance(x, scipy.sparse.spmatrix):
+        return scipy.sparse.csr_matrix(x, dtype=np.float64)
+    else:
+        return np.asarray(x, dtype=np.float64)
+
+
+def _inverse_size_factors(size_factors, n_obs):
+    if size_factors is None:
+        return np.ones([n_obs])
+    if isinstance(size_factors, dask.array.core.Array):
+        size_factors = size_factors.compute()
+    return 1. / np.asarray(size_factors, dtype=np.float64).flatten()
+
+
+def _groupwise_moments_block(x, grouping, n_groups, weights):
+    """
+    Weighted sums and sums of squares by group of a block of observations.
+
+    :param x: Data block (observations x features) as numpy array or scipy.sparse matrix.
+    :param grouping: Group index of each observation of the block.
+    :param n_groups: Number of groups.
+    :param weights: Weight of each observation of the block, the inverse size factors.
+    :return: (2 * groups x features) sums stacked on sums of squares, in double precision.
+    """
+    n_obs = x.shape[0]
+    indicator = scipy.sparse.csr_matrix(
+        (weights, (grouping, np.arange(n_obs))),
+        shape=(n_groups, n_obs)
+    )
+    indicator_sq = indicator.copy()
+    indicator_sq.data = np.square(indicator_sq.data)
+    x = _as_float64(x)
+    if isinstance(x, scipy.sparse.spmatrix):
+        x_sq = x.copy()
+        x_sq.data = np.square(x_sq.data)
+        return np.vstack([(indicator @ x).toarray(), (indicator_sq @ x_sq).toarray()])
+    else:
+        return np.vstack([indicator @ x, indicator_sq @ np.square(x)])
+
+
+def groupwise_moments(
+        x,
+        grouping: np.ndarray,
+        size_factors=None
+):
+    r"""
+    Number of observations, sums and sums of squares of all features by group in a single pass over the data.
+
+    Sums are computed as products of a sparse group indicator matrix with the data, so that observations are not
+    copied by group and sparse data are not densified. Dask arrays are reduced block by block.
+
+    :param x: The input data array (observations x features): numpy array, scipy.sparse matrix or dask array with
+        dense or scipy.sparse.csr_matrix blocks.
+    :param grouping: Group index in 0, ..., groups - 1 of each observation, as returned by np.unique(...,
+        return_inverse=True).
+    :param size_factors: size factors for X, data are divided by size factors before moments are computed.
+    :return: tuple (group_size, sums, sums_sq) with shapes (groups,), (groups x features) and (groups x features),
+        in double precision.
+    """
+    grouping = np.asarray(grouping).flatten()
+    n_groups = int(np.max(grouping)) + 1 if grouping.size > 0 else 0
+    group_size = np.bincount(grouping, minlength=n_groups).astype(np.float64)
+    weights = _inverse_size_factors(size_factors, n_obs=grouping.size)
+    moments = _reduce_observations(
+        x=x,
+        fun=lambda block, rows, cols: _groupwise_moments_block(block, grouping[rows], n_groups, weights[rows])
+    )
+    return group_size, moments[:n_groups], moments[n_groups:]
+
+
+def _grouping_key(
+        grouping: Union[np.ndarray, None],
+        n_obs: int = None
+) -> tuple:
+    """
+    Key of a grouping of observations in a dictionary of group-wise moments, see _groupwise_moments_cached().
+
+    Groupings are keyed by a digest of their group indices, the single group of all observations has a fixed key
+    that is built without group indices.
+
+    :param grouping: Group index of each observation as int64 array, None for the single group of all observations.
+    :param n_obs: Number of observations, only used if grouping is None.
+    :return: Key.
+    """
+    if grouping is None or not np.any(grouping):
+        return "all", n_obs if grouping is None else grouping.size
+    return "digest", grouping.size, hashlib.sha1(np.ascontiguousarray(grouping)).hexdigest()
+
+
+def _groupwise_moments_cached(
+        x,
+        grouping: np.ndarray,
+        size_factors,
+        moments: Union[dict, None]
+):
+    """
+    Group-wise moments by groupwise_moments(), reused across calls through the dictionary moments.
+
+    Moments of a grouping that merges groups of an already computed grouping, such as the single group of an
+    intercept-only model, are aggregated from the finer grouping without another pass over the data.
+
+    :param moments: Dictionary to keep moments in, moments are not kept if None. All calls that share a dictionary
+        have to use the same data and size factors. Entries are tuples (grouping, group_size, sums, sums_sq) by
+        _grouping_key(), groupings are kept in the smallest integer type that holds their group indices so that they
+        can be merged, None for the single group of all observations.
+    :return: tuple (group_size, sums, sums_sq), see groupwise_moments().
+    """
+    if moments is None:
+        return groupwise_moments(x=x, grouping=grouping, size_factors=size_factors)
+    grouping = np.asarray(grouping, dtype=np.int64).flatten()
+    key = _grouping_key(grouping)
+    if key not in moments:
+        n_groups = int(np.max(grouping)) + 1 if grouping.size > 0 else 0
+        grouping_compact = grouping.astype(np.min_scalar_type(max(n_groups - 1, 0))) if key[0] != "all" else None
+        for grouping_fine, group_size, sums, sums_sq in list(moments.values()):
+            if grouping_fine is None or grouping_fine.shape != grouping.shape:
+                continue
+            _, idx_first = np.unique(grouping_fine, return_index=True)
+            merge = grouping[idx_first]  # group of the coarse grouping by group of the fine grouping
+            if np.all(merge[grouping_fine] == grouping):
+                merged = [np.zeros((n_groups,) + v.shape[1:]) for v in (group_size, sums, sums_sq)]
+                for m, v in zip(merged, (group_size, sums, sums_sq)):
+                    np.add.at(m, merge, v)
+                moments[key] = (grouping_compact,) + tuple(merged)
+                break
+        else:
+            moments[key] = (grouping_compact,) + groupwise_moments(x=x, grouping=grouping, size_factors=size_factors)
+    return moments[key][1:]
+
+
 def closedform_glm_mean(
         x: Union[np.ndarray, scipy.sparse.csr_matrix],
         dmat: np.ndarray,
         constraints=None,
         size_factors=None,
         link_fn: Union[callable, None] = None,
-        inv_link_fn: Union[callable, None] = None
+        inv_link_fn: Union[callable, None] = None,
+        moments: Union[dict, None] = None
 ):
     r"""
     Calculates a closed-form solution for the mean parameters of GLMs.
@@ -100,16 +263,18 @@ def closedform_glm_mean(
         This form of constraints is used in vector generalized linear models (VGLMs).
     :param size_factors: size factors for X
     :param link_fn: linker function for GLM
+    :param moments: optional, dictionary of group-wise moments shared with other closed-form solutions on the same
+        data, see _groupwise_moments_cached()
     :return: tuple: (groupwise_means, mu, rmsd)
     """
-    if size_factors is not None:
-        x = np.divide(x, size_factors)
-
     def apply_fun(grouping):
-        groupwise_means = np.asarray(np.vstack([
-            np.mean(x[np.where(grouping == g)[0], :], axis=0)
-            for g in np.unique(grouping)
-        ]))
+        group_size, sums, _ = _groupwise_moments_cached(
+            x=x,
+            grouping=grouping,
+            size_factors=size_factors,
+            moments=moments
+        )
+        groupwise_means = sums / group_size[:, np.newaxis]
         if link_fn is None:
             return groupwise_means
         else:
@@ -134,7 +299,8 @@ def closedform_glm_scale(
         groupwise_means=None,
         link_fn=None,
         inv_link_fn=None,
-        compute_scales_fun=None
+        compute_scales_fun=None,
+        moments: Union[dict, None] = None
 ):
     r"""
     Calculates a closed-form solution for the scale parameters of GLMs.
@@ -143,33 +309,27 @@ def closedform_glm_scale(
     :param constraints: some design constraints
     :param size_factors: size factors for X
     :param groupwise_means: optional, in case if already computed this can be specified to spare double-calculation
+    :param moments: optional, dictionary of group-wise moments shared with other closed-form solutions on the same
+        data, see _groupwise_moments_cached()
     :return: tuple (groupwise_scales, logphi, rmsd)
     """
-    if size_factors is not None:
-        x = x / size_factors
-
     # to circumvent nonlocal error
     provided_groupwise_means = groupwise_means
 
     def apply_fun(grouping):
-        # Calculate group-wise means if not supplied. These are required for variance and MME computation.
+        # Counts, sums and sums of squares by group in one pass, these are required for variance and MME computation.
+        group_size, sums, sums_sq = _groupwise_moments_cached(
+            x=x,
+            grouping=grouping,
+            size_factors=size_factors,
+            moments=moments
+        )
         if provided_groupwise_means is None:
-            gw_means = np.asarray(np.vstack([
-                np.mean(x[np.where(grouping == g)[0], :], axis=0)
-                for g in np.unique(grouping)
-            ]))
+            gw_means = sums / group_size[:, np.newaxis]
         else:
             gw_means = provided_groupwise_means
 
-        # calculated variance via E(x)^2 or directly depending on whether `mu` was specified
-        if isinstance(x, scipy.sparse.csr_matrix):
-            expect_xsq = np.asarray(np.vstack([
-                np.asarray(np.mean(x[np.where(grouping == g)[0], :].power(2), axis=0))
-                for g in np.unique(grouping)]
-            ))
-        else:
-            expect_xsq = np.vstack([np.mean(np.square(x[np.where(grouping == g)[0], :]), axis=0)
-                                    for g in np.unique(grouping)])
+        expect_xsq = sums_sq / group_size[:, np.newaxis]
         expect_x_sq = np.square(gw_means)
         variance = expect_xsq - expect_x_sq
 
@@ -192,3 +352,158 @@ def closedform_glm_scale(
         return inv_link_fn(linker_groupwise_scales), scaleparam, rmsd
     else:
         return linker_groupwise_scales, scaleparam, rmsd
+
+
+def _design_with_constraints(dmat, constraints):
+    if isinstance(dmat, dask.array.core.Array):
+        dmat = dmat.compute()
+    if isinstance(constraints, dask.array.core.Array):
+        constraints = constraints.compute()
+    dmat = np.asarray(dmat, dtype=np.float64)
+    if constraints is None:
+        return dmat
+    return np.matmul(dmat, np.asarray(constraints, dtype=np.float64))
+
+
+def intercept_param(dmat, constraints=None):
+    """
+    Index of the parameter that enters the linear predictor of every observation with a coefficient of one, ie. the
+    intercept of a model.
+
+    :param dmat: design matrix
+    :param constraints: tensor (all parameters x dependent parameters) of the model
+    :return: index of the first intercept parameter, None if the model has no intercept
+    """
+    xh = _design_with_constraints(dmat, constraints)
+    is_intercept = np.all(xh == 1., axis=0)
+    if not np.any(is_intercept):
+        return None
+    return int(np.argmax(is_intercept))
+
+
+def lstsq_glm_mean(
+        x,
+        dmat: np.ndarray,
+        constraints=None,
+        size_factors=None,
+        transform_fn: Union[callable, None] = None,
+        log_link: bool = False
+):
+    r"""
+    Calculates an approximate solution for the mean parameters of GLMs with arbitrary design matrices.
+
+    The transformed data transform_fn(x / size_factors), eg. log(1 + x) for a log link, are regressed on the design
+    matrix for all features at once: The design matrix is decomposed once as X = QR and the data only enter through
+    the single product Q^T y, which is computed block by block. In contrast to closedform_glm_mean(), this does not
+    depend on the number of unique rows of the design matrix, ie. it also applies to continuous covariates.
+    Sparse data stay sparse if transform_fn maps zero to zero.
+
+    :param x: The input data array (observations x features)
+    :param dmat: design matrix for location
+    :param constraints: tensor (all parameters x dependent parameters)
+        Tensor that encodes how complete parameter set which includes dependent
+        parameters arises from indepedent parameters: all = <constraints, indep>.
+        This form of constraints is used in vector generalized linear models (VGLMs).
+    :param size_factors: size factors for X
+    :param transform_fn: transformation of the data to the linker space, no transformation if None
+    :param log_link: Whether the location model has a log link. If the design spans an intercept, the intercept is
+        then shifted so that the fitted means exp(X a) match the data means by feature, which corrects the bias of
+        transformations such as log(1 + x) at low means. The data sums are computed in the same pass as Q^T y.
+    :return: (inferred param x features)
+    """
+    xh = _design_with_constraints(dmat, constraints)
+    q, r = np.linalg.qr(xh)
+    weights = _inverse_size_factors(size_factors, n_obs=xh.shape[0])
+    transform_sparse = transform_fn is None or transform_fn(np.zeros([1]))[0] == 0.
+
+    def fun(block, rows, cols):
+        block = _as_float64(block)
+        if isinstance(block, scipy.sparse.spmatrix):
+            if not transform_sparse:
+                block = block.toarray()
+            else:
+                block = scipy.sparse.csr_matrix(block.multiply(weights[rows][:, np.newaxis]))
+                sums = np.asarray(block.sum(axis=0))
+                if transform_fn is not None:
+                    block.data = transform_fn(block.data)
+                return np.vstack([np.asarray(block.T @ q[rows]).T, sums])
+        block = block * weights[rows][:, np.newaxis]
+        sums = np.sum(block, axis=0, keepdims=True)
+        if transform_fn is not None:
+            block = transform_fn(block)
+        return np.vstack([np.matmul(q[rows].T, block), sums])
+
+    qty_sums = _reduce_observations(x=x, fun=fun)
+    qty, sums = qty_sums[:-1], qty_sums[-1]
+    # Least squares on the triangular factor, which also handles rank deficient designs:
+    a = np.linalg.lstsq(r, qty, rcond=None)[0]
+    if log_link:
+        # Parameter shift that adds one to the linear predictor of every observation, if any:
+        intercept = np.linalg.lstsq(xh, np.ones([xh.shape[0]]), rcond=None)[0]
+        if np.allclose(np.matmul(xh, intercept), 1.):
+            sum_mean = np.sum(np.exp(np.matmul(xh, a)), axis=0)
+            valid = np.logical_and(sums > 0, sum_mean > 0)
+            shift = np.zeros_like(sums)
+            shift[valid] = np.log(sums[valid]) - np.log(sum_mean[valid])
+            a = a + np.outer(intercept, shift)
+    return a
+
+
+def lstsq_glm_scale(
+        x,
+        dmat: np.ndarray,
+        constraints=None,
+        a=None,
+        size_factors=None,
+        inv_link_fn: Union[callable, None] = None,
+        link_fn: Union[callable, None] = None,
+        compute_scales_fun: Union[callable, None] = None
+):
+    r"""
+    Calculates an approximate solution for a scale parameter shared by all observations of a feature given the
+    mean parameters of GLMs with arbitrary design matrices, such as those of lstsq_glm_mean().
+
+    The moments of the data x / size_factors around the fitted means are pooled over all observations of a feature
+    in a single pass over the data, sparse data are not densified.
+
+    :param x: The input data array (observations x features)
+    :param dmat: design matrix for location
+    :param constraints: tensor (all parameters x dependent parameters) of the location model
+    :param a: Location model parameters (inferred param x features)
+    :param size_factors: size factors for X
+    :param inv_link_fn: inverse linker function of the location model
+    :param link_fn: linker function of the scale model
+    :param compute_scales_fun: Function of the number of observations and the sums over observations of means,
+        squared means and squared residuals by feature that returns the scale by feature. The pooled variance if None.
+    :return: (features,)
+    """
+    xh = _design_with_constraints(dmat, constraints)
+    a = np.asarray(a, dtype=np.float64)
+    weights = _inverse_size_factors(size_factors, n_obs=xh.shape[0])
+
+    def fun(block, rows, cols):
+        block = _as_float64(block)
+        eta = np.matmul(xh[rows], a[:, cols])
+        mean = inv_link_fn(eta) if inv_link_fn is not None else eta
+        sum_mean = np.sum(mean, axis=0)
+        sum_mean_sq = np.sum(np.square(mean), axis=0)
+        if isinstance(block, scipy.sparse.spmatrix):
+            block = scipy.sparse.csr_matrix(block.multiply(weights[rows][:, np.newaxis]))
+            # sum (x - mean)^2 = sum x^2 - 2 sum x mean + sum mean^2, the first two terms only on nonzero entries:
+            sum_residual_sq = np.asarray(block.multiply(block).sum(axis=0)).flatten() - \
+                2. * np.asarray(block.multiply(mean).sum(axis=0)).flatten() + sum_mean_sq
+        else:
+            block = block * weights[rows][:, np.newaxis]
+            sum_residual_sq = np.sum(np.square(block - mean), axis=0)
+        return np.vstack([sum_mean, sum_mean_sq, sum_residual_sq])
+
+    sum_mean, sum_mean_sq, sum_residual_sq = _reduce_observations(x=x, fun=fun)
+    n = xh.shape[0]
+    if compute_scales_fun is not None:
+        scales = compute_scales_fun(n, sum_mean, sum_mean_sq, sum_residual_sq)
+    else:
+        scales = sum_residual_sq / n
+    if link_fn is not None:
+        return link_fn(scales)
+    else:
+        return scales
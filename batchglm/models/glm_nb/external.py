@@ -3,6 +3,8 @@ from batchglm.models.base_glm import InputDataGLM
 from batchglm.models.base_glm import _ModelGLM
 from batchglm.models.base_glm import _SimulatorGLM
 from batchglm.models.base_glm import closedform_glm_mean, closedform_glm_scale
+from batchglm.models.base_glm import lstsq_glm_mean, lstsq_glm_scale
+from batchglm.models.base_glm import intercept_param
 
 import batchglm.data as data_utils
 from batchglm.utils.linalg import groupwise_solve_lm
@@ -5,6 +5,10 @@ import scipy.sparse
 from typing import Union
 
 from .external import closedform_glm_mean, closedform_glm_scale
+from .external import lstsq_glm_mean, lstsq_glm_scale
+from .external import intercept_param
+
+logger = logging.getLogger("batchglm")
 
 
 def closedform_nb_glm_logmu(
@@ -13,7 +17,8 @@ def closedform_nb_glm_logmu(
         constraints_loc,
         size_factors=None,
         link_fn=np.log,
-        inv_link_fn=np.exp
+        inv_link_fn=np.exp,
+        moments=None
 ):
     r"""
     Calculates a closed-form solution for the `mu` parameters of negative-binomial GLMs.
@@ -25,6 +30,7 @@ def closedform_nb_glm_logmu(
         parameters arises from indepedent parameters: all = <constraints, indep>.
         This form of constraints is used in vector generalized linear models (VGLMs).
     :param size_factors: size factors for X
+    :param moments: optional, dictionary of group-wise moments shared between closed-form solutions on the same data
     :return: tuple: (groupwise_means, mu, rmsd)
     """
     return closedform_glm_mean(
@@ -33,7 +39,8 @@ def closedform_nb_glm_logmu(
         constraints=constraints_loc,
         size_factors=size_factors,
         link_fn=link_fn,
-        inv_link_fn=inv_link_fn
+        inv_link_fn=inv_link_fn,
+        moments=moments
     )
 
 
@@ -44,7 +51,8 @@ def closedform_nb_glm_logphi(
         size_factors=None,
         groupwise_means=None,
         link_fn=np.log,
-        invlink_fn=np.exp
+        invlink_fn=np.exp,
+        moments=None
 ):
     r"""
     Calculates a closed-form solution for the log-scale parameters of negative-binomial GLMs.
@@ -55,6 +63,7 @@ def closedform_nb_glm_logphi(
     :param constraints: some design constraints
     :param size_factors: size factors for X
     :param groupwise_means: optional, in case if already computed this can be specified to spare double-calculation
+    :param moments: optional, dictionary of group-wise moments shared between closed-form solutions on the same data
     :return: tuple (groupwise_scales, logphi, rmsd)
     """
 
@@ -71,6 +80,75 @@ def closedform_nb_glm_logphi(
         groupwise_means=groupwise_means,
         link_fn=link_fn,
         inv_link_fn=invlink_fn,
+        compute_scales_fun=compute_scales_fun,
+        moments=moments
+    )
+
+
+def lstsq_nb_glm_logmu(
+        x: Union[np.ndarray, scipy.sparse.csr_matrix],
+        design_loc: np.ndarray,
+        constraints_loc,
+        size_factors=None,
+        transform_fn=np.log1p
+):
+    r"""
+    Calculates an approximate solution for the `mu` parameters of negative-binomial GLMs with arbitrary design
+    matrices by least squares of log(1 + x), see lstsq_glm_mean(). The intercept is corrected such that the fitted
+    means match the data means.
+
+    :param x: The sample data
+    :param design_loc: design matrix for location
+    :param constraints_loc: tensor (all parameters x dependent parameters)
+        Tensor that encodes how complete parameter set which includes dependent
+        parameters arises from indepedent parameters: all = <constraints, indep>.
+        This form of constraints is used in vector generalized linear models (VGLMs).
+    :param size_factors: size factors for X
+    :return: (inferred param x features)
+    """
+    return lstsq_glm_mean(
+        x=x,
+        dmat=design_loc,
+        constraints=constraints_loc,
+        size_factors=size_factors,
+        transform_fn=transform_fn,
+        log_link=True
+    )
+
+
+def lstsq_nb_glm_logphi(
+        x: Union[np.ndarray, scipy.sparse.csr_matrix],
+        design_loc: np.ndarray,
+        constraints_loc,
+        a: np.ndarray,
+        size_factors=None,
+        link_fn=np.log
+):
+    r"""
+    Calculates an approximate solution for the log-scale parameter of negative-binomial GLMs that is shared by all
+    observations of a feature, given location model parameters of an arbitrary design matrix.
+    Based on the Method-of-Moments estimator pooled over observations, 1 / phi = sum((x - mu)^2 - mu) / sum(mu^2).
+
+    :param x: The sample data
+    :param design_loc: design matrix for location
+    :param constraints_loc: constraints of the location model
+    :param a: location model parameters (inferred param x features)
+    :param size_factors: size factors for X
+    :return: (features,)
+    """
+
+    def compute_scales_fun(n, sum_mean, sum_mean_sq, sum_residual_sq):
+        denominator = np.fmax(sum_residual_sq - sum_mean, np.sqrt(np.nextafter(0, 1, dtype=sum_mean.dtype)))
+        return sum_mean_sq / denominator
+
+    return lstsq_glm_scale(
+        x=x,
+        dmat=design_loc,
+        constraints=constraints_loc,
+        a=a,
+        size_factors=size_factors,
+        inv_link_fn=np.exp,
+        link_fn=link_fn,
         compute_scales_fun=compute_scales_fun
     )
 
@@ -88,6 +166,9 @@ def init_par(
     closed-form:
     Initialize with Maximum Likelihood / Maximum of Momentum estimators
 
+    lstsq:
+    Least squares regression of the transformed data on the design, for designs with continuous covariates.
+
     Idea:
     $$
         \theta &= f(x) \\
@@ -103,6 +184,7 @@ def init_par(
     if init_model is None:
         groupwise_means = None
         init_a_str = None
+        init_a_lstsq = False
         if isinstance(init_a, str):
             init_a_str = init_a.lower()
             # Chose option if auto was chosen
@@ -114,7 +196,11 @@ def init_par(
                 one_hot = len(np.unique(dloc)) == 2 and \
                     np.abs(np.min(dloc) - 0.) == 0. and \
                     np.abs(np.max(dloc) - 1.) == 0.
-                init_a = "standard" if not one_hot else "closed_form"
+                if one_hot:
+                    init_a = "closed_form"
+                else:
+                    # Designs with continuous covariates:
+                    init_a = "lstsq" if dloc.shape[1] > 1 else "standard"
 
             if init_a.lower() == "closed_form":
                 groupwise_means, init_a, rmsd_a = closedform_nb_glm_logmu(
@@ -122,7 +208,8 @@ def init_par(
                     design_loc=input_data.design_loc,
                     constraints_loc=input_data.constraints_loc,
                     size_factors=input_data.size_factors,
-                    link_fn=lambda mu: np.log(mu+np.nextafter(0, 1, dtype=mu.dtype))
+                    link_fn=lambda mu: np.log(mu+np.nextafter(0, 1, dtype=mu.dtype)),
+                    moments=input_data.groupwise_moments
                 )
 
                 # train mu, if the closed-form solution is inaccurate
@@ -131,8 +218,17 @@ def init_par(
                 if input_data.size_factors is not None:
                     if np.any(input_data.size_factors != 1):
                         train_loc = True
+            elif init_a.lower() == "lstsq":
+                init_a = lstsq_nb_glm_logmu(
+                    x=input_data.x,
+                    design_loc=input_data.design_loc,
+                    constraints_loc=input_data.constraints_loc,
+                    size_factors=input_data.size_factors
+                )
+                init_a_lstsq = True
+                train_loc = True
             elif init_a.lower() == "standard":
-                overall_means = np.mean(input_data.x, axis=0)  # directly calculate the mean
+                overall_means = input_data.feature_statistics["mean"]
                 init_a = np.zeros([input_data.num_loc_params, input_data.num_features])
                 init_a[0, :] = np.log(overall_means)
                 train_loc = True
@@ -144,7 +240,17 @@ def init_par(
 
         if isinstance(init_b, str):
             if init_b.lower() == "auto":
-                init_b = "standard"
+                # Scale model init that matches the location model init of designs with continuous covariates:
+                init_b = "lstsq" if init_a_lstsq else "standard"
+            if init_b.lower() == "lstsq":
+                # The least squares init is a scale shared by all observations, ie. the intercept of the scale model:
+                intercept_b = intercept_param(
+                    dmat=input_data.design_scale,
+                    constraints=input_data.constraints_scale
+                )
+                if intercept_b is None:
+                    logger.debug("Scale model has no intercept, using standard initialization instead of lstsq")
+                    init_b = "standard"
 
             if init_b.lower() == "standard":
                 groupwise_scales, init_b_intercept, rmsd_b = closedform_nb_glm_logphi(
@@ -153,7 +259,8 @@ def init_par(
                     constraints=input_data.constraints_scale[[0], :][:, [0]],
                     size_factors=input_data.size_factors,
                     groupwise_means=None,
-                    link_fn=lambda r: np.log(r+np.nextafter(0, 1, dtype=r.dtype))
+                    link_fn=lambda r: np.log(r+np.nextafter(0, 1, dtype=r.dtype)),
+                    moments=input_data.groupwise_moments
                 )
                 init_b = np.zeros([input_data.num_scale_params, input_data.num_features])
                 init_b[0, :] = init_b_intercept
@@ -178,7 +285,18 @@ def init_par(
                     constraints=input_data.constraints_scale,
                     size_factors=input_data.size_factors,
                     groupwise_means=groupwise_means,
-                    link_fn=lambda r: np.log(r)
+                    link_fn=lambda r: np.log(r),
+                    moments=input_data.groupwise_moments
+                )
+            elif init_b.lower() == "lstsq":
+                init_b = np.zeros([input_data.num_scale_params, input_data.num_features])
+                init_b[intercept_b, :] = lstsq_nb_glm_logphi(
+                    x=input_data.x,
+                    design_loc=input_data.design_loc,
+                    constraints_loc=input_data.constraints_loc,
+                    a=init_a,
+                    size_factors=input_data.size_factors,
+                    link_fn=lambda r: np.log(r+np.nextafter(0, 1, dtype=r.dtype))
                 )
             elif init_b.lower() == "all_zero":
                 init_b = np.zeros([input_data.num_scale_params, input_data.x.shape[1]])
@@ -2,6 +2,7 @@ import numpy as np
 
 from .model import Model
 from .external import InputDataGLM, _SimulatorGLM
+from .utils import param_bounds
 
 
 class Simulator(_SimulatorGLM, Model):
@@ -53,3 +54,9 @@ class Simulator(_SimulatorGLM, Model):
             design_loc_names=None,
             design_scale_names=None
         )
+
+    def param_bounds(
+            self,
+            dtype
+    ):
+        return param_bounds(dtype=dtype)
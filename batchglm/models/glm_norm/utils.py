@@ -1,9 +1,13 @@
+import dask
 import logging
 import numpy as np
 import scipy.sparse
 from typing import Union
 
 from .external import closedform_glm_mean, closedform_glm_scale
+from .external import lstsq_glm_mean, lstsq_glm_scale
+from .external import intercept_param
+from .external import pkg_constants
 
 logger = logging.getLogger("batchglm")
 
@@ -14,7 +18,8 @@ def closedform_norm_glm_mean(
         constraints_loc,
         size_factors=None,
         link_fn=lambda x: x,
-        inv_link_fn=lambda x: x
+        inv_link_fn=lambda x: x,
+        moments=None
 ):
     r"""
     Calculates a closed-form solution for the `mean` parameters of normal GLMs.
@@ -26,6 +31,7 @@ def closedform_norm_glm_mean(
         parameters arises from indepedent parameters: all = <constraints, indep>.
         This form of constraints is used in vector generalized linear models (VGLMs).
     :param size_factors: size factors for X
+    :param moments: optional, dictionary of group-wise moments shared between closed-form solutions on the same data
     :return: tuple: (groupwise_means, mean, rmsd)
     """
     return closedform_glm_mean(
@@ -34,7 +40,8 @@ def closedform_norm_glm_mean(
         constraints=constraints_loc,
         size_factors=size_factors,
         link_fn=link_fn,
-        inv_link_fn=inv_link_fn
+        inv_link_fn=inv_link_fn,
+        moments=moments
     )
 
 
@@ -44,7 +51,8 @@ def closedform_norm_glm_logsd(
         constraints=None,
         size_factors=None,
         groupwise_means=None,
-        link_fn=np.log
+        link_fn=np.log,
+        moments=None
 ):
     r"""
     Calculates a closed-form solution for the log-scale parameters of normal GLMs.
@@ -54,6 +62,7 @@ def closedform_norm_glm_logsd(
     :param constraints: some design constraints
     :param size_factors: size factors for X
     :param groupwise_means: optional, in case if already computed this can be specified to spare double-calculation
+    :param moments: optional, dictionary of group-wise moments shared between closed-form solutions on the same data
     :return: tuple (groupwise_scales, logsd, rmsd)
     """
 
@@ -68,5 +77,293 @@ def closedform_norm_glm_logsd(
         size_factors=size_factors,
         groupwise_means=groupwise_means,
         link_fn=link_fn,
+        compute_scales_fun=compute_scales_fun,
+        moments=moments
+    )
+
+
+def lstsq_norm_glm_mean(
+        x: Union[np.ndarray, scipy.sparse.csr_matrix],
+        design_loc: np.ndarray,
+        constraints_loc,
+        size_factors=None
+):
+    r"""
+    Calculates the least squares solution for the `mean` parameters of normal GLMs with arbitrary design matrices,
+    see lstsq_glm_mean().
+
+    :param x: The sample data
+    :param design_loc: design matrix for location
+    :param constraints_loc: tensor (all parameters x dependent parameters)
+        Tensor that encodes how complete parameter set which includes dependent
+        parameters arises from indepedent parameters: all = <constraints, indep>.
+        This form of constraints is used in vector generalized linear models (VGLMs).
+    :param size_factors: size factors for X
+    :return: (inferred param x features)
+    """
+    return lstsq_glm_mean(
+        x=x,
+        dmat=design_loc,
+        constraints=constraints_loc,
+        size_factors=size_factors,
+        transform_fn=None
+    )
+
+
+def lstsq_norm_glm_logsd(
+        x: Union[np.ndarray, scipy.sparse.csr_matrix],
+        design_loc: np.ndarray,
+        constraints_loc,
+        a: np.ndarray,
+        size_factors=None,
+        link_fn=np.log
+):
+    r"""
+    Calculates the log standard deviation of normal GLMs that is shared by all observations of a feature, given
+    location model parameters of an arbitrary design matrix, from the residuals pooled over observations.
+
+    :param x: The sample data
+    :param design_loc: design matrix for location
+    :param constraints_loc: constraints of the location model
+    :param a: location model parameters (inferred param x features)
+    :param size_factors: size factors for X
+    :return: (features,)
+    """
+
+    def compute_scales_fun(n, sum_mean, sum_mean_sq, sum_residual_sq):
+        return np.sqrt(np.fmax(sum_residual_sq, 0.) / n)
+
+    return lstsq_glm_scale(
+        x=x,
+        dmat=design_loc,
+        constraints=constraints_loc,
+        a=a,
+        size_factors=size_factors,
+        inv_link_fn=None,
+        link_fn=link_fn,
         compute_scales_fun=compute_scales_fun
     )
+
+
+def init_par(
+        input_data,
+        init_a,
+        init_b,
+        init_model
+):
+    r"""
+    standard:
+    Only initialise intercept and keep other coefficients as zero.
+
+    closed-form:
+    Initialize with Maximum Likelihood / Maximum of Momentum estimators
+
+    lstsq:
+    Least squares regression of the transformed data on the design, for designs with continuous covariates.
+
+    Idea:
+    $$
+        \theta &= f(x) \\
+        \Rightarrow f^{-1}(\theta) &= x \\
+            &= (D \cdot D^{+}) \cdot x \\
+            &= D \cdot (D^{+} \cdot x) \\
+            &= D \cdot x' = f^{-1}(\theta)
+    $$
+    """
+    train_loc = True
+    train_scale = True
+
+    if init_model is None:
+        groupwise_means = None
+        init_a_str = None
+        init_a_lstsq = False
+        if isinstance(init_a, str):
+            init_a_str = init_a.lower()
+            # Chose option if auto was chosen
+            if init_a.lower() == "auto":
+                if isinstance(input_data.design_loc, dask.array.core.Array):
+                    dloc = input_data.design_loc.compute()
+                else:
+                    dloc = input_data.design_loc
+                one_hot = len(np.unique(dloc)) == 2 and \
+                    np.abs(np.min(dloc) - 0.) == 0. and \
+                    np.abs(np.max(dloc) - 1.) == 0.
+                if one_hot:
+                    init_a = "closed_form"
+                else:
+                    # Designs with continuous covariates:
+                    init_a = "lstsq" if dloc.shape[1] > 1 else "standard"
+
+            if init_a.lower() == "closed_form":
+                groupwise_means, init_a, rmsd_a = closedform_norm_glm_mean(
+                    x=input_data.x,
+                    design_loc=input_data.design_loc,
+                    constraints_loc=input_data.constraints_loc,
+                    size_factors=input_data.size_factors,
+                    moments=input_data.groupwise_moments
+                )
+
+                # train mean, if the closed-form solution is inaccurate
+                train_loc = not (np.all(np.abs(rmsd_a) < 1e-20) or rmsd_a.size == 0)
+
+                if input_data.size_factors is not None:
+                    if np.any(input_data.size_factors != 1):
+                        train_loc = True
+            elif init_a.lower() == "lstsq":
+                init_a = lstsq_norm_glm_mean(
+                    x=input_data.x,
+                    design_loc=input_data.design_loc,
+                    constraints_loc=input_data.constraints_loc,
+                    size_factors=input_data.size_factors
+                )
+                init_a_lstsq = True
+                train_loc = True
+            elif init_a.lower() == "standard":
+                overall_means = input_data.feature_statistics["mean"]
+                init_a = np.zeros([input_data.num_loc_params, input_data.num_features])
+                init_a[0, :] = overall_means
+                train_loc = True
+            elif init_a.lower() == "all_zero":
+                init_a = np.zeros([input_data.num_loc_params, input_data.num_features])
+                train_loc = True
+            else:
+                raise ValueError("init_a string %s not recognized" % init_a)
+
+        if isinstance(init_b, str):
+            if init_b.lower() == "auto":
+                # Scale model init that matches the location model init of designs with continuous covariates:
+                init_b = "lstsq" if init_a_lstsq else "standard"
+            if init_b.lower() == "lstsq":
+                # The least squares init is a scale shared by all observations, ie. the intercept of the scale model:
+                intercept_b = intercept_param(
+                    dmat=input_data.design_scale,
+                    constraints=input_data.constraints_scale
+                )
+                if intercept_b is None:
+                    logger.debug("Scale model has no intercept, using standard initialization instead of lstsq")
+                    init_b = "standard"
+
+            if init_b.lower() == "standard":
+                groupwise_scales, init_b_intercept, rmsd_b = closedform_norm_glm_logsd(
+                    x=input_data.x,
+                    design_scale=input_data.design_scale[:, [0]],
+                    constraints=input_data.constraints_scale[[0], :][:, [0]],
+                    size_factors=input_data.size_factors,
+                    groupwise_means=None,
+                    link_fn=lambda sd: np.log(sd + np.nextafter(0, 1, dtype=sd.dtype)),
+                    moments=input_data.groupwise_moments
+                )
+                init_b = np.zeros([input_data.num_scale_params, input_data.num_features])
+                init_b[0, :] = init_b_intercept
+            elif init_b.lower() == "closed_form":
+                dmats_unequal = False
+                if input_data.design_loc.shape[1] == input_data.design_scale.shape[1]:
+                    if np.any(input_data.design_loc != input_data.design_scale):
+                        dmats_unequal = True
+
+                inits_unequal = False
+                if init_a_str is not None:
+                    if init_a_str != init_b:
+                        inits_unequal = True
+
+                if inits_unequal or dmats_unequal:
+                    raise ValueError("cannot use closed_form init for scale model " +
+                                     "if scale model differs from loc model")
+
+                groupwise_scales, init_b, rmsd_b = closedform_norm_glm_logsd(
+                    x=input_data.x,
+                    design_scale=input_data.design_scale,
+                    constraints=input_data.constraints_scale,
+                    size_factors=input_data.size_factors,
+                    groupwise_means=groupwise_means,
+                    link_fn=lambda sd: np.log(sd + np.nextafter(0, 1, dtype=sd.dtype)),
+                    moments=input_data.groupwise_moments
+                )
+            elif init_b.lower() == "lstsq":
+                init_b = np.zeros([input_data.num_scale_params, input_data.num_features])
+                init_b[intercept_b, :] = lstsq_norm_glm_logsd(
+                    x=input_data.x,
+                    design_loc=input_data.design_loc,
+                    constraints_loc=input_data.constraints_loc,
+                    a=init_a,
+                    size_factors=input_data.size_factors,
+                    link_fn=lambda sd: np.log(sd + np.nextafter(0, 1, dtype=sd.dtype))
+                )
+            elif init_b.lower() == "all_zero":
+                init_b = np.zeros([input_data.num_scale_params, input_data.x.shape[1]])
+            else:
+                raise ValueError("init_b string %s not recognized" % init_b)
+    else:
+        # Locations model:
+        if isinstance(init_a, str) and (init_a.lower() == "auto" or init_a.lower() == "init_model"):
+            my_loc_names = set(input_data.loc_names)
+            my_loc_names = my_loc_names.intersection(set(init_model.input_data.loc_names))
+
+            init_loc = np.zeros([input_data.num_loc_params, input_data.num_features])
+            for parm in my_loc_names:
+                init_idx = np.where(init_model.input_data.loc_names == parm)[0]
+                my_idx = np.where(input_data.loc_names == parm)[0]
+                init_loc[my_idx] = init_model.a_var[init_idx]
+
+            init_a = init_loc
+            logging.getLogger("batchglm").debug("Using initialization based on input model for mean")
+
+        # Scale model:
+        if isinstance(init_b, str) and (init_b.lower() == "auto" or init_b.lower() == "init_model"):
+            my_scale_names = set(input_data.scale_names)
+            my_scale_names = my_scale_names.intersection(init_model.input_data.scale_names)
+
+            init_scale = np.zeros([input_data.num_scale_params, input_data.num_features])
+            for parm in my_scale_names:
+                init_idx = np.where(init_model.input_data.scale_names == parm)[0]
+                my_idx = np.where(input_data.scale_names == parm)[0]
+                init_scale[my_idx] = init_model.b_var[init_idx]
+
+            init_b = init_scale
+            logging.getLogger("batchglm").debug("Using initialization based on input model for standard deviation")
+
+    return init_a, init_b, train_loc, train_scale
+
+
+def param_bounds(dtype):
+    """
+    Bounds of parameters and derived quantities of the normal model, shared by simulation and training.
+
+    :param dtype: Type of parameters.
+    :return: Tuple of dictionaries (lower bounds, upper bounds) by quantity.
+    """
+    dtype = np.dtype(dtype)
+    dmin = np.finfo(dtype).min
+    dmax = np.finfo(dtype).max
+    # Log-likelihoods are evaluated in double precision also if parameters are single precision:
+    ll_min = np.log(np.nextafter(0, np.inf, dtype=np.promote_types(dtype, np.float64)))
+    # Lower bounds of single precision quantities are kept out of the subnormal range, in which elementwise
+    # arithmetic is slow and inaccurate:
+    if dtype.itemsize < 8:
+        dmin_positive = np.finfo(dtype).tiny
+    else:
+        dmin_positive = np.nextafter(0, np.inf, dtype=dtype)
+    dtype = dtype.type
+
+    sf = dtype(pkg_constants.ACCURACY_MARGIN_RELATIVE_TO_LIMIT)
+    bounds_min = {
+        "a_var": np.nextafter(dmin, np.inf, dtype=dtype) / sf,
+        "b_var": np.log(dmin_positive) / sf,
+        "eta_loc": np.nextafter(dmin, np.inf, dtype=dtype) / sf,
+        "eta_scale": np.log(dmin_positive) / sf,
+        "loc": np.nextafter(dmin, np.inf, dtype=dtype) / sf,
+        "scale": dmin_positive,
+        "likelihood": dtype(0),
+        "ll": ll_min,
+    }
+    bounds_max = {
+        "a_var": np.nextafter(dmax, -np.inf, dtype=dtype) / sf,
+        "b_var": np.nextafter(np.log(dmax), -np.inf, dtype=dtype) / sf,
+        "eta_loc": np.nextafter(dmax, -np.inf, dtype=dtype) / sf,
+        "eta_scale": np.nextafter(np.log(dmax), -np.inf, dtype=dtype) / sf,
+        "loc": np.nextafter(dmax, -np.inf, dtype=dtype) / sf,
+        "scale": np.nextafter(dmax, -np.inf, dtype=dtype) / sf,
+        "likelihood": dtype(1),
+        "ll": dtype(0),
+    }
+    return bounds_min, bounds_max
@@ -8,6 +8,8 @@ JACOBIAN_MODE = str(os.environ.get('JACOBIAN_MODE', "analytic"))
 CHOLESKY_LSTSQS = False
 CHOLESKY_LSTSQS_BATCHED = False
 EVAL_ON_BATCHED = False
+# Memory in bytes available to blocks of observations when assembling normal equations in the numpy backend:
+NORMAL_EQUATIONS_MEMORY_BUDGET = int(float(os.environ.get('BATCHGLM_NORMAL_EQUATIONS_MEMORY_BUDGET', 2 ** 28)))
 
 # Trust region hyper parameters:
 TRUST_REGION_RADIUS_INIT = 100.
@@ -27,6 +29,10 @@ XTOL_BY_FEATURE_SCALE = 1e-6
 GTOL_BY_FEATURE_LOC = 1e-8
 GTOL_BY_FEATURE_SCALE = 1e-8
 
+# Vectorized Newton-Raphson line search for scale model:
+NEWTON_B_MAX_STEP = 5.
+NEWTON_B_MAX_HALVINGS = 20
+
 try:
     import tensorflow as tf
 
@@ -1,4 +1,5 @@
 import abc
+import copy
 import dask.array
 import logging
 import multiprocessing
@@ -6,17 +7,29 @@ import numpy as np
 import scipy
 import scipy.sparse
 import scipy.optimize
-import sparse
-import sys
 import time
 from typing import Tuple
 
 from .external import _EstimatorGLM, pkg_constants
+from .external import batched_spd_solve, batched_xtwx, batched_xtwy, SPD_SOLVE_CHOLESKY, SPD_SOLVE_PINV, SPD_SOLVE_FAILED
+from .external import PhaseTimer, ProgressPrinter, iteration_record
+from .histogram import CountHistogram
+from .sharding import balance_shards, _init_shard_worker, _train_shard
 from .training_strategies import TrainingStrategies
+from .worker_pool import ScaleWorkerPool
 
 logger = logging.getLogger("batchglm")
 
 
+def _compute(x):
+    """
+    Evaluate x if it is a dask array, return it unchanged otherwise.
+    """
+    if isinstance(x, dask.array.core.Array):
+        return x.compute()
+    return x
+
+
 class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
     """
     Estimator for Generalized Linear Models (GLMs).
@@ -28,8 +41,6 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
             input_data,
             dtype,
     ):
-        if input_data.design_scale.shape[1] != 1:
-            raise ValueError("cannot model more than one scale parameter with numpy backend right now.")
         _EstimatorGLM.__init__(
             self=self,
             model=model,
@@ -38,6 +49,26 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         self.dtype = dtype
         self.values = []
         self.lls = []
+        self._b_pool = None
+        # Count histograms and grouped sufficient statistics, built on first use:
+        self._histogram = None
+        self._use_histogram = False
+        self._use_grouped = False
+        # Cached sums of ll_nonsufficient() by feature of the count histogram and the scale parameters they refer to:
+        self._ll_nonsufficient = None
+        self._ll_nonsufficient_b_var = None
+        # Whether sums over observations are evaluated chunk by chunk:
+        self._stream_observations = False
+        # Full model and indices of features in the working model if training on a packed active set:
+        self._model_full = None
+        self._idx_active = None
+        # Times by phase and number of singular location model systems of the current iteration, for telemetry:
+        self._timer = PhaseTimer()
+        self._n_singular = 0
+        self._solve_status = np.zeros(
+            [self.model.model_vars.n_features],
+            dtype=[("iwls", np.int8), ("iwls_n_singular", np.int64), ("fisher_inv", np.int8)]
+        )
 
         self.TrainingStrategies = TrainingStrategies
 
@@ -53,6 +84,11 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
             lr_b: float = 1e-2,
             max_iter_b: int = 1000,
             nproc: int = 3,
+            active_set_threshold: float = None,
+            count_histogram: bool = False,
+            grouped_statistics: bool = False,
+            stream_observations: bool = False,
+            callbacks: list = None,
             **kwargs
     ):
         """
@@ -70,16 +106,63 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         save in ll_last_b_update. Full convergence is saved in fully_converged.
 
         :param max_steps:
-        :param method_b:
+        :param method_b: Optimizer used for scale model updates:
+
+            - "brent": scipy brent line search, run separately for each feature. Only available for scale models
+              with a single parameter, "newton" is used instead for scale models with multiple parameters.
+            - "newton": safeguarded Newton-Raphson line search, vectorized over features.
+            - "gd": gradient descent.
         :param update_b_freq: One over minimum frequency of scale model updates per location model update.
             A scale model update will be run at least every update_b_freq number of location model update iterations.
         :param ftol_b:
         :param lr_b:
         :param max_iter_b:
-        :param nproc:
+        :param nproc: Number of processes used for per-feature scale model line searches with method_b "brent".
+            A pool of worker processes is kept alive for the duration of training if nproc > 1.
+        :param active_set_threshold: Fraction of non-converged features in the working set below which the
+            working set is re-packed. If this is set, training runs on a compact copy of count data and parameters
+            of non-converged features only, so that the cost of an iteration scales with the number of
+            non-converged features. The working set is re-packed whenever the fraction of its features that are
+            not yet converged falls below this threshold. Not used if None.
+        :param count_histogram: Whether to run scale model updates on per-feature histograms of unique combinations
+            of count value and observation group (see CountHistogram) instead of on all observations.
+            The cost of a scale model likelihood evaluation is then proportional to the number of unique
+            combinations instead of the number of observations. Not used with method_b "gd".
+        :param grouped_statistics: Whether to train on sufficient statistics of observation groups, which are
+            the unique rows of design matrices and size factors. Location model updates and the likelihood are
+            then evaluated on (groups x features) arrays, terms of the likelihood that are not functions of count
+            sums fall back to count histograms, which are also used for scale model updates. This is efficient if
+            the number of groups is small, such as for designs of categorical covariates. Likelihoods used for
+            convergence are not clipped by observation in this mode.
+            Count histograms and grouped statistics are only available for count data, see ModelIwls.count_data.
+        :param stream_observations: Whether to evaluate location model updates and likelihoods chunk by chunk
+            over observations, with chunks of input_data.chunk_size_cells observations. Each chunk is loaded into
+            memory once per evaluation and only per-feature sums are kept, so that memory use does not grow with
+            the number of observations. Scale model updates still load blocks of input_data.chunk_size_genes
+            features with all observations.
+        :param callbacks: Functions that are called with a telemetry record after each iteration, see
+            batchglm.utils.telemetry.iteration_record() and TrainingRecorder. Progress is only reported through
+            callbacks, defaults to [ProgressPrinter()], which writes one line per iteration to stdout.
+            In addition to the common fields, records of this estimator contain:
+
+                - "ll": log-likelihood summed over all features.
+                - "scale_update": whether the iteration was a scale model update.
+                - "n_working_set": number of features in the working set.
+                - "n_active": number of features in the working set that are not converged.
+                - "n_updated": number of features that an update was proposed for.
+                - "n_reverted": number of features for which the update was reverted as it decreased the likelihood.
+                - "n_singular": number of singular location model systems that were solved via a pseudo-inverse
+                  or had no solution.
+                - "converged": fraction of converged features.
+                - "converged_loc": fraction of features with converged location model since the last scale update.
+
+            Times are recorded for the phases "location_update", "reduction" (assembly of normal equations),
+            "solve" (solution of normal equations), "scale_update" and "likelihood".
         :param kwargs:
         :return:
         """
+        if (count_histogram or grouped_statistics) and not self.model.count_data:
+            raise ValueError("count_histogram and grouped_statistics are only available for count data")
         # Iterate until conditions are fulfilled.
         train_step = 0
         if self._train_scale:
@@ -88,128 +171,340 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         else:
             update_b_freq = np.inf
         epochs_until_b_update = update_b_freq
-        fully_converged = np.tile(False, self.model.model_vars.n_features)
+        n_features = self.model.model_vars.n_features
+        fully_converged = np.tile(False, n_features)
 
-        ll_current = - self.model.ll_byfeature.compute()
+        # Losses are compared without terms that only depend on the data, these are only added for reporting
+        # and for relative convergence criteria:
+        self._use_grouped = grouped_statistics
+        self._stream_observations = stream_observations
+        self._use_histogram = (count_histogram or grouped_statistics) and self._train_scale
+        if (self._use_histogram or self._use_grouped) and self._histogram is None:
+            self._histogram = self._init_histogram()
+        ll_current = - self._ll_byfeature_j(j=np.arange(0, n_features))
+        loss_constant_all = - self.model.ll_constant_byfeature
+        loss_constant = loss_constant_all
         ll_last_b_update = ll_current.copy()
-        #logging.getLogger("batchglm").info(
-        sys.stdout.write("iter   %i: ll=%f\n" % (0, np.sum(ll_current)))
-        while np.any(np.logical_not(fully_converged)) and \
-                train_step < max_steps:
-            t0 = time.time()
-            # Line search step for scale model:
-            # Run this update every update_b_freq iterations.
-            if epochs_until_b_update == 0:
-                # Compute update.
-                idx_update = np.where(np.logical_not(fully_converged))[0]
-                if self._train_scale:
-                    b_step = self.b_step(
-                        idx_update=idx_update,
-                        method=method_b,
-                        ftol=ftol_b,
-                        lr=lr_b,
-                        max_iter=max_iter_b,
-                        nproc=nproc
-                    )
-                    # Perform trial update.
-                    self.model.b_var = self.model.b_var + b_step
-                    # Reverse update by feature if update leads to worse loss:
-                    ll_proposal = - self.model.ll_byfeature_j(j=idx_update).compute()
-                    idx_bad_step = idx_update[np.where(ll_proposal > ll_current[idx_update])[0]]
-                    if isinstance(self.model.b_var, dask.array.core.Array):
-                        b_var_new = self.model.b_var.compute()
-                    else:
+        ll_all = ll_current
+        # Continue from the state of an interrupted call that was saved in a checkpoint, see resume_sequence():
+        resume_state = self._pop_resume_state()
+        if resume_state is not None:
+            train_step = resume_state["iteration"]
+            epochs_until_b_update = resume_state["epochs_until_b_update"]
+            fully_converged = resume_state["fully_converged"].astype(bool)
+            ll_last_b_update = resume_state["ll_last_b_update"].astype(ll_current.dtype)
+            self.model.converged = resume_state["converged"].astype(bool)
+        if callbacks is None:
+            callbacks = [ProgressPrinter()]
+        logger.info("iter %3i: ll=%f" % (train_step, np.sum(ll_current + loss_constant)))
+        # Brent line searches are one-dimensional:
+        if self._train_scale and method_b.lower() == "brent" and self.model.b_var.shape[0] > 1:
+            logger.info("scale model has %i parameters, using method_b newton instead of brent" %
+                        self.model.b_var.shape[0])
+            method_b = "newton"
+        # Scale model line searches on multiple processes share one worker pool throughout training:
+        if self._train_scale and method_b.lower() == "brent" and nproc > 1:
+            self._b_pool = self._init_b_pool(nproc=nproc)
+        try:
+            while np.any(np.logical_not(fully_converged)) and \
+                    train_step < max_steps:
+                t0 = time.time()
+                t0_cpu = time.process_time()
+                self._timer.reset()
+                self._n_singular = 0
+                # Line search step for scale model:
+                # Run this update every update_b_freq iterations.
+                if epochs_until_b_update == 0:
+                    # Compute update.
+                    idx_update = np.where(np.logical_not(fully_converged))[0]
+                    if self._train_scale:
+                        with self._timer.phase("scale_update"):
+                            b_step = self.b_step(
+                                idx_update=idx_update,
+                                method=method_b,
+                                ftol=ftol_b,
+                                lr=lr_b,
+                                max_iter=max_iter_b,
+                                nproc=nproc
+                            )
+                        # Perform trial update.
+                        self.model.b_var = self.model.b_var + b_step
+                        # Reverse update by feature if update leads to worse loss:
+                        ll_proposal = - self._ll_byfeature_j(j=idx_update)
+                        idx_bad_step = idx_update[np.where(ll_proposal > ll_current[idx_update])[0]]
                         b_var_new = self.model.b_var.copy()
-                    b_var_new[:, idx_bad_step] = b_var_new[:, idx_bad_step] - b_step[:, idx_bad_step]
-                    self.model.b_var = b_var_new
-                else:
-                    ll_proposal = ll_current[idx_update]
-                    idx_bad_step = np.array([], dtype=np.int32)
-                # Update likelihood vector with updated genes based on already evaluated proposal likelihood.
-                ll_new = ll_current.copy()
-                ll_new[idx_update] = ll_proposal
-                ll_new[idx_bad_step] = ll_current[idx_bad_step]
-                # Reset b model update counter.
-                epochs_until_b_update = update_b_freq
-            else:
-                # IWLS step for location model:
-                # Compute update.
-                idx_update = self.model.idx_not_converged
-                if self._train_loc:
-                    a_step = self.iwls_step(idx_update=idx_update)
-                    # Perform trial update.
-                    self.model.a_var = self.model.a_var + a_step
-                    # Reverse update by feature if update leads to worse loss:
-                    ll_proposal = - self.model.ll_byfeature_j(j=idx_update).compute()
-                    idx_bad_step = idx_update[np.where(ll_proposal > ll_current[idx_update])[0]]
-                    if isinstance(self.model.b_var, dask.array.core.Array):
-                        a_var_new = self.model.a_var.compute()
+                        b_var_new[:, idx_bad_step] = b_var_new[:, idx_bad_step] - b_step[:, idx_bad_step]
+                        self.model.b_var = b_var_new
                     else:
+                        ll_proposal = ll_current[idx_update]
+                        idx_bad_step = np.array([], dtype=np.int32)
+                    # Update likelihood vector with updated genes based on already evaluated proposal likelihood.
+                    ll_new = ll_current.copy()
+                    ll_new[idx_update] = ll_proposal
+                    ll_new[idx_bad_step] = ll_current[idx_bad_step]
+                    # Reset b model update counter.
+                    epochs_until_b_update = update_b_freq
+                else:
+                    # IWLS step for location model:
+                    # Compute update.
+                    idx_update = self.model.idx_not_converged
+                    if self._train_loc:
+                        with self._timer.phase("location_update"):
+                            a_step = self.iwls_step(idx_update=idx_update)
+                        # Perform trial update.
+                        self.model.a_var = self.model.a_var + a_step
+                        # Reverse update by feature if update leads to worse loss:
+                        ll_proposal = - self._ll_byfeature_j(j=idx_update)
+                        idx_bad_step = idx_update[np.where(ll_proposal > ll_current[idx_update])[0]]
                         a_var_new = self.model.a_var.copy()
-                    a_var_new[:, idx_bad_step] = a_var_new[:, idx_bad_step] - a_step[:, idx_bad_step]
-                    self.model.a_var = a_var_new
+                        a_var_new[:, idx_bad_step] = a_var_new[:, idx_bad_step] - a_step[:, idx_bad_step]
+                        self.model.a_var = a_var_new
+                    else:
+                        ll_proposal = ll_current[idx_update]
+                        idx_bad_step = np.array([], dtype=np.int32)
+                    # Update likelihood vector with updated genes based on already evaluated proposal likelihood.
+                    ll_new = ll_current.copy()
+                    ll_new[idx_update] = ll_proposal
+                    ll_new[idx_bad_step] = ll_current[idx_bad_step]
+                    # Update epoch counter of a updates until next b update:
+                    epochs_until_b_update -= 1
+
+                # Evaluate and update convergence:
+                ll_previous = ll_current
+                ll_current = ll_new
+                if epochs_until_b_update == update_b_freq:  # b step update was executed.
+                    # Update terminal convergence in fully_converged and intermediate convergence in self.model.converged.
+                    converged_f = np.logical_or(
+                        ll_last_b_update < ll_current,  # loss gets worse
+                        np.abs(ll_last_b_update - ll_current) / np.maximum(  # relative decrease in loss is too small
+                            np.nextafter(0, np.inf, dtype=ll_previous.dtype),  # catch division by zero
+                            np.abs(ll_last_b_update + loss_constant)
+                        ) < pkg_constants.LLTOL_BY_FEATURE,
+                    )
+                    self.model.converged = np.logical_or(fully_converged, converged_f)
+                    ll_last_b_update = ll_current.copy()
+                    fully_converged = self.model.converged.copy()
                 else:
-                    ll_proposal = ll_current[idx_update]
-                    idx_bad_step = np.array([], dtype=np.int32)
-                # Update likelihood vector with updated genes based on already evaluated proposal likelihood.
-                ll_new = ll_current.copy()
-                ll_new[idx_update] = ll_proposal
-                ll_new[idx_bad_step] = ll_current[idx_bad_step]
-                # Update epoch counter of a updates until next b update:
-                epochs_until_b_update -= 1
-
-            # Evaluate and update convergence:
-            ll_previous = ll_current
-            ll_current = ll_new
-            if epochs_until_b_update == update_b_freq:  # b step update was executed.
-                # Update terminal convergence in fully_converged and intermediate convergence in self.model.converged.
-                converged_f = np.logical_or(
-                    ll_last_b_update < ll_current,  # loss gets worse
-                    np.abs(ll_last_b_update - ll_current) / np.maximum(  # relative decrease in loss is too small
-                        np.nextafter(0, np.inf, dtype=ll_previous.dtype),  # catch division by zero
-                        np.abs(ll_last_b_update)
-                    ) < pkg_constants.LLTOL_BY_FEATURE,
-                )
-                self.model.converged = np.logical_or(fully_converged, converged_f)
-                ll_last_b_update = ll_current.copy()
-                fully_converged = self.model.converged.copy()
-            else:
-                # Update intermediate convergence in self.model.converged.
-                converged_f = np.logical_or(
-                    ll_previous < ll_current,  # loss gets worse
-                    np.abs(ll_previous - ll_current) / np.maximum(  # relative decrease in loss is too small
-                        np.nextafter(0, np.inf, dtype=ll_previous.dtype),  # catch division by zero
-                        np.abs(ll_previous)
-                    ) < pkg_constants.LLTOL_BY_FEATURE,
+                    # Update intermediate convergence in self.model.converged.
+                    converged_f = np.logical_or(
+                        ll_previous < ll_current,  # loss gets worse
+                        np.abs(ll_previous - ll_current) / np.maximum(  # relative decrease in loss is too small
+                            np.nextafter(0, np.inf, dtype=ll_previous.dtype),  # catch division by zero
+                            np.abs(ll_previous + loss_constant)
+                        ) < pkg_constants.LLTOL_BY_FEATURE,
+                    )
+                    self.model.converged = np.logical_or(self.model.converged, converged_f)
+                    if np.all(self.model.converged):
+                        # All location models are converged. This means that the next update will be b model
+                        # update and all remaining intermediate a model updates can be skipped:
+                        epochs_until_b_update = 0
+
+                # Collect likelihoods of all features, features outside of the working set are converged.
+                if self._idx_active is None:
+                    ll_all = ll_current
+                else:
+                    ll_all = ll_all.copy()
+                    ll_all[self._idx_active] = ll_current
+                n_outside_active = n_features - len(fully_converged)
+                # Re-pack working set if it mostly consists of converged features:
+                if active_set_threshold is not None and \
+                        np.any(np.logical_not(fully_converged)) and \
+                        np.mean(np.logical_not(fully_converged)) < active_set_threshold:
+                    idx_keep = np.where(np.logical_not(fully_converged))[0]
+                    self._pack_active_set(idx=idx_keep)
+                    ll_current = ll_current[idx_keep]
+                    ll_last_b_update = ll_last_b_update[idx_keep]
+                    loss_constant = loss_constant[idx_keep]
+                    fully_converged = fully_converged[idx_keep]
+
+                # Conclude and report iteration.
+                train_step += 1
+                self.lls.append(ll_all + loss_constant_all)
+                record = iteration_record(
+                    iteration=train_step,
+                    timer=self._timer,
+                    time_wall=time.time() - t0,
+                    time_cpu=time.process_time() - t0_cpu,
+                    ll=np.sum(ll_all + loss_constant_all),
+                    scale_update=epochs_until_b_update == update_b_freq,
+                    n_working_set=len(fully_converged),
+                    n_active=len(fully_converged) - np.sum(fully_converged),
+                    n_updated=len(idx_update),
+                    n_reverted=len(idx_bad_step),
+                    n_singular=self._n_singular,
+                    converged=(n_outside_active + np.sum(fully_converged)) / n_features,
+                    converged_loc=(n_outside_active + np.sum(self.model.converged)) / n_features
                 )
-                self.model.converged = np.logical_or(self.model.converged, converged_f)
-                if np.all(self.model.converged):
-                    # All location models are converged. This means that the next update will be b model
-                    # update and all remaining intermediate a model updates can be skipped:
-                    epochs_until_b_update = 0
-
-            # Conclude and report iteration.
-            train_step += 1
-            #logging.getLogger("batchglm").info(
-            sys.stdout.write(
-                "iter %s: ll=%f, converged: %.2f%% (loc: %.2f%%, scale update: %s), in %.2fsec\n" %
-                (
-                    (" " if train_step < 10 else "") + (" " if train_step < 100 else "") + str(train_step),
-                    np.sum(ll_current),
-                    np.mean(fully_converged)*100,
-                    np.mean(self.model.converged) * 100,
-                    str(epochs_until_b_update == update_b_freq),
-                    time.time()-t0
+                for callback in callbacks:
+                    callback(record)
+                if self._checkpoint_due(iteration=train_step):
+                    # Features outside of the working set are converged:
+                    self._write_checkpoint(train_state={
+                        "iteration": train_step,
+                        "epochs_until_b_update": epochs_until_b_update,
+                        "converged": self._unpack_features(self.model.converged, fill=True),
+                        "fully_converged": self._unpack_features(fully_converged, fill=True),
+                        "ll_last_b_update": self._unpack_features(ll_last_b_update, fill=ll_all)
+                    })
+        finally:
+            if self._b_pool is not None:
+                self._b_pool.close()
+                self._b_pool = None
+            self._unpack_active_set()
+
+    def train_sharded(
+            self,
+            n_workers: int,
+            shard_size: int = None,
+            training_strategy="DEFAULT",
+            **kwargs
+    ):
+        """
+        Train and finalize shards of features in separate worker processes.
+
+        Features are independent, so each shard is trained with train_sequence() and finalized on its own copy of
+        the data of its features. Parameters, convergence, solve status, hessian, fisher_inv, jacobian and
+        log-likelihood of all shards are collected into this estimator, finalize() does not have to be called
+        afterwards. Likelihoods by iteration are not collected in self.lls.
+
+        Features are assigned to shards so that the number of non-zero observations, which is used as an estimate of
+        the training cost of a feature, is balanced across shards. Shards are dispatched to workers in order of
+        decreasing cost.
+
+        :param n_workers: Number of worker processes.
+        :param shard_size: Number of features per shard. Defaults to a size that yields four shards per worker.
+        :param training_strategy: Training strategy, see train_sequence().
+        :param kwargs: Arguments passed to train_sequence(). Scale model line searches run on one process
+            within each shard, nproc is set to 1. Callbacks are not run within shards, progress by completed shard
+            is reported to the logger.
+        """
+        n_features = self.model.model_vars.n_features
+        if shard_size is None:
+            shard_size = int(np.ceil(n_features / (4 * n_workers)))
+        shards = balance_shards(
+            cost=self.input_data.feature_nnz.astype(np.float64) + 1.,
+            n_shards=int(np.ceil(n_features / max(shard_size, 1)))
+        )
+        kwargs["nproc"] = 1
+        kwargs["callbacks"] = []
+
+        t0 = time.time()
+        n_done = 0
+        with multiprocessing.Pool(
+                processes=n_workers,
+                initializer=_init_shard_worker,
+                initargs=(self, training_strategy, kwargs)
+        ) as pool:
+            for idx, model_vars, solve_status, hessian, fisher_inv, jacobian, ll in \
+                    pool.imap_unordered(_train_shard, shards):
+                if n_done == 0:
+                    self._hessian = np.zeros((n_features,) + hessian.shape[1:], dtype=hessian.dtype)
+                    self._fisher_inv = np.zeros((n_features,) + fisher_inv.shape[1:], dtype=fisher_inv.dtype)
+                    self._jacobian = np.zeros([n_features], dtype=jacobian.dtype)
+                    self._log_likelihood = np.zeros([n_features], dtype=ll.dtype)
+                self.model.model_vars.update_features(idx=idx, model_vars=model_vars)
+                self._solve_status[idx] = solve_status
+                self._hessian[idx] = hessian
+                self._fisher_inv[idx] = fisher_inv
+                self._jacobian[idx] = jacobian
+                self._log_likelihood[idx] = ll
+                n_done += len(idx)
+                logger.info(
+                    "trained %i/%i features in %i shards on %i processes in %.2fsec" %
+                    (n_done, n_features, len(shards), n_workers, time.time() - t0)
                 )
-            )
-            #sys.stdout.write(
-            #    '\riter %i: ll=%f, %.2f%% converged' %
-            #    (train_step, np.sum(ll_current), np.round(np.mean(delayed_converged)*100, 2))
-            #)
-            #sys.stdout.flush()
-            self.lls.append(ll_current)
-        #sys.stdout.write('\r')
-        #sys.stdout.flush()
+        self._loss = np.sum(self._log_likelihood)
+
+    def subset_features(
+            self,
+            idx: np.ndarray
+    ):
+        """
+        Copy of this estimator that is restricted to a subset of features, see ModelIwls.subset_features().
+
+        :param idx: Indices of features to keep.
+        """
+        estimator = copy.copy(self)
+        estimator.model = self.model.subset_features(idx)
+        estimator.input_data = estimator.model.input_data
+        estimator.values = []
+        estimator.lls = []
+        estimator._solve_status = self._solve_status[idx].copy()
+        estimator._histogram = None
+        estimator._ll_nonsufficient = None
+        estimator._ll_nonsufficient_b_var = None
+        return estimator
+
+    def _pack_active_set(
+            self,
+            idx: np.ndarray
+    ):
+        """
+        Restrict the working model to a subset of the features of the current working model.
+
+        Parameters of the current working model are written back into the full model first,
+        the new working model holds compact copies of the count data and parameters of the selected features.
+
+        :param idx: Indices of features in the current working model to keep.
+        """
+        if self._model_full is None:
+            self._model_full = self.model
+            self._idx_active = np.arange(0, self.model.model_vars.n_features)
+        else:
+            self._model_full.model_vars.update_features(idx=self._idx_active, model_vars=self.model.model_vars)
+        self._idx_active = self._idx_active[idx]
+        self.model = self._model_full.subset_features(idx=self._idx_active)
+
+    def _unpack_active_set(self):
+        """
+        Write parameters of the working model back into the full model and restore the full model.
+        """
+        if self._model_full is not None:
+            self._model_full.model_vars.update_features(idx=self._idx_active, model_vars=self.model.model_vars)
+            self.model = self._model_full
+            self._model_full = None
+            self._idx_active = None
+
+    def _unpack_features(
+            self,
+            values: np.ndarray,
+            fill
+    ) -> np.ndarray:
+        """
+        Expand a vector over the features of the working model to all features.
+
+        :param values: Values by feature of the working model.
+        :param fill: Value or vector of values by feature of the full model used for features outside of the
+            working set.
+        :return: Values by feature of the full model.
+        """
+        if self._idx_active is None:
+            return values
+        values_full = np.broadcast_to(fill, [self._model_full.model_vars.n_features]).astype(values.dtype)
+        values_full[self._idx_active] = values
+        return values_full
+
+    def _checkpoint_state(self) -> dict:
+        model = self.model if self._model_full is None else self._model_full
+        a_var = np.array(_compute(model.a_var))
+        b_var = np.array(_compute(model.b_var))
+        if self._idx_active is not None:
+            a_var[:, self._idx_active] = _compute(self.model.a_var)
+            b_var[:, self._idx_active] = _compute(self.model.b_var)
+        return {
+            "a_var": a_var,
+            "b_var": b_var,
+            "train_loc": self._train_loc,
+            "train_scale": self._train_scale
+        }
+
+    def _restore_checkpoint(self, checkpoint: dict):
+        self._train_loc = bool(checkpoint["train_loc"])
+        self._train_scale = bool(checkpoint["train_scale"])
+        self.model.a_var = checkpoint["a_var"].astype(self.dtype)
+        self.model.b_var = checkpoint["b_var"].astype(self.dtype)
+        self._ll_nonsufficient = None
+        self._ll_nonsufficient_b_var = None
 
     def a_step_gd(
             self,
@@ -224,22 +519,23 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         :return:
         """
         iter = 0
-        a_var_old = self.model.a_var.compute()
+        a_var_old = self.model.a_var.copy()
         converged = np.tile(True, self.model.model_vars.n_features)
         converged[idx] = False
-        ll_current = - self.model.ll_byfeature.compute()
+        ll_current = - _compute(self.model.ll_byfeature)
+        loss_constant = - self.model.ll_constant_byfeature
         while np.any(np.logical_not(converged)) and iter < max_iter:
             idx_to_update = np.where(np.logical_not(converged))[0]
-            jac = np.zeros_like(self.model.a_var).compute()
+            jac = np.zeros_like(self.model.a_var)
             # Use mean jacobian so that learning rate is independent of number of samples.
-            jac[:, idx_to_update] = - self.model.jac_a.compute().T[:, idx_to_update] / \
+            jac[:, idx_to_update] = - _compute(self.model.jac_a).T[:, idx_to_update] / \
                                     self.model.input_data.num_observations
-            self.model._a_var = self.model.a_var.compute() + lr * jac
+            self.model.a_var = self.model.a_var + lr * jac
             # Assess convergence:
             ll_previous = ll_current
-            ll_current = - self.model.ll_byfeature.compute()
-            converged_f = (ll_current - ll_previous) / ll_previous > -ftol
-            a_var_new = self.model.a_var.compute()
+            ll_current = - _compute(self.model.ll_byfeature)
+            converged_f = (ll_current - ll_previous) / (ll_previous + loss_constant) > -ftol
+            a_var_new = self.model.a_var.copy()
             a_var_new[:, converged_f] = a_var_new[:, converged_f] - lr * jac[:, converged_f]
             self.model.a_var = a_var_new
             converged = np.logical_or(converged, converged_f)
@@ -252,7 +548,7 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
                     np.mean(converged) * 100
                 )
             )
-        return self.model.a_var.compute() - a_var_old
+        return self.model.a_var - a_var_old
 
     def iwls_step(
             self,
@@ -262,66 +558,84 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
 
         :return: (inferred param x features)
         """
-        w = self.model.fim_weight_aa_j(j=idx_update)  # (observations x features)
-        ybar = self.model.ybar_j(j=idx_update)  # (observations x features)
         # Translate to problem of form ax = b for each feature:
         # (in the following, X=design and Y=counts)
         # a=X^T*W*X: ([features] x inferred param)
         # x=theta: ([features] x inferred param)
         # b=X^T*W*Ybar: ([features] x inferred param)
-        xh = np.matmul(self.model.design_loc, self.model.constraints_loc)
-        xhw = np.einsum('ob,of->fob', xh, w)
-        a = np.einsum('fob,oc->fbc', xhw, xh)
-        b = np.einsum('fob,of->fb', xhw, ybar)
-
-        delta_theta = np.zeros_like(self.model.a_var)
-        if isinstance(delta_theta, dask.array.core.Array):
-            delta_theta = delta_theta.compute()
-
-        if isinstance(a, dask.array.core.Array):
-            # Have to use a workaround to solve problems in parallel in dask here. This workaround does
-            # not work if there is only a single problem, ie. if the first dimension of a and b has length 1.
-            if a.shape[0] != 1:
-                get_cond_number = lambda x: np.expand_dims(np.expand_dims(np.linalg.cond(x, p=None), axis=-1), axis=-1)
-                invertible = np.where(dask.array.map_blocks(
-                    get_cond_number, a, chunks=a.shape
-                ).squeeze().compute() < 1 / sys.float_info.epsilon)[0]
-                if len(idx_update[invertible]) > 1:
-                    delta_theta[:, idx_update[invertible]] = dask.array.map_blocks(
-                        np.linalg.solve, a[invertible], b[invertible, :, None],
-                        chunks=b[invertible, :, None].shape
-                    ).squeeze().T.compute()
-                elif len(idx_update[invertible]) == 1:
-                    delta_theta[:, idx_update[invertible]] = np.expand_dims(
-                        np.linalg.solve(a[invertible[0]], b[invertible[0]]).compute(),
-                        axis=-1
-                    )
-            else:
-                if np.linalg.cond(a.compute(), p=None) < 1 / sys.float_info.epsilon:
-                    delta_theta[:, idx_update] = np.expand_dims(
-                        np.linalg.solve(a[0], b[0]).compute(),
-                        axis=-1
-                    )
-                    invertible = np.array([0])
-                else:
-                    invertible = np.array([])
+        if self._use_grouped:
+            # Observation groups with summed weights and residuals replace observations:
+            with self._timer.phase("reduction"):
+                w, w_ybar = self.model.iwls_weights_grouped(
+                    x_sum=self._histogram.x_sum[:, self._histogram_idx(idx_update)],
+                    group_size=self._histogram.group_size[:, np.newaxis],
+                    eta_loc=self._group_eta_loc(idx=idx_update),
+                    eta_scale=self._group_eta_scale(idx=idx_update)
+                )  # (groups x features)
+                xh = np.matmul(self._histogram.design_loc, self.model.constraints_loc)
+                a = batched_xtwx(xh_a=xh, w=w)
+                b = batched_xtwy(xh=xh, w=w_ybar)
         else:
-            invertible = np.where(np.linalg.cond(a, p=None) < 1 / sys.float_info.epsilon)[0]
-            delta_theta[:, idx_update[invertible]] = np.linalg.solve(a[invertible], b[invertible]).T
-        if invertible.shape[0] < len(idx_update):
-            sys.stdout.write("caught %i linalg singular matrix errors\n" % (len(idx_update) - invertible.shape[0]))
-        # Via np.linalg.lsts:
-        #delta_theta[:, idx_update] = np.concatenate([
-        #    np.expand_dims(np.linalg.lstsq(a[i, :, :], b[i, :])[0], axis=-1)
-        #    for i in idx_update)
-        #], axis=-1)
-        # Via np.linalg.inv:
-        # #delta_theta[:, idx_update] = np.concatenate([
-        #    np.expand_dims(np.matmul(np.linalg.inv(a[i, :, :]), b[i, :]), axis=-1)
-        #    for i in idx_update)
-        #], axis=-1)
+            a = 0.
+            b = 0.
+            with self._timer.phase("reduction"):
+                for model in self._observation_chunks():
+                    w = model.fim_weight_aa_j(j=idx_update)  # (observations x features)
+                    ybar = model.ybar_j(j=idx_update)  # (observations x features)
+                    xh = np.matmul(model.design_loc, model.constraints_loc)
+                    a = a + _compute(batched_xtwx(xh_a=xh, w=w))
+                    b = b + _compute(batched_xtwy(xh=xh, w=w, y=ybar))
+
+        delta_theta = np.zeros(self.model.a_var.shape, dtype=self.model.a_var.dtype)
+        # a is negative definite, solve the positive definite system -a x = -b instead:
+        with self._timer.phase("solve"):
+            delta_theta_update, status = batched_spd_solve(a=-a, b=-b)
+        delta_theta[:, idx_update] = delta_theta_update.T
+        self._record_solve_status(field="iwls", idx=idx_update, status=status)
         return delta_theta
 
+    def _record_solve_status(
+            self,
+            field: str,
+            idx: np.ndarray,
+            status: np.ndarray
+    ):
+        """
+        Record status of linear system solves by feature in self.solve_status.
+
+        :param field: Field of self.solve_status to record status in.
+        :param idx: Indices of features in the working model that status refers to.
+        :param status: Status codes of batched_spd_solve() by feature in idx.
+        """
+        if self._idx_active is not None:
+            idx = self._idx_active[idx]
+        self._solve_status[field][idx] = status
+        if field == "iwls":
+            self._solve_status["iwls_n_singular"][idx] += status != SPD_SOLVE_CHOLESKY
+            self._n_singular += np.sum(status != SPD_SOLVE_CHOLESKY)
+        if np.any(status != SPD_SOLVE_CHOLESKY):
+            logger.debug(
+                "%s: %i singular systems solved via pseudo-inverse, %i without solution",
+                field, np.sum(status == SPD_SOLVE_PINV), np.sum(status == SPD_SOLVE_FAILED)
+            )
+
+    @property
+    def solve_status(self) -> np.ndarray:
+        """
+        Status of linear system solves by feature.
+
+        Structured array (features,) with the fields:
+
+            - "iwls": status of the last location model IWLS update.
+            - "iwls_n_singular": number of location model IWLS updates in which the system was singular.
+            - "fisher_inv": status of the inversion of the fisher information matrix in finalize().
+
+        Status codes are SPD_SOLVE_CHOLESKY (0) if the system was solved via Cholesky factorization,
+        SPD_SOLVE_PINV (1) if it was singular and solved via a pseudo-inverse and SPD_SOLVE_FAILED (2)
+        if no finite solution was found, see batchglm.utils.linalg.batched_spd_solve().
+        """
+        return self._solve_status
+
     def b_step(
             self,
             idx_update: np.ndarray,
@@ -342,6 +656,12 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
                 lr=lr,
                 max_iter=max_iter
             )
+        elif method.lower() in ["newton"]:
+            return self._b_step_newton(
+                idx_update=idx_update,
+                ftol=ftol,
+                max_iter=max_iter
+            )
         else:
             return self._b_step_loop(
                 idx_update=idx_update,
@@ -363,83 +683,338 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         :return:
         """
         iter = 0
-        b_var_old = self.model.b_var.compute()
+        b_var_old = self.model.b_var.copy()
         converged = np.tile(True, self.model.model_vars.n_features)
         converged[idx_update] = False
-        ll_current = - self.model.ll_byfeature.compute()
+        ll_current = - _compute(self.model.ll_byfeature)
+        loss_constant = - self.model.ll_constant_byfeature
         while np.any(np.logical_not(converged)) and iter < max_iter:
             idx_to_update = np.where(np.logical_not(converged))[0]
-            jac = np.zeros_like(self.model.b_var).compute()
+            jac = np.zeros_like(self.model.b_var)
             # Use mean jacobian so that learning rate is independent of number of samples.
-            jac[:, idx_to_update] = self.model.jac_b_j(j=idx_to_update).compute().T / \
+            jac[:, idx_to_update] = _compute(self.model.jac_b_j(j=idx_to_update)).T / \
                                     self.model.input_data.num_observations
             self.model.b_var_j_setter(
-                value=(self.model.b_var.compute() + lr * jac)[:, idx_to_update],
+                value=(self.model.b_var + lr * jac)[:, idx_to_update],
                 j=idx_to_update
             )
             # Assess convergence:
             ll_previous = ll_current
-            ll_current = - self.model.ll_byfeature.compute()
-            converged_f = (ll_current - ll_previous) / ll_previous > -ftol
-            b_var_new = self.model.b_var.compute()
+            ll_current = - _compute(self.model.ll_byfeature)
+            converged_f = (ll_current - ll_previous) / (ll_previous + loss_constant) > -ftol
+            b_var_new = self.model.b_var.copy()
             b_var_new[:, converged_f] = b_var_new[:, converged_f] - lr * jac[:, converged_f]
             self.model.b_var = b_var_new
             converged = np.logical_or(converged, converged_f)
             iter += 1
             logging.getLogger("batchglm").info(
-                "iter %i: ll=%f, converged scale model: %.2f%%" %
+                "iter %s: ll=%f, converged scale model: %.2f%%" %
                 (
                     (" " if iter < 10 else "") + (" " if iter < 100 else "") + str(iter),
                     np.sum(ll_current),
                     np.mean(converged) * 100
                 )
             )
-        return self.model.b_var.compute() - b_var_old
+        return self.model.b_var - b_var_old
 
-    def optim_handle(
+    def _b_step_newton(
             self,
-            b_j,
-            data_j,
-            eta_loc_j,
-            xh_scale,
-            max_iter,
-            ftol
-    ):
-        # Need to supply dense numpy array to scipy optimize:
-        if isinstance(data_j, sparse.COO) or isinstance(data_j, scipy.sparse.csr_matrix):
-            data_j = data_j.todense()
-        if len(data_j.shape) == 1:
-            data_j = np.expand_dims(data_j, axis=-1)
+            idx_update: np.ndarray,
+            ftol: float,
+            max_iter: int
+    ) -> np.ndarray:
+        """
+        Vectorized line search for the scale model based on safeguarded Newton-Raphson steps.
+
+        All features in idx_update are optimized at once in blocks of chunk_size_genes features:
+        The likelihood, jacobian and hessian of the scale model are evaluated on the full
+        (observations x features) block in each iteration instead of running one scalar optimizer per feature.
 
+        :return: (inferred param x features)
+        """
+        delta_theta = np.zeros(self.model.b_var.shape, dtype=self.model.b_var.dtype)
+
+        xh_scale = self._xh_scale()
+        b_var = self.model.b_var.copy()
+
+        t0 = time.time()
+        block_size = self.input_data.chunk_size_genes
+        for i in range(0, len(idx_update), block_size):
+            idx_block = idx_update[i:(i + block_size)]
+            if self._use_histogram:
+                # Histogram entries act as weighted observations:
+                data, weights, group = self._histogram.padded(idx=self._histogram_idx(idx_block))
+                eta_loc = self._group_eta_loc(idx=idx_block)[group]
+                xh_scale_block = self._group_xh_scale()[group]
+            else:
+                data = self.model.x_j(j=idx_block)
+                if isinstance(data, dask.array.core.Array):
+                    data = data.compute()
+                # Sparse blocks are kept sparse, the model kernels only evaluate nonzero counts explicitly:
+                if isinstance(data, scipy.sparse.spmatrix):
+                    data = scipy.sparse.csc_matrix(data)
+                else:
+                    data = np.asarray(data)
+                eta_loc = _compute(self.model.eta_loc_j(j=idx_block))
+                weights = None
+                xh_scale_block = xh_scale
+            delta_theta[:, idx_block] = self._newton_b_block(
+                data=data,
+                eta_loc=eta_loc,
+                b_var=b_var[:, idx_block],
+                xh_scale=xh_scale_block,
+                ftol=ftol,
+                max_iter=max_iter,
+                weights=weights
+            ) - b_var[:, idx_block]
+        logger.debug("fitted %i scale models in %.2fsec" % (len(idx_update), time.time() - t0))
+        return delta_theta
+
+    def _newton_b_block(
+            self,
+            data: np.ndarray,
+            eta_loc: np.ndarray,
+            b_var: np.ndarray,
+            xh_scale: np.ndarray,
+            ftol: float,
+            max_iter: int,
+            weights: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Maximize the scale model likelihood of a block of features with vectorized Newton-Raphson steps.
+
+        Newton steps are used where the likelihood is locally concave, ie. where the negative hessian of the scale
+        model parameters of a feature has a Cholesky factorization, steps along the gradient otherwise.
+        Steps are scaled so that no parameter changes by more than NEWTON_B_MAX_STEP and are halved until the
+        likelihood of a feature improves. A feature is converged if all parameters of its accepted step are smaller
+        than ftol or if no improving step was found.
+
+        :param data: Count block as dense array or scipy.sparse.csc_matrix (observations x features).
+        :param eta_loc: Location model linear predictor of block (observations x features).
+        :param b_var: Initial scale model parameters of block (inferred param x features).
+        :param xh_scale: Scale model design matrix with constraints applied (observations x inferred param).
+        :param weights: Weights of observations (observations x features), all observations have weight one if None.
+        :return: Optimized scale model parameters of block (inferred param x features).
+        """
         ll = self.model.ll_handle()
-        lb, ub = self.model.param_bounds(dtype=data_j.dtype)
-        lb_bracket = np.max([lb["b_var"], b_j - 20])
-        ub_bracket = np.min([ub["b_var"], b_j + 20])
-
-        def cost_b_var(x, data_jj, eta_loc_jj, xh_scale_jj):
-            x = np.clip(np.array([[x]]), lb["b_var"], ub["b_var"])
-            return - np.sum(ll(data_jj, eta_loc_jj, x, xh_scale_jj))
-
-        # jac_b = self.model.jac_b_handle()
-        # def cost_b_var_prime(x, data_jj, eta_loc_jj, xh_scale_jj):
-        #    x = np.clip(np.array([[x]]), lb["b_var"], ub["b_var"])
-        #    return - np.sum(jac_b(data_jj, eta_loc_jj, x, xh_scale_jj))
-        # return scipy.optimize.line_search(
-        #    f=cost_b_var,
-        #    myfprime=cost_b_var_prime,
-        #    args=(data_j, eta_loc_j, xh_scale),
-        #    maxiter=max_iter,
-        #    xk=b_j+5,
-        #    pk=-np.ones_like(b_j)
-        # )
-
-        return scipy.optimize.brent(
-            func=cost_b_var,
-            args=(data_j, eta_loc_j, xh_scale),
-            maxiter=max_iter,
-            tol=ftol,
-            brack=(lb_bracket, ub_bracket),
-            full_output=True
+        jac_b = self.model.jac_b_handle()
+        hessian_b = self.model.hessian_b_handle()
+        lb, ub = self.model.param_bounds(dtype=b_var.dtype)
+
+        def weigh(values, cols):
+            return values if weights is None else values * weights[:, cols]
+
+        b_var = b_var.copy()
+        ll_current = np.sum(weigh(ll(data, eta_loc, b_var, xh_scale), slice(None)), axis=0)
+        converged = np.zeros([b_var.shape[1]], dtype=bool)
+        n_iter = 0
+        while np.any(np.logical_not(converged)) and n_iter < max_iter:
+            idx = np.where(np.logical_not(converged))[0]
+            jac = batched_xtwy(
+                xh=xh_scale,
+                w=weigh(jac_b(data[:, idx], eta_loc[:, idx], b_var[:, idx], xh_scale), idx)
+            )  # (features x inferred param)
+            hessian = batched_xtwx(
+                xh_a=xh_scale,
+                w=weigh(hessian_b(data[:, idx], eta_loc[:, idx], b_var[:, idx], xh_scale), idx)
+            )  # (features x inferred param x inferred param)
+            # Newton step where the likelihood is concave, gradient ascent direction otherwise:
+            newton_step, status = batched_spd_solve(a=-hessian, b=jac)
+            concave = status == SPD_SOLVE_CHOLESKY
+            eps = np.nextafter(0, np.inf, dtype=jac.dtype)
+            step = jac / np.maximum(np.sqrt(np.sum(np.square(jac), axis=1, keepdims=True)), eps)
+            step[concave] = newton_step[concave]
+            step = step * np.minimum(
+                1., pkg_constants.NEWTON_B_MAX_STEP / np.maximum(np.max(np.abs(step), axis=1, keepdims=True), eps)
+            )
+            # (inferred param x features) like b_var:
+            step = step.T
+            # Backtracking line search, vectorized over features:
+            accepted = np.zeros_like(concave)
+            for _ in range(pkg_constants.NEWTON_B_MAX_HALVINGS):
+                idx_todo = np.where(np.logical_not(accepted))[0]
+                if len(idx_todo) == 0:
+                    break
+                b_proposal = np.clip(b_var[:, idx[idx_todo]] + step[:, idx_todo], lb["b_var"], ub["b_var"])
+                ll_proposal = np.sum(weigh(ll(
+                    data[:, idx[idx_todo]],
+                    eta_loc[:, idx[idx_todo]],
+                    b_proposal,
+                    xh_scale
+                ), idx[idx_todo]), axis=0)
+                better = ll_proposal >= ll_current[idx[idx_todo]]
+                b_var[:, idx[idx_todo[better]]] = b_proposal[:, better]
+                ll_current[idx[idx_todo[better]]] = ll_proposal[better]
+                accepted[idx_todo[better]] = True
+                step[:, idx_todo[np.logical_not(better)]] /= 2.
+            converged[idx] = np.logical_or(
+                np.all(np.abs(step) < ftol, axis=0),
+                np.logical_not(accepted)
+            )
+            n_iter += 1
+        return b_var
+
+    def _ll_byfeature_j(
+            self,
+            j: np.ndarray
+    ) -> np.ndarray:
+        """
+        Log-likelihood by feature of the working model up to terms that only depend on the data.
+
+        :param j: Features of the working model.
+        :return: (features,)
+        """
+        with self._timer.phase("likelihood"):
+            if not self._use_grouped:
+                return sum(_compute(model.ll_byfeature_j(j=j)) for model in self._observation_chunks())
+            eta_scale = self._group_eta_scale(idx=j)
+            ll = self.model.ll_grouped(
+                x_sum=self._histogram.x_sum[:, self._histogram_idx(j)],
+                group_size=self._histogram.group_size[:, np.newaxis],
+                eta_loc=self._group_eta_loc(idx=j),
+                eta_scale=eta_scale
+            )
+            return np.sum(ll, axis=0) + self._ll_nonsufficient_j(j=j, eta_scale=eta_scale)
+
+    def _observation_chunks(self):
+        """
+        Iterate over views of the working model that are restricted to chunks of observations.
+
+        Quantities that are sums over observations are additive across these views. Yields the working model
+        itself if training does not stream over observations.
+        """
+        if not self._stream_observations:
+            yield self.model
+        else:
+            n_obs = self.model.input_data.num_observations
+            chunk_size = int(self.input_data.chunk_size_cells)
+            for start in range(0, n_obs, chunk_size):
+                yield self.model.subset_observations(start=start, end=min(start + chunk_size, n_obs))
+
+    def _ll_nonsufficient_j(
+            self,
+            j: np.ndarray,
+            eta_scale: np.ndarray
+    ) -> np.ndarray:
+        """
+        Sum of ModelIwls.ll_nonsufficient() over count histogram entries by feature.
+
+        These terms do not depend on the location model, they are only re-evaluated for features whose
+        scale model parameters changed since the last evaluation.
+
+        :param j: Features of the working model.
+        :param eta_scale: Scale model linear predictor by observation group of features j (groups x features).
+        :return: (features,)
+        """
+        if self._ll_nonsufficient is None:
+            n_features = len(self._histogram.indptr) - 1
+            self._ll_nonsufficient = np.zeros([n_features], dtype=self.model.b_var.dtype)
+            self._ll_nonsufficient_b_var = np.full([self.model.b_var.shape[0], n_features], np.nan)
+        hidx = self._histogram_idx(np.asarray(j))
+        b_var = self.model.b_var[:, j]
+        idx_stale = np.where(np.any(self._ll_nonsufficient_b_var[:, hidx] != b_var, axis=0))[0]
+        if len(idx_stale) > 0:
+            value, weight, group = self._histogram.padded(idx=hidx[idx_stale])
+            ll = self.model.ll_nonsufficient(x=value, eta_scale=eta_scale[:, idx_stale][group])
+            self._ll_nonsufficient[hidx[idx_stale]] = np.sum(weight * ll, axis=0)
+            self._ll_nonsufficient_b_var[:, hidx[idx_stale]] = b_var[:, idx_stale]
+        return self._ll_nonsufficient[hidx]
+
+    def _xh_scale(self) -> np.ndarray:
+        """
+        Scale model design matrix with constraints applied (observations x inferred param).
+        """
+        return _compute(np.matmul(self.model.design_scale, self.model.constraints_scale))
+
+    def _init_histogram(self) -> CountHistogram:
+        """
+        Build count histograms of all features.
+        """
+        return CountHistogram(
+            x=self.x,
+            design_loc=self.input_data.design_loc,
+            design_scale=self.input_data.design_scale,
+            size_factors=self.input_data.size_factors,
+            chunk_size=self.input_data.chunk_size_genes
+        )
+
+    def _histogram_idx(
+            self,
+            idx: np.ndarray
+    ) -> np.ndarray:
+        """
+        Translate feature indices of the working model to feature indices of the count histogram.
+        """
+        return idx if self._idx_active is None else self._idx_active[idx]
+
+    def _group_eta_loc(
+            self,
+            idx: np.ndarray
+    ) -> np.ndarray:
+        """
+        Location model linear predictor by observation group of the count histogram.
+
+        Computed in double precision regardless of the compute dtype of the model: There are only few groups and
+        the group likelihoods are weighted by group sizes, so that rounding errors of the predictor are amplified.
+
+        :param idx: Features of the working model.
+        :return: (groups x features)
+        """
+        eta_loc = np.matmul(
+            self._histogram.design_loc.astype(np.float64, copy=False),
+            _compute(self.model.a)[:, idx].astype(np.float64, copy=False)
+        )
+        if self._histogram.size_factors is not None:
+            eta_loc = eta_loc + self._histogram.size_factors
+        return self.model.np_clip_param(eta_loc, "eta_loc")
+
+    def _group_eta_scale(
+            self,
+            idx: np.ndarray
+    ) -> np.ndarray:
+        """
+        Scale model linear predictor by observation group of the count histogram.
+
+        :param idx: Features of the working model.
+        :return: (groups x features)
+        """
+        eta_scale = np.matmul(
+            self._histogram.design_scale.astype(np.float64, copy=False),
+            _compute(self.model.b)[:, idx].astype(np.float64, copy=False)
+        )
+        return self.model.np_clip_param(eta_scale, "eta_scale")
+
+    def _group_xh_scale(self) -> np.ndarray:
+        """
+        Scale model design matrix with constraints applied by observation group of the count histogram.
+
+        :return: (groups x inferred param)
+        """
+        return np.matmul(self._histogram.design_scale, _compute(self.model.constraints_scale))
+
+    def _init_b_pool(
+            self,
+            nproc: int
+    ) -> ScaleWorkerPool:
+        """
+        Start worker pool for per-feature scale model line searches.
+
+        :param nproc: Number of worker processes.
+        """
+        # The pool shares the scale model design by observation group if it is built on count histograms:
+        xh_scale = self._group_xh_scale() if self._use_histogram else self._xh_scale()
+        lb, ub = self.model.param_bounds(dtype=self.dtype)
+        # Workers access data by feature, which is cheapest from the copy in compressed sparse column format:
+        x_csc = self.input_data.x_csc
+        return ScaleWorkerPool(
+            x=x_csc if x_csc is not None else self.x,
+            xh_scale=xh_scale,
+            histogram=self._histogram if self._use_histogram else None,
+            ll=self.model.ll_handle(),
+            lb_b_var=lb["b_var"],
+            ub_b_var=ub["b_var"],
+            nproc=nproc,
+            chunk_size=self.input_data.chunk_size_genes
         )
 
     def _b_step_loop(
@@ -454,59 +1029,56 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
 
         :return:
         """
-        delta_theta = np.zeros_like(self.model.b_var)
-        if isinstance(delta_theta, dask.array.core.Array):
-            delta_theta = delta_theta.compute()
-
-        xh_scale = np.matmul(self.model.design_scale, self.model.constraints_scale).compute()
-        b_var = self.model.b_var.compute()
-        if nproc > 1 and len(idx_update) > nproc:
-            sys.stdout.write('\rFitting %i dispersion models: (progress not available with multiprocessing)' % len(idx_update))
-            sys.stdout.flush()
-            with multiprocessing.Pool(processes=nproc) as pool:
-                x = self.x.compute()
-                eta_loc = self.model.eta_loc.compute()
-                results = pool.starmap(
-                    self.optim_handle,
-                    [(
-                        b_var[0, j],
-                        x[:, [j]],
-                        eta_loc[:, [j]],
-                        xh_scale,
-                        max_iter,
-                        ftol
-                    ) for j in idx_update]
-                )
-                pool.close()
-            delta_theta[0, idx_update] = np.array([x[0] for x in results])
-            sys.stdout.write('\r')
-            sys.stdout.flush()
+        delta_theta = np.zeros(self.model.b_var.shape, dtype=self.model.b_var.dtype)
+
+        xh_scale = self._xh_scale()
+        b_var = self.model.b_var
+        t0 = time.time()
+        if self._b_pool is not None and len(idx_update) > nproc:
+            if self._use_histogram:
+                eta_loc = self._group_eta_loc(idx=idx_update)
+            else:
+                eta_loc = _compute(self.model.eta_loc_j(j=idx_update))
+
+            def report_progress(n_done):
+                logger.debug("fitted %i/%i scale models in %.2fsec" % (n_done, len(idx_update), time.time() - t0))
+
+            delta_theta[0, idx_update] = self._b_pool.optimize(
+                # The pool holds all features, translate indices if training on a packed active set:
+                idx_update=self._histogram_idx(idx_update),
+                b_var=b_var[0, idx_update],
+                eta_loc=eta_loc,
+                max_iter=max_iter,
+                ftol=ftol,
+                callback=report_progress
+            )
         else:
-            t0 = time.time()
-            for i, j in enumerate(idx_update):
-                sys.stdout.write(
-                    '\rFitting dispersion models: %.2f%% in %.2fsec' %
-                    (
-                        np.round(i / len(idx_update) * 100., 2),
-                        time.time() - t0
-                    )
-                )
-                sys.stdout.flush()
+            for j in idx_update:
                 if method.lower() == "brent":
-                    eta_loc = self.model.eta_loc_j(j=j).compute()
-                    data = self.x[:, [j]].compute()
-                    # Need to supply dense numpy array to scipy optimize:
-                    if isinstance(data, sparse.COO) or isinstance(data, scipy.sparse.csr_matrix):
-                        data = data.todense()
+                    if self._use_histogram:
+                        # Histogram entries act as weighted observations:
+                        value, group, weights = self._histogram.entries(j=self._histogram_idx(j))
+                        data = value[:, np.newaxis]
+                        eta_loc = self._group_eta_loc(idx=[j])[group]
+                        xh_scale_j = self._group_xh_scale()[group]
+                        weights = weights[:, np.newaxis]
+                    else:
+                        eta_loc = _compute(self.model.eta_loc_j(j=j))
+                        data = _compute(self.model.x_j(j=[j]))
+                        # Need to supply dense numpy array to scipy optimize:
+                        if isinstance(data, scipy.sparse.spmatrix):
+                            data = data.todense()
+                        xh_scale_j = xh_scale
+                        weights = 1.
 
                     ll = self.model.ll_handle()
                     lb, ub = self.model.param_bounds(dtype=data.dtype)
                     lb_bracket = np.max([lb["b_var"], b_var[0, j] - 20])
                     ub_bracket = np.min([ub["b_var"], b_var[0, j] + 20])
 
-                    def cost_b_var(x, data_j, eta_loc_j, xh_scale_j):
+                    def cost_b_var(x, data_j, eta_loc_j, xh_scale_j, weights_j):
                         x = np.clip(np.array([[x]]), lb["b_var"], ub["b_var"])
-                        return - np.sum(ll(
+                        return - np.sum(weights_j * ll(
                             data_j,
                             eta_loc_j,
                             x,
@@ -515,7 +1087,7 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
 
                     delta_theta[0, j] = scipy.optimize.brent(
                         func=cost_b_var,
-                        args=(data, eta_loc, xh_scale),
+                        args=(data, eta_loc, xh_scale_j, weights),
                         maxiter=max_iter,
                         tol=ftol,
                         brack=(lb_bracket, ub_bracket),
@@ -523,13 +1095,9 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
                     )
                 else:
                     raise ValueError("method %s not recognized" % method)
-            sys.stdout.write('\r')
-            sys.stdout.flush()
+        logger.debug("fitted %i scale models in %.2fsec" % (len(idx_update), time.time() - t0))
 
-        if isinstance(self.model.b_var, dask.array.core.Array):
-            delta_theta[:, idx_update] = delta_theta[:, idx_update] - self.model.b_var.compute()[:, idx_update]
-        else:
-            delta_theta[:, idx_update] = delta_theta[:, idx_update] - self.model.b_var.copy()[:, idx_update]
+        delta_theta[:, idx_update] = delta_theta[:, idx_update] - self.model.b_var[:, idx_update]
         return delta_theta
 
     def finalize(self):
@@ -541,13 +1109,21 @@ class EstimatorGlm(_EstimatorGLM, metaclass=abc.ABCMeta):
         transfers relevant attributes.
         """
         # Read from numpy-IRLS estimator specific model:
-        self._hessian = - self.model.fim.compute()
-        fisher_inv = np.zeros_like(self._hessian)
-        invertible = np.where(np.linalg.cond(self._hessian, p=None) < 1 / sys.float_info.epsilon)[0]
-        fisher_inv[invertible] = np.linalg.inv(- self._hessian[invertible])
+        self._hessian = - sum(_compute(model.fim) for model in self._observation_chunks())
+        fisher_inv, status = batched_spd_solve(
+            a=- self._hessian,
+            b=np.broadcast_to(np.identity(self._hessian.shape[-1]), self._hessian.shape)
+        )
+        self._record_solve_status(
+            field="fisher_inv",
+            idx=np.arange(0, self._hessian.shape[0]),
+            status=status
+        )
         self._fisher_inv = fisher_inv
-        self._jacobian = np.sum(np.abs(self.model.jac.compute() / self.model.x.shape[0]), axis=1)
-        self._log_likelihood = self.model.ll_byfeature.compute()
+        jac = sum(_compute(model.jac) for model in self._observation_chunks())
+        self._jacobian = np.sum(np.abs(jac / self.model.x.shape[0]), axis=1)
+        self._log_likelihood = sum(_compute(model.ll_byfeature) for model in self._observation_chunks()) + \
+            self.model.ll_constant_byfeature
         self._loss = np.sum(self._log_likelihood)
 
     @abc.abstractmethod
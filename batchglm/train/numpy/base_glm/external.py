@@ -1,4 +1,6 @@
 from batchglm.models.base_glm import InputDataGLM, _ModelGLM, _EstimatorGLM
 
-from batchglm.utils.linalg import groupwise_solve_lm
+from batchglm.utils.linalg import groupwise_solve_lm, batched_spd_solve, batched_xtwx, batched_xtwy
+from batchglm.utils.linalg import SPD_SOLVE_CHOLESKY, SPD_SOLVE_PINV, SPD_SOLVE_FAILED
+from batchglm.utils.telemetry import PhaseTimer, ProgressPrinter, iteration_record
 from batchglm import pkg_constants
\ No newline at end of file
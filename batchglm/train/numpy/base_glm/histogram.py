@@ -0,0 +1,185 @@
+import dask.array
+import numpy as np
+import scipy.sparse
+
+
+class CountHistogram:
+    """
+    Per-feature weighted histograms of unique (count, observation group) combinations.
+
+    Observations are grouped by unique rows of the location and scale model design matrices and size factors, so that
+    the linear predictors of both models of a feature are constant within a group. Any function of counts and linear
+    predictors that is summed over observations, such as the likelihood and its derivatives, can then be evaluated as
+    a weighted sum over histogram entries.
+
+    Entries are stored feature-major, similar to a CSC matrix: The entries of feature j are at positions
+    indptr[j] to indptr[j+1] of value, entry_group and weight, sorted by group.
+
+    The number of observations and the sum of counts by group and feature are kept as well, these are sufficient
+    statistics for all terms of a likelihood that are linear in the counts. Sums are kept in at least double
+    precision.
+    """
+
+    group: np.ndarray
+    n_groups: int
+    design_loc: np.ndarray
+    design_scale: np.ndarray
+    size_factors: np.ndarray
+    group_size: np.ndarray
+    x_sum: np.ndarray
+    indptr: np.ndarray
+    value: np.ndarray
+    entry_group: np.ndarray
+    weight: np.ndarray
+
+    def __init__(
+            self,
+            x,
+            design_loc: np.ndarray,
+            design_scale: np.ndarray,
+            size_factors: np.ndarray = None,
+            chunk_size: int = 100
+    ):
+        """
+
+        :param x: Count data (observations x features).
+        :param design_loc: Location model design matrix (observations x observed param).
+        :param design_scale: Scale model design matrix (observations x observed param).
+        :param size_factors: Size factors in linker space (observations x 1), None if not used.
+        :param chunk_size: Number of features that are processed at once.
+        """
+        if isinstance(design_loc, dask.array.core.Array):
+            design_loc = design_loc.compute()
+        if isinstance(design_scale, dask.array.core.Array):
+            design_scale = design_scale.compute()
+        design_loc = np.asarray(design_loc)
+        design_scale = np.asarray(design_scale)
+        keys = [design_loc, design_scale]
+        if size_factors is not None:
+            if isinstance(size_factors, dask.array.core.Array):
+                size_factors = size_factors.compute()
+            size_factors = np.asarray(size_factors)
+            keys.append(size_factors)
+        _, idx_rep, group = np.unique(np.concatenate(keys, axis=1), axis=0, return_index=True, return_inverse=True)
+        self.group = group.flatten()
+        self.n_groups = len(idx_rep)
+        self.design_loc = design_loc[idx_rep]
+        self.design_scale = design_scale[idx_rep]
+        self.size_factors = size_factors[idx_rep] if size_factors is not None else None
+        self.group_size = np.bincount(self.group, minlength=self.n_groups)
+
+        n_features = x.shape[1]
+        values = []
+        entry_groups = []
+        weights = []
+        n_entries = np.zeros([n_features], dtype=np.int64)
+        for start in range(0, n_features, chunk_size):
+            end = min(start + chunk_size, n_features)
+            col, entry_group, value, weight = self._block_entries(x=x[:, start:end])
+            values.append(value)
+            entry_groups.append(entry_group)
+            weights.append(weight)
+            n_entries[start:end] = np.bincount(col, minlength=end - start)
+        self.indptr = np.concatenate([[0], np.cumsum(n_entries)])
+        self.value = np.concatenate(values)
+        self.entry_group = np.concatenate(entry_groups)
+        self.weight = np.concatenate(weights)
+
+        col = np.repeat(np.arange(0, n_features), n_entries)
+        self.x_sum = np.bincount(
+            col * self.n_groups + self.entry_group,
+            weights=self.value * self.weight,
+            minlength=n_features * self.n_groups
+        ).reshape([n_features, self.n_groups]).T.astype(np.promote_types(self.value.dtype, np.float64))
+
+    def _block_entries(self, x):
+        """
+        Histogram entries of a block of features, sorted by feature and group.
+
+        Only nonzero counts are sorted explicitly, weights of zero counts follow from group sizes.
+
+        :return: Tuple (feature within block, group, count value, weight) of entries.
+        """
+        if isinstance(x, dask.array.core.Array):
+            x = x.compute()
+        x = scipy.sparse.coo_matrix(x)
+        x.sum_duplicates()
+        x.eliminate_zeros()
+        n_features = x.shape[1]
+
+        # Nonzero counts: run lengths of unique (feature, group, value) triplets.
+        row_group = self.group[x.row]
+        order = np.lexsort((x.data, row_group, x.col))
+        col = x.col[order]
+        row_group = row_group[order]
+        value = x.data[order]
+        is_new = np.ones([len(value)], dtype=bool)
+        is_new[1:] = (col[1:] != col[:-1]) | (row_group[1:] != row_group[:-1]) | (value[1:] != value[:-1])
+        idx_start = np.where(is_new)[0]
+        weight = np.diff(np.append(idx_start, len(value)))
+        col = col[idx_start]
+        row_group = row_group[idx_start]
+        value = value[idx_start]
+
+        # Zero counts: observations of a group that are not covered by nonzero entries.
+        n_nonzero = np.bincount(
+            x.col.astype(np.int64) * self.n_groups + self.group[x.row],
+            minlength=n_features * self.n_groups
+        )
+        weight_zero = np.tile(self.group_size, n_features) - n_nonzero
+        idx_zero = np.where(weight_zero > 0)[0]
+
+        col = np.concatenate([col, idx_zero // self.n_groups])
+        row_group = np.concatenate([row_group, idx_zero % self.n_groups])
+        value = np.concatenate([value, np.zeros([len(idx_zero)], dtype=value.dtype)])
+        weight = np.concatenate([weight, weight_zero[idx_zero]])
+        order = np.lexsort((row_group, col))
+        return col[order], row_group[order], value[order], weight[order].astype(value.dtype)
+
+    @property
+    def n_entries(self) -> np.ndarray:
+        """
+        Number of histogram entries by feature.
+        """
+        return np.diff(self.indptr)
+
+    def entries(self, j):
+        """
+        Histogram entries of a single feature.
+
+        :param j: Feature index.
+        :return: Tuple (count value, group, weight) of entries.
+        """
+        start = self.indptr[j]
+        end = self.indptr[j + 1]
+        return self.value[start:end], self.entry_group[start:end], self.weight[start:end]
+
+    def padded(self, idx):
+        """
+        Histogram entries of a set of features as dense arrays, padded with zero-weight entries.
+
+        Rows are aligned across features by group: Each row holds entries of a single group for all features,
+        so that quantities that only depend on the group, such as design matrix rows, are shared by all features.
+
+        :param idx: Feature indices.
+        :return: Tuple (count value, weight, group) with count value and weight as (rows x features) arrays
+            and group of each row (rows,).
+        """
+        idx = np.asarray(idx)
+        n_entries = self.n_entries[idx]
+        pos = np.repeat(self.indptr[idx], n_entries) + \
+            np.arange(0, np.sum(n_entries)) - np.repeat(np.cumsum(n_entries) - n_entries, n_entries)
+        col = np.repeat(np.arange(0, len(idx)), n_entries)
+        group = self.entry_group[pos]
+        # Rank of each entry within its (feature, group) block, entries are sorted by feature and group:
+        key = col * self.n_groups + group
+        rank = np.arange(0, len(key)) - np.searchsorted(key, key, side="left")
+        n_rows_group = np.zeros([self.n_groups], dtype=np.int64)
+        np.maximum.at(n_rows_group, group, rank + 1)
+        row = (np.cumsum(n_rows_group) - n_rows_group)[group] + rank
+
+        value = np.zeros([np.sum(n_rows_group), len(idx)], dtype=self.value.dtype)
+        weight = np.zeros([np.sum(n_rows_group), len(idx)], dtype=self.weight.dtype)
+        value[row, col] = self.value[pos]
+        weight[row, col] = self.weight[pos]
+        return value, weight, np.repeat(np.arange(0, self.n_groups), n_rows_group)
@@ -0,0 +1,40 @@
+"""
+Helpers shared by the observation-wise kernels of all noise models.
+
+Kernels operate on blocks of data x (observations x features) that are either dense numpy arrays or scipy.sparse
+matrices, as held in the blocks of the input data, together with dense parameter arrays of the same shape. For sparse
+data, each quantity is evaluated in closed form for zero entries on all cells first and is then corrected on the
+stored nonzero entries only, so that sparse data are never densified.
+"""
+import numpy as np
+import scipy.sparse
+
+
+def is_sparse(x) -> bool:
+    return isinstance(x, scipy.sparse.spmatrix)
+
+
+def accumulation_dtype(dtype):
+    """
+    Type that log-likelihoods and sums over observations are evaluated in for inputs of type dtype.
+
+    This is float64 for single precision inputs, so that single precision only affects data, linear predictors and
+    weights but not likelihood comparisons and reductions.
+    """
+    return np.promote_types(dtype, np.float64)
+
+
+def _nonzeros(x, dtype):
+    """
+    Coordinates and values of the stored entries of a sparse data matrix.
+
+    :param x: scipy.sparse matrix (observations x features).
+    :param dtype: Type to cast values to.
+    :return: Tuple (rows, columns, values) of the stored entries.
+    """
+    if not x.has_canonical_format:
+        # Kernels are not linear in x, duplicate entries have to be summed first.
+        x = x.copy()
+        x.sum_duplicates()
+    x = x.tocoo()
+    return x.row, x.col, x.data.astype(dtype, copy=False)
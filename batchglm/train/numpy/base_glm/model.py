@@ -1,17 +1,28 @@
 import abc
+import copy
+import dask.array
 import numpy as np
 import logging
 
+from .external import batched_xtwx, batched_xtwy
+
 logger = logging.getLogger("batchglm")
 
 
 class ModelIwls:
 
+    # Whether observations are counts. Count histograms and grouped statistics, see ll_grouped(), ll_nonsufficient()
+    # and iwls_weights_grouped(), are only available for count data: Histograms of continuous data do not compress
+    # observations.
+    count_data: bool = False
+
     def __init__(
             self,
             model_vars
     ):
         self.model_vars = model_vars
+        self._cache = {}
+        self._cache_version = None
         #self.params = np.concatenate(
         #    [
         #        model_vars.init_a_clipped,
@@ -20,6 +31,135 @@ class ModelIwls:
         #    axis=0
         #)
 
+    def subset_features(self, idx):
+        """
+        Copy of this model that is restricted to a subset of features.
+
+        Count data and parameters of the selected features are copied into compact arrays,
+        so that the cost of evaluating the returned model scales with the number of selected features.
+
+        :param idx: Indices of features to keep.
+        """
+        model = copy.copy(self)
+        model.input_data = self.input_data.subset_features(idx)
+        model.model_vars = self.model_vars.subset_features(idx)
+        model._cache = {}
+        model._cache_version = None
+        return model
+
+    def subset_observations(self, start, end):
+        """
+        View of this model that is restricted to a contiguous range of observations.
+
+        Data of the selected observations are loaded into memory, parameters are shared with this model.
+
+        :param start: First observation to keep.
+        :param end: Observation after the last observation to keep.
+        """
+        model = copy.copy(self)
+        model.input_data = self.input_data.subset_observations(start=start, end=end)
+        model._cache = {}
+        model._cache_version = None
+        return model
+
+    def _cached(self, name, fun, j=None):
+        """
+        Evaluate a parameter-dependent quantity at most once per parameter update.
+
+        Cached values are dropped whenever the parameter version of self.model_vars changes, ie. after every write
+        to a_var or b_var. Values for all features are kept per name. Of the values for subsets of features j,
+        only the most recent subset is kept per name, so that loops over single features or blocks of features
+        do not accumulate a second copy of the quantity.
+
+        :param name: Name of quantity.
+        :param fun: Function without arguments that computes the quantity.
+        :param j: Features that the quantity was computed for, None if all features.
+        """
+        if self._cache_version != self.model_vars.version:
+            self._cache = {}
+            self._cache_version = self.model_vars.version
+        if j is None:
+            key = (name, None)
+            subset = None
+        else:
+            j = np.asarray(j)
+            key = (name, "subset")
+            subset = (j.dtype.str, j.tobytes())
+        if key not in self._cache or self._cache[key][0] != subset:
+            value = fun()
+            if isinstance(value, dask.array.core.Array):
+                value = value.persist()
+            self._cache[key] = (subset, value)
+        return self._cache[key][1]
+
+    @staticmethod
+    def _apply_kernel(kernel, x, *args):
+        """
+        Evaluate an observation-wise kernel on count data and dense arrays of the same shape.
+
+        Dask count data are processed block by block, so that sparse blocks are passed to the kernel as such.
+
+        :param kernel: Function of count data block and dense array blocks that returns a dense block.
+        :param x: Count data (observations x features).
+        :param args: Dense arrays (observations x features).
+        :return: observations x features
+        """
+        if isinstance(x, dask.array.core.Array):
+            # Blocks of all arguments have to be aligned with the blocks of x:
+            args = [
+                a.rechunk(x.chunks) if isinstance(a, dask.array.core.Array)
+                else dask.array.from_array(a, chunks=x.chunks)
+                for a in args
+            ]
+            return dask.array.map_blocks(kernel, x, *args, dtype=args[0].dtype)
+        else:
+            args = [a.compute() if isinstance(a, dask.array.core.Array) else a for a in args]
+            return kernel(x, *args)
+
+    def x_j(self, j):
+        """
+        Data of a subset of features, see InputDataBase.fetch_x_features().
+
+        :return: observations x features
+        """
+        return self.input_data.fetch_x_features(j)
+
+    @property
+    def eta_loc(self) -> np.ndarray:
+        return self._cached("eta_loc", lambda: super(ModelIwls, self).eta_loc)
+
+    @property
+    def eta_scale(self) -> np.ndarray:
+        return self._cached("eta_scale", lambda: super(ModelIwls, self).eta_scale)
+
+    @property
+    def location(self):
+        return self._cached("location", lambda: super(ModelIwls, self).location)
+
+    @property
+    def scale(self):
+        return self._cached("scale", lambda: super(ModelIwls, self).scale)
+
+    def eta_loc_j(self, j) -> np.ndarray:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._cached("eta_loc", lambda: super(ModelIwls, self).eta_loc_j(j=j), j=j)
+
+    def eta_scale_j(self, j) -> np.ndarray:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._cached("eta_scale", lambda: super(ModelIwls, self).eta_scale_j(j=j), j=j)
+
+    def location_j(self, j):
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._cached("location", lambda: super(ModelIwls, self).location_j(j=j), j=j)
+
+    def scale_j(self, j):
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._cached("scale", lambda: super(ModelIwls, self).scale_j(j=j), j=j)
+
     @property
     def converged(self):
         return self.model_vars.converged
@@ -57,6 +197,11 @@ class ModelIwls:
 
     @abc.abstractmethod
     def ll(self) -> np.ndarray:
+        """
+        Log-likelihood by observation up to terms that only depend on the data, see ll_constant_byfeature.
+
+        :return: observations x features
+        """
         pass
 
     @abc.abstractmethod
@@ -70,6 +215,58 @@ class ModelIwls:
     def ll_byfeature_j(self, j) -> np.ndarray:
         return np.sum(self.ll_j(j=j), axis=0)
 
+    @property
+    def ll_constant_byfeature(self) -> np.ndarray:
+        """
+        Sum of the data-only terms that are omitted from ll over all observations by feature.
+
+        :return: (features,)
+        """
+        return np.zeros([self.model_vars.n_features])
+
+    def ll_grouped(self, x_sum, group_size, eta_loc, eta_scale) -> np.ndarray:
+        """
+        Terms of the log-likelihood that only depend on the counts through their sum, summed over groups of
+        observations with equal linear predictors.
+
+        Together with ll_nonsufficient(), this is the log-likelihood of the group up to the terms that only depend
+        on the data. Values are not clipped by observation. Only available for count data, see count_data.
+
+        :param x_sum: Sum of counts by group (groups x features).
+        :param group_size: Number of observations by group (groups x 1).
+        :param eta_loc: Location model linear predictor by group (groups x features).
+        :param eta_scale: Scale model linear predictor by group (groups x features).
+        :return: groups x features
+        """
+        raise ValueError("grouped statistics are only available for count data")
+
+    def ll_nonsufficient(self, x, eta_scale) -> np.ndarray:
+        """
+        Remaining terms of the log-likelihood by observation that are not covered by ll_grouped().
+
+        These may only depend on the counts and the scale model, so that they are constant in location model updates.
+        Only available for count data, see count_data.
+
+        :param x: Counts (observations x features).
+        :param eta_scale: Scale model linear predictor (observations x features).
+        :return: observations x features
+        """
+        raise ValueError("grouped statistics are only available for count data")
+
+    def iwls_weights_grouped(self, x_sum, group_size, eta_loc, eta_scale):
+        """
+        Location model IWLS weights and weighted working residuals summed over groups of observations with equal
+        linear predictors, these replace fim_weight_aa and fim_weight_aa * ybar in the normal equations.
+        Only available for count data, see count_data.
+
+        :param x_sum: Sum of counts by group (groups x features).
+        :param group_size: Number of observations by group (groups x 1).
+        :param eta_loc: Location model linear predictor by group (groups x features).
+        :param eta_scale: Scale model linear predictor by group (groups x features).
+        :return: Tuple (weights, weighted working residuals) (groups x features)
+        """
+        raise ValueError("grouped statistics are only available for count data")
+
     @abc.abstractmethod
     def fim_weight_aa(self) -> np.ndarray:
         pass
@@ -107,11 +304,7 @@ class ModelIwls:
         # w: (observations x features)
         # fim: (features x inferred param x inferred param)
         xh = np.matmul(self.design_loc, self.constraints_loc)
-        return np.einsum(
-            'fob,oc->fbc',
-            np.einsum('ob,of->fob', xh, w),
-            xh
-        )
+        return batched_xtwx(xh_a=xh, w=w)
 
     @abc.abstractmethod
     def fim_ab(self) -> np.ndarray:
@@ -149,11 +342,7 @@ class ModelIwls:
         """
         w = self.hessian_weight_aa
         xh = np.matmul(self.design_loc, self.constraints_loc)
-        return np.einsum(
-            'fob,oc->fbc',
-            np.einsum('ob,of->fob', xh, w),
-            xh
-        )
+        return batched_xtwx(xh_a=xh, w=w)
 
     @abc.abstractmethod
     def hessian_weight_ab(self) -> np.ndarray:
@@ -166,10 +355,10 @@ class ModelIwls:
         :return: (features x inferred param x inferred param)
         """
         w = self.hessian_weight_ab
-        return np.einsum(
-            'fob,oc->fbc',
-            np.einsum('ob,of->fob', np.matmul(self.design_loc, self.constraints_loc), w),
-            np.matmul(self.design_scale, self.constraints_scale)
+        return batched_xtwx(
+            xh_a=np.matmul(self.design_loc, self.constraints_loc),
+            w=w,
+            xh_b=np.matmul(self.design_scale, self.constraints_scale)
         )
 
     @abc.abstractmethod
@@ -184,11 +373,7 @@ class ModelIwls:
         """
         w = self.hessian_weight_bb
         xh = np.matmul(self.design_scale, self.constraints_scale)
-        return np.einsum(
-            'fob,oc->fbc',
-            np.einsum('ob,of->fob', xh, w),
-            xh
-        )
+        return batched_xtwx(xh_a=xh, w=w)
 
     @property
     def hessian(self) -> np.ndarray:
@@ -218,11 +403,7 @@ class ModelIwls:
         w = self.fim_weight_aa  # (observations x features)
         ybar = self.ybar  # (observations x features)
         xh = np.matmul(self.design_loc, self.constraints_loc)  # (observations x inferred param)
-        return np.einsum(
-            'fob,of->fb',
-            np.einsum('ob,of->fob', xh, w),
-            ybar
-        )
+        return batched_xtwy(xh=xh, w=w, y=ybar)
 
     def jac_a_j(self, j) -> np.ndarray:
         """
@@ -235,11 +416,7 @@ class ModelIwls:
         w = self.fim_weight_aa_j(j=j)  # (observations x features)
         ybar = self.ybar_j(j=j)  # (observations x features)
         xh = np.matmul(self.design_loc, self.constraints_loc)  # (observations x inferred param)
-        return np.einsum(
-            'fob,of->fb',
-            np.einsum('ob,of->fob', xh, w),
-            ybar
-        )
+        return batched_xtwy(xh=xh, w=w, y=ybar)
 
     @property
     def jac_b(self) -> np.ndarray:
@@ -249,11 +426,7 @@ class ModelIwls:
         """
         w = self.jac_weight_b  # (observations x features)
         xh = np.matmul(self.design_scale, self.constraints_scale)  # (observations x inferred param)
-        return np.einsum(
-            'fob,of->fb',
-            np.einsum('ob,of->fob', xh, w),
-            xh
-        )
+        return batched_xtwy(xh=xh, w=w)
 
     def jac_b_j(self, j) -> np.ndarray:
         """
@@ -263,10 +436,6 @@ class ModelIwls:
         # Make sure that dimensionality of sliced array is kept:
         if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
             j = [j]
-            w = self.jac_weight_b_j(j=j)  # (observations x features)
-            xh = np.matmul(self.design_scale, self.constraints_scale)  # (observations x inferred param)
-            return np.einsum(
-                'fob,of->fb',
-                np.einsum('ob,of->fob', xh, w),
-                xh
-            )
+        w = self.jac_weight_b_j(j=j)  # (observations x features)
+        xh = np.matmul(self.design_scale, self.constraints_scale)  # (observations x inferred param)
+        return batched_xtwy(xh=xh, w=w)
@@ -0,0 +1,72 @@
+import dask
+import heapq
+import numpy as np
+
+# State of a worker process, set once by _init_shard_worker() when the worker is started.
+_shard_state = {}
+
+
+def balance_shards(
+        cost: np.ndarray,
+        n_shards: int
+) -> list:
+    """
+    Partition features into shards of similar total cost.
+
+    Features are assigned in order of decreasing cost to the shard with the lowest total cost so far
+    (longest processing time first).
+
+    :param cost: Estimated cost of training by feature (features,).
+    :param n_shards: Number of shards.
+    :return: List of feature index arrays, one per non-empty shard, in order of decreasing total cost.
+    """
+    n_shards = max(min(n_shards, len(cost)), 1)
+    heap = [(0., i) for i in range(n_shards)]
+    members = [[] for _ in range(n_shards)]
+    for j in np.argsort(-cost, kind="stable"):
+        shard_cost, i = heapq.heappop(heap)
+        members[i].append(j)
+        heapq.heappush(heap, (shard_cost + cost[j], i))
+    shard_cost = dict((i, c) for c, i in heap)
+    order = sorted(range(n_shards), key=lambda i: -shard_cost[i])
+    return [np.sort(np.asarray(members[i], dtype=np.int64)) for i in order if len(members[i]) > 0]
+
+
+def _init_shard_worker(estimator, training_strategy, train_args):
+    """
+    Hold estimator and training arguments in worker process.
+
+    With fork-based process start, the estimator is inherited from the parent process and not copied.
+    """
+    _shard_state.clear()
+    _shard_state["estimator"] = estimator
+    _shard_state["training_strategy"] = training_strategy
+    _shard_state["train_args"] = train_args
+    # Processes are the unit of parallelism, dask graphs are evaluated on the worker thread:
+    dask.config.set(scheduler="synchronous")
+
+
+def _train_shard(idx):
+    """
+    Train and finalize features idx on a copy of the estimator that is restricted to these features.
+
+    :return: Tuple (idx, model variables, solve status, hessian, fisher_inv, jacobian, log_likelihood) of shard.
+    """
+    estimator = _shard_state["estimator"].subset_features(idx)
+    # Data of a shard are held in memory as numpy or scipy.sparse arrays instead of dask arrays:
+    estimator.model = estimator.model.subset_observations(start=0, end=estimator.input_data.num_observations)
+    estimator.input_data = estimator.model.input_data
+    estimator.train_sequence(
+        training_strategy=_shard_state["training_strategy"],
+        **_shard_state["train_args"]
+    )
+    estimator.finalize()
+    return (
+        idx,
+        estimator.model.model_vars,
+        estimator.solve_status,
+        estimator.hessian,
+        estimator.fisher_inv,
+        estimator.jacobian,
+        estimator.log_likelihood
+    )
@@ -22,3 +22,12 @@ class TrainingStrategies(Enum):
             "max_iter_b": 100
         },
     ]
+    NEWTON = [
+        {
+            "max_steps": 1000,
+            "method_b": "newton",
+            "update_b_freq": 5,
+            "ftol_b": 1e-6,
+            "max_iter_b": 100
+        },
+    ]
@@ -1,4 +1,4 @@
-import dask.array
+import copy
 import numpy as np
 import scipy.sparse
 import abc
@@ -19,6 +19,7 @@ class ModelVarsGlm:
     npar_a: int
     dtype: str
     n_features: int
+    version: int
 
     def __init__(
             self,
@@ -26,10 +27,11 @@ class ModelVarsGlm:
             init_b: np.ndarray,
             constraints_loc: np.ndarray,
             constraints_scale: np.ndarray,
-            chunk_size_genes: int,
             dtype: str
     ):
         """
+        Parameters are held in a single in-memory numpy array that is updated in place.
+        Values are clipped to the parameter bounds when they are written.
 
         :param init_a: nd.array (mean model size x features)
             Initialisation for all parameters of mean model.
@@ -42,14 +44,16 @@ class ModelVarsGlm:
 
         init_a_clipped = self.np_clip_param(np.asarray(init_a, dtype=dtype), "a_var")
         init_b_clipped = self.np_clip_param(np.asarray(init_b, dtype=dtype), "b_var")
-        self.params = dask.array.from_array(np.concatenate(
+        self.params = np.concatenate(
             [
                 init_a_clipped,
                 init_b_clipped,
             ],
             axis=0
-        ), chunks=(1000, chunk_size_genes))
+        )
         self.npar_a = init_a_clipped.shape[0]
+        # Incremented on every parameter write, used to invalidate quantities cached on the model.
+        self.version = 0
 
         # Properties to follow gene-wise convergence.
         self.converged = np.repeat(a=False, repeats=self.params.shape[1])  # Initialise to non-converged.
@@ -65,48 +69,50 @@ class ModelVarsGlm:
 
     @property
     def a_var(self):
-        a_var = self.params[0:self.npar_a]
-        return self.np_clip_param(a_var, "a_var")
+        # View into parameter store, modify only through setter.
+        return self.params[0:self.npar_a]
 
     @a_var.setter
     def a_var(self, value):
-        # Threshold new entry:
-        value = self.np_clip_param(value, "a_var")
-        # Write either new dask array or into numpy array:
-        if isinstance(self.params, dask.array.core.Array):
-            temp = self.params.compute()
-            temp[0:self.npar_a] = value
-            self.params = dask.array.from_array(temp, chunks=self.params.chunksize)
-        else:
-            self.params[0:self.npar_a] = value
+        self.params[0:self.npar_a] = self.np_clip_param(np.asarray(value), "a_var")
+        self.version += 1
 
     @property
     def b_var(self):
-        b_var = self.params[self.npar_a:]
-        return self.np_clip_param(b_var, "b_var")
+        # View into parameter store, modify only through setter.
+        return self.params[self.npar_a:]
 
     @b_var.setter
     def b_var(self, value):
-        # Threshold new entry:
-        value = self.np_clip_param(value, "b_var")
-        # Write either new dask array or into numpy array:
-        if isinstance(self.params, dask.array.core.Array):
-            temp = self.params.compute()
-            temp[self.npar_a:] = value
-            self.params = dask.array.from_array(temp, chunks=self.params.chunksize)
-        else:
-            self.params[self.npar_a:] = value
+        self.params[self.npar_a:] = self.np_clip_param(np.asarray(value), "b_var")
+        self.version += 1
 
     def b_var_j_setter(self, value, j):
-        # Threshold new entry:
-        value = self.np_clip_param(value, "b_var")
-        # Write either new dask array or into numpy array:
-        if isinstance(self.params, dask.array.core.Array):
-            temp = self.params.compute()
-            temp[self.npar_a:, j] = value
-            self.params = dask.array.from_array(temp, chunks=self.params.chunksize)
-        else:
-            self.params[self.npar_a:, j] = value
+        self.params[self.npar_a:, j] = self.np_clip_param(np.asarray(value), "b_var")
+        self.version += 1
+
+    def subset_features(self, idx):
+        """
+        Copy of these variables that is restricted to a subset of features.
+
+        :param idx: Indices of features to keep.
+        """
+        model_vars = copy.copy(self)
+        model_vars.params = self.params[:, idx].copy()
+        model_vars.converged = self.converged[idx].copy()
+        model_vars.n_features = len(idx)
+        return model_vars
+
+    def update_features(self, idx, model_vars):
+        """
+        Write parameters and convergence status of a feature subset back into these variables.
+
+        :param idx: Indices of features in these variables that model_vars was restricted to.
+        :param model_vars: Variables produced by self.subset_features(idx).
+        """
+        self.params[:, idx] = model_vars.params
+        self.version += 1
+        self.converged[idx] = model_vars.converged
 
     @abc.abstractmethod
     def param_bounds(self, dtype):
@@ -0,0 +1,273 @@
+import dask.array
+import logging
+import multiprocessing
+import numpy as np
+import os
+import scipy.optimize
+import scipy.sparse
+import shutil
+import tempfile
+
+logger = logging.getLogger("batchglm")
+
+# State of a worker process, set once by _init_worker() when the worker is started.
+_worker_state = {}
+
+
+def _init_worker(specs, ll, lb_b_var, ub_b_var):
+    """
+    Attach worker process to memory-mapped arrays of the pool.
+
+    :param specs: Dictionary of array name to (file name, dtype, shape) of memory-mapped arrays.
+    :param ll: Picklable log-likelihood handle, see ModelIwls.ll_handle().
+    :param lb_b_var: Lower bound of scale model parameters.
+    :param ub_b_var: Upper bound of scale model parameters.
+    """
+    _worker_state.clear()
+    for k, (fn, dtype, shape) in specs.items():
+        _worker_state[k] = np.memmap(fn, dtype=dtype, mode="r+", shape=shape)
+    _worker_state["ll"] = ll
+    _worker_state["lb_b_var"] = lb_b_var
+    _worker_state["ub_b_var"] = ub_b_var
+
+
+def _fetch_j(j):
+    """
+    Observations of feature j and their location model linear predictor, scale model design and weights.
+
+    :return: Tuple (counts, location model linear predictor, scale model design, weights) of
+        (observations x 1) arrays.
+    """
+    xh_scale = np.asarray(_worker_state["xh_scale"])
+    if "h_indptr" in _worker_state:
+        # Count histogram entries act as weighted observations:
+        start = _worker_state["h_indptr"][j]
+        end = _worker_state["h_indptr"][j + 1]
+        group = np.asarray(_worker_state["h_group"][start:end])
+        x_j = np.asarray(_worker_state["h_value"][start:end])
+        eta_loc_j = np.asarray(_worker_state["eta_loc"][j])[group]
+        weights_j = np.asarray(_worker_state["h_weight"][start:end])
+        return (
+            np.expand_dims(x_j, axis=-1),
+            np.expand_dims(eta_loc_j, axis=-1),
+            xh_scale[group],
+            np.expand_dims(weights_j, axis=-1)
+        )
+    if "x_indptr" in _worker_state:
+        x_j = np.zeros([_worker_state["xh_scale"].shape[0]], dtype=_worker_state["x_data"].dtype)
+        start = _worker_state["x_indptr"][j]
+        end = _worker_state["x_indptr"][j + 1]
+        x_j[_worker_state["x_indices"][start:end]] = _worker_state["x_data"][start:end]
+    else:
+        x_j = np.asarray(_worker_state["x"][j])
+    eta_loc_j = np.asarray(_worker_state["eta_loc"][j])
+    return np.expand_dims(x_j, axis=-1), np.expand_dims(eta_loc_j, axis=-1), xh_scale, 1.
+
+
+def _fit_range(start, end, max_iter, ftol):
+    """
+    Run brent line searches for the scale model of the features at positions start to end of the current update.
+
+    Features and initial values are read from the shared idx and b_var arrays,
+    results are written into the shared b_var_new array.
+
+    :return: Number of fitted features.
+    """
+    ll = _worker_state["ll"]
+    lb = _worker_state["lb_b_var"]
+    ub = _worker_state["ub_b_var"]
+
+    def cost_b_var(x, data_j, eta_loc_j, xh_scale_j, weights_j):
+        x = np.clip(np.array([[x]]), lb, ub)
+        return - np.sum(weights_j * ll(data_j, eta_loc_j, x, xh_scale_j))
+
+    for i in range(start, end):
+        j = _worker_state["idx"][i]
+        b_j = _worker_state["b_var"][i]
+        _worker_state["b_var_new"][i] = scipy.optimize.brent(
+            func=cost_b_var,
+            args=_fetch_j(j),
+            maxiter=max_iter,
+            tol=ftol,
+            brack=(np.max([lb, b_j - 20]), np.min([ub, b_j + 20])),
+            full_output=False
+        )
+    return end - start
+
+
+class ScaleWorkerPool:
+    """
+    Long-lived process pool for per-feature scale model line searches.
+
+    Count data, scale model design and location model linear predictor are held in memory-mapped
+    arrays that are shared with all workers, so that workers only receive feature index ranges.
+    If count histograms are given, these replace the count data and the location model linear predictor
+    is shared by observation group.
+    The pool is meant to live for the duration of one EstimatorGlm.train() call.
+    """
+
+    def __init__(
+            self,
+            x,
+            xh_scale: np.ndarray,
+            ll,
+            lb_b_var: float,
+            ub_b_var: float,
+            nproc: int,
+            chunk_size: int,
+            histogram=None
+    ):
+        """
+
+        :param x: Count data (observations x features).
+        :param xh_scale: Scale model design matrix with constraints applied (observations x 1).
+            (groups x 1) if histogram is given.
+        :param ll: Picklable log-likelihood handle, see ModelIwls.ll_handle().
+        :param lb_b_var: Lower bound of scale model parameters.
+        :param ub_b_var: Upper bound of scale model parameters.
+        :param nproc: Number of worker processes.
+        :param chunk_size: Maximum number of features sent to a worker at once.
+        :param histogram: CountHistogram of x that is used instead of x if not None.
+        """
+        self.nproc = nproc
+        self.chunk_size = chunk_size
+        self.dir = tempfile.mkdtemp(prefix="batchglm_")
+        self.specs = {}
+        self.arrays = {}
+
+        n_features = x.shape[1]
+        if histogram is not None:
+            self._share(name="h_value", value=histogram.value)
+            self._share(name="h_group", value=histogram.entry_group)
+            self._share(name="h_weight", value=histogram.weight)
+            self._share(name="h_indptr", value=histogram.indptr)
+            n_obs = histogram.n_groups
+        else:
+            self._share_x(x)
+            n_obs = x.shape[0]
+        self._share(name="xh_scale", value=np.asarray(xh_scale))
+        self._share(name="eta_loc", value=np.zeros([n_features, n_obs], dtype=xh_scale.dtype))
+        self._share(name="idx", value=np.zeros([n_features], dtype=np.int64))
+        self._share(name="b_var", value=np.zeros([n_features], dtype=xh_scale.dtype))
+        self._share(name="b_var_new", value=np.zeros([n_features], dtype=xh_scale.dtype))
+
+        self.pool = multiprocessing.Pool(
+            processes=nproc,
+            initializer=_init_worker,
+            initargs=(self.specs, ll, lb_b_var, ub_b_var)
+        )
+
+    def _share_x(self, x):
+        if isinstance(x, dask.array.core.Array):
+            # Lazily evaluated data, eg. of backed input, are written block by block, so that they are never loaded
+            # into memory as a whole:
+            if isinstance(x._meta, scipy.sparse.spmatrix):
+                self._share_sparse_blocks(x)
+            else:
+                fn = os.path.join(self.dir, "x")
+                shape = (x.shape[1], x.shape[0])
+                mm = np.memmap(fn, dtype=x.dtype, mode="w+", shape=shape)
+                dask.array.store(x.T, mm, lock=True)
+                mm.flush()
+                self.specs["x"] = (fn, x.dtype, shape)
+                self.arrays["x"] = mm
+            return
+        if isinstance(x, scipy.sparse.spmatrix):
+            x = scipy.sparse.csc_matrix(x)
+            x.sort_indices()
+            self._share(name="x_data", value=x.data)
+            self._share(name="x_indices", value=x.indices)
+            self._share(name="x_indptr", value=x.indptr)
+        else:
+            # Features are stored along the first axis so that each feature is contiguous in memory.
+            self._share(name="x", value=np.asarray(x).T)
+
+    def _share_sparse_blocks(self, x):
+        """
+        Share a dask array of sparse blocks in compressed sparse column format.
+
+        Features are converted one chunk of features at a time and appended to the files of the memory-mapped
+        arrays, so that only the stored entries of one chunk of features are held in memory at once.
+        """
+        fn_data = os.path.join(self.dir, "x_data")
+        fn_indices = os.path.join(self.dir, "x_indices")
+        indptr = [np.zeros([1], dtype=np.int64)]
+        with open(fn_data, "wb") as f_data, open(fn_indices, "wb") as f_indices:
+            cols = np.cumsum((0,) + x.chunks[1])
+            for k in range(len(x.chunks[1])):
+                x_k = scipy.sparse.csc_matrix(x[:, cols[k]:cols[k + 1]].compute())
+                x_k.sum_duplicates()
+                f_data.write(np.ascontiguousarray(x_k.data, dtype=x.dtype).tobytes())
+                f_indices.write(np.ascontiguousarray(x_k.indices, dtype=np.int64).tobytes())
+                indptr.append(indptr[-1][-1] + x_k.indptr[1:].astype(np.int64))
+            nnz = int(indptr[-1][-1])
+            if nnz == 0:
+                # Memory maps of empty files are not supported:
+                f_data.write(np.zeros([1], dtype=x.dtype).tobytes())
+                f_indices.write(np.zeros([1], dtype=np.int64).tobytes())
+        for name, fn, dtype in [("x_data", fn_data, x.dtype), ("x_indices", fn_indices, np.dtype(np.int64))]:
+            shape = (max(nnz, 1),)
+            self.specs[name] = (fn, dtype, shape)
+            self.arrays[name] = np.memmap(fn, dtype=dtype, mode="r+", shape=shape)
+        self._share(name="x_indptr", value=np.concatenate(indptr))
+
+    def _share(self, name, value):
+        fn = os.path.join(self.dir, name)
+        mm = np.memmap(fn, dtype=value.dtype, mode="w+", shape=value.shape)
+        mm[:] = value
+        mm.flush()
+        self.specs[name] = (fn, value.dtype, value.shape)
+        self.arrays[name] = mm
+
+    def optimize(
+            self,
+            idx_update: np.ndarray,
+            b_var: np.ndarray,
+            eta_loc: np.ndarray,
+            max_iter: int,
+            ftol: float,
+            callback=None
+    ) -> np.ndarray:
+        """
+        Fit scale model of features in idx_update.
+
+        :param idx_update: Features to fit.
+        :param b_var: Initial scale model parameters of features in idx_update (features,).
+        :param eta_loc: Location model linear predictor of features in idx_update (observations x features).
+            (groups x features) if the pool was built on count histograms.
+        :param max_iter: Maximum number of iterations of brent line search.
+        :param ftol: Tolerance of brent line search.
+        :param callback: Called with the number of fitted features after each completed chunk of features.
+        :return: Optimized scale model parameters of features in idx_update (features,).
+        """
+        n = len(idx_update)
+        self.arrays["idx"][:n] = idx_update
+        self.arrays["b_var"][:n] = b_var
+        self.arrays["eta_loc"][idx_update] = eta_loc.T
+        for k in ["idx", "b_var", "eta_loc"]:
+            self.arrays[k].flush()
+
+        chunk_size = int(np.clip(np.ceil(n / (4 * self.nproc)), 1, self.chunk_size))
+        ranges = [(i, min(i + chunk_size, n), max_iter, ftol) for i in range(0, n, chunk_size)]
+        n_done = 0
+        for n_chunk in self.pool.imap_unordered(_fit_range_star, ranges):
+            n_done += n_chunk
+            if callback is not None:
+                callback(n_done)
+        return np.array(self.arrays["b_var_new"][:n])
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.arrays = {}
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _fit_range_star(args):
+    return _fit_range(*args)
@@ -0,0 +1,147 @@
+"""
+Observation-wise quantities of the beta model with logit link for the mean and log link for the sample size.
+
+With mean mu and sample size phi, the shape parameters of the beta distribution are p = mu phi and q = (1 - mu) phi.
+The sufficient statistics are log(x) and log(1 - x), and all derivatives are expressed in terms of the logit
+transformed data y* = log(x / (1 - x)) and its expectation mu* = digamma(p) - digamma(q), see Ferrari and
+Cribari-Neto (2004), Beta regression for modelling rates and proportions.
+
+Kernels take the location model linear predictor instead of the mean, so that mu and 1 - mu are both evaluated
+without cancellation. Beta distributed data have no zero entries, sparse data are rejected.
+
+Log-likelihoods are evaluated and returned in at least double precision, see accumulation_dtype().
+"""
+import numpy as np
+import scipy.special
+
+from .external import is_sparse, accumulation_dtype
+
+
+def _dense(x, dtype):
+    if is_sparse(x):
+        raise ValueError("beta distributed data lie in (0, 1), sparse data are not supported")
+    return np.asarray(x).astype(dtype, copy=False)
+
+
+def _shapes(eta_loc, scale):
+    """
+    Mean, one minus mean and shape parameters p and q.
+    """
+    mu = scipy.special.expit(eta_loc)
+    one_minus_mu = scipy.special.expit(- eta_loc)
+    return mu, one_minus_mu, mu * scale, one_minus_mu * scale
+
+
+def _residual(x, p, q):
+    """
+    Residual of logit transformed data, y* - mu*.
+    """
+    x = _dense(x, dtype=p.dtype)
+    return np.log(x) - np.log1p(- x) - scipy.special.digamma(p) + scipy.special.digamma(q)
+
+
+def ll(x, eta_loc, scale):
+    """
+    Log-likelihood by observation, not clipped.
+
+    :return: observations x features
+    """
+    dtype = accumulation_dtype(scale.dtype)
+    eta_loc, scale = [np.asarray(v).astype(dtype, copy=False) for v in (eta_loc, scale)]
+    x = _dense(x, dtype=dtype)
+    _, _, p, q = _shapes(eta_loc, scale)
+    return - scipy.special.betaln(p, q) + (p - 1.) * np.log(x) + (q - 1.) * np.log1p(- x)
+
+
+def fim_weight_aa(eta_loc, scale):
+    """
+    Expected location-location hessian weight with respect to the logit mean, -phi^2 (mu (1 - mu))^2 v with
+    v = trigamma(p) + trigamma(q).
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    v = scipy.special.polygamma(1, p) + scipy.special.polygamma(1, q)
+    return - np.square(scale * mu * one_minus_mu) * v
+
+
+def ybar(x, eta_loc, scale):
+    """
+    Working residual of the location model, the score with respect to the logit mean divided by the expected
+    information, (y* - mu*) / (phi mu (1 - mu) v).
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    v = scipy.special.polygamma(1, p) + scipy.special.polygamma(1, q)
+    return _residual(x, p, q) / (scale * mu * one_minus_mu * v)
+
+
+def jac_weight_b(x, eta_loc, scale):
+    """
+    Observation-wise weight of the scale model jacobian with respect to log(phi),
+    phi (mu (y* - mu*) + log(1 - x) - digamma(q) + digamma(phi)).
+
+    :return: observations x features
+    """
+    mu, _, p, q = _shapes(eta_loc, scale)
+    x = _dense(x, dtype=p.dtype)
+    return scale * (
+        mu * _residual(x, p, q) + np.log1p(- x) - scipy.special.digamma(q) + scipy.special.digamma(scale)
+    )
+
+
+def fim_weight_bb(eta_loc, scale):
+    """
+    Expected scale-scale hessian weight with respect to log(phi),
+    phi^2 (trigamma(phi) - mu^2 trigamma(p) - (1 - mu)^2 trigamma(q)), which is negative.
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    return np.square(scale) * (
+        scipy.special.polygamma(1, scale)
+        - np.square(mu) * scipy.special.polygamma(1, p)
+        - np.square(one_minus_mu) * scipy.special.polygamma(1, q)
+    )
+
+
+def fim_weight_ab(eta_loc, scale):
+    """
+    Expected location-scale hessian weight, -phi^2 mu (1 - mu) (mu trigamma(p) - (1 - mu) trigamma(q)).
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    return - np.square(scale) * mu * one_minus_mu * (
+        mu * scipy.special.polygamma(1, p) - one_minus_mu * scipy.special.polygamma(1, q)
+    )
+
+
+def hessian_weight_aa(x, eta_loc, scale):
+    """
+    Observation-wise weight of the location-location hessian block.
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    return scale * mu * one_minus_mu * (one_minus_mu - mu) * _residual(x, p, q) + fim_weight_aa(eta_loc, scale)
+
+
+def hessian_weight_ab(x, eta_loc, scale):
+    """
+    Observation-wise weight of the location-scale hessian block.
+
+    :return: observations x features
+    """
+    mu, one_minus_mu, p, q = _shapes(eta_loc, scale)
+    return scale * mu * one_minus_mu * _residual(x, p, q) + fim_weight_ab(eta_loc, scale)
+
+
+def hessian_weight_bb(x, eta_loc, scale):
+    """
+    Observation-wise weight of the scale-scale hessian block.
+
+    :return: observations x features
+    """
+    return jac_weight_b(x, eta_loc, scale) + fim_weight_bb(eta_loc, scale)
@@ -0,0 +1,175 @@
+import functools
+import logging
+import numpy as np
+
+from .external import Model, ModelIwls, InputDataGLM
+from .external import batched_xtwx
+from .processModel import ProcessModel
+from . import kernels
+
+logger = logging.getLogger(__name__)
+
+
+def ll_beta(x, eta_loc, b_var, xh_scale, ll_min):
+    """
+    Log-likelihood of beta distributed data as a function of the scale model parameters.
+
+    This is defined on module level so that it can be shipped to worker processes without the model.
+
+    :param x: Data (observations x features).
+    :param eta_loc: Location model linear predictor, the logit mean (observations x features).
+    :param b_var: Scale model parameters (inferred param x features).
+    :param xh_scale: Scale model design matrix with constraints applied (observations x inferred param).
+    :param ll_min: Lower bound of log-likelihood by observation.
+    :return: observations x features
+    """
+    ll = kernels.ll(x=x, eta_loc=eta_loc, scale=np.exp(np.matmul(xh_scale, b_var)))
+    return np.maximum(ll, ll_min)
+
+
+class ModelIwlsBeta(ModelIwls, Model, ProcessModel):
+    """
+    Beta model with logit link for the mean and log link for the sample size.
+
+    The location model is fit with Fisher scoring, ie. IWLS with the expected information as weights.
+    The scale model is fit with vectorized Newton steps that also use the expected information, which is
+    negative definite everywhere, so that every scale model step is an ascent direction.
+    """
+
+    def __init__(
+            self,
+            input_data: InputDataGLM,
+            model_vars,
+            dtype,
+    ):
+        super(Model, self).__init__(
+            input_data=input_data
+        )
+        ModelIwls.__init__(
+            self=self,
+            model_vars=model_vars
+        )
+
+    @property
+    def fim_weight_aa(self):
+        """
+
+        :return: observations x features
+        """
+        return kernels.fim_weight_aa(eta_loc=self.eta_loc, scale=self.scale)
+
+    @property
+    def ybar(self) -> np.ndarray:
+        """
+
+        :return: observations x features
+        """
+        return self._apply_kernel(kernels.ybar, self.x, self.eta_loc, self.scale)
+
+    def fim_weight_aa_j(self, j):
+        """
+
+        :return: observations x features
+        """
+        return kernels.fim_weight_aa(eta_loc=self.eta_loc_j(j=j), scale=self.scale_j(j=j))
+
+    def ybar_j(self, j) -> np.ndarray:
+        """
+
+        :return: observations x features
+        """
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._apply_kernel(kernels.ybar, self.x_j(j=j), self.eta_loc_j(j=j), self.scale_j(j=j))
+
+    @property
+    def jac_weight_b(self):
+        """
+
+        :return: observations x features
+        """
+        return self._apply_kernel(kernels.jac_weight_b, self.x, self.eta_loc, self.scale)
+
+    def jac_weight_b_j(self, j):
+        """
+
+        :return: observations x features
+        """
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._apply_kernel(kernels.jac_weight_b, self.x_j(j=j), self.eta_loc_j(j=j), self.scale_j(j=j))
+
+    @property
+    def fim_ab(self) -> np.ndarray:
+        """
+        Location-scale coefficient block of FIM
+
+        :return: (features x inferred param x inferred param)
+        """
+        return batched_xtwx(
+            xh_a=np.matmul(self.design_loc, self.constraints_loc),
+            w=kernels.fim_weight_ab(eta_loc=self.eta_loc, scale=self.scale),
+            xh_b=np.matmul(self.design_scale, self.constraints_scale)
+        )
+
+    @property
+    def fim_bb(self) -> np.ndarray:
+        """
+        Scale-scale coefficient block of FIM
+
+        :return: (features x inferred param x inferred param)
+        """
+        w = kernels.fim_weight_bb(eta_loc=self.eta_loc, scale=self.scale)
+        xh = np.matmul(self.design_scale, self.constraints_scale)
+        return batched_xtwx(xh_a=xh, w=w)
+
+    @property
+    def hessian_weight_ab(self):
+        return self._apply_kernel(kernels.hessian_weight_ab, self.x, self.eta_loc, self.scale)
+
+    @property
+    def hessian_weight_aa(self):
+        return self._apply_kernel(kernels.hessian_weight_aa, self.x, self.eta_loc, self.scale)
+
+    @property
+    def hessian_weight_bb(self):
+        return self._apply_kernel(kernels.hessian_weight_bb, self.x, self.eta_loc, self.scale)
+
+    def _clip_ll(self, ll):
+        bounds_min, _ = self.param_bounds(dtype=ll.dtype)
+        return np.maximum(ll, bounds_min["ll"])
+
+    @property
+    def ll(self):
+        ll = self._apply_kernel(kernels.ll, self.x, self.eta_loc, self.scale)
+        return self._clip_ll(ll)
+
+    def ll_j(self, j):
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        ll = self._apply_kernel(kernels.ll, self.x_j(j=j), self.eta_loc_j(j=j), self.scale_j(j=j))
+        return self._clip_ll(ll)
+
+    @property
+    def ll_constant_byfeature(self) -> np.ndarray:
+        return np.zeros([self.model_vars.n_features])
+
+    def ll_handle(self):
+        bounds_min, _ = self.param_bounds(dtype=self.model_vars.dtype)
+        return functools.partial(ll_beta, ll_min=bounds_min["ll"])
+
+    def jac_b_handle(self):
+        def fun(x, eta_loc, b_var, xh_scale):
+            return kernels.jac_weight_b(x=x, eta_loc=eta_loc, scale=np.exp(np.matmul(xh_scale, b_var)))
+
+        return fun
+
+    def hessian_b_handle(self):
+        # Expected instead of observed hessian: Newton steps of the scale model are Fisher scoring steps.
+        def fun(x, eta_loc, b_var, xh_scale):
+            return kernels.fim_weight_bb(eta_loc=eta_loc, scale=np.exp(np.matmul(xh_scale, b_var)))
+
+        return fun
@@ -0,0 +1,33 @@
+from enum import Enum
+
+
+class TrainingStrategies(Enum):
+
+    AUTO = None
+    DEFAULT = [
+        {
+            "max_steps": 1000,
+            "method_b": "newton",
+            "update_b_freq": 1,
+            "ftol_b": 1e-8,
+            "max_iter_b": 100
+        },
+    ]
+    GD = [
+        {
+            "max_steps": 1000,
+            "method_b": "gd",
+            "update_b_freq": 5,
+            "ftol_b": 1e-6,
+            "max_iter_b": 100
+        },
+    ]
+    NEWTON = [
+        {
+            "max_steps": 1000,
+            "method_b": "newton",
+            "update_b_freq": 1,
+            "ftol_b": 1e-8,
+            "max_iter_b": 100
+        },
+    ]
@@ -40,6 +40,8 @@ class Estimator(EstimatorGlm):
                 * "standard": initialize intercept with observed mean
                 * "init_model": initialize with another model (see `ìnit_model` parameter)
                 * "closed_form": try to initialize with closed form
+                * "lstsq": least squares regression of the transformed data on the design, chosen by "auto" for
+                  designs with continuous covariates
             - np.ndarray: direct initialization of 'a'
         :param init_b: (Optional)
             Low-level initial values for b. Can be:
@@ -50,6 +52,8 @@ class Estimator(EstimatorGlm):
                 * "standard": initialize with zeros
                 * "init_model": initialize with another model (see `ìnit_model` parameter)
                 * "closed_form": try to initialize with closed form
+                * "lstsq": initialize intercept with moments pooled around the "lstsq" location model,
+                  chosen by "auto" if the location model is initialized with "lstsq"
             - np.ndarray: direct initialization of 'b'
         :param quick_scale: bool
             Whether `scale` will be fitted faster and maybe less accurate.
@@ -76,7 +80,6 @@ class Estimator(EstimatorGlm):
             init_b=init_b,
             constraints_loc=input_data.constraints_loc,
             constraints_scale=input_data.constraints_scale,
-            chunk_size_genes=input_data.chunk_size_genes,
             dtype=dtype
         )
         model = ModelIwlsNb(
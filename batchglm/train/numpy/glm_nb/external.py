@@ -8,4 +8,5 @@ from batchglm.utils.linalg import groupwise_solve_lm
 from batchglm import pkg_constants
 
 # import necessary base_glm layers
-from batchglm.train.numpy.base_glm import EstimatorGlm, ModelIwls, ModelVarsGlm, ProcessModelGlm
\ No newline at end of file
+from batchglm.train.numpy.base_glm import EstimatorGlm, ModelIwls, ModelVarsGlm, ProcessModelGlm
+from batchglm.train.numpy.base_glm.kernels import is_sparse, accumulation_dtype, _nonzeros
\ No newline at end of file
@@ -0,0 +1,215 @@
+"""
+Observation-wise quantities of the negative binomial model.
+
+All kernels operate on blocks of count data x (observations x features) that are either dense numpy arrays or
+scipy.sparse matrices, together with dense location and scale arrays of the same shape.
+For sparse count data, each quantity is evaluated in closed form for zero counts on all cells first and is then
+corrected on the stored nonzero entries only, so that sparse counts are never densified, see base_glm.kernels.
+
+Weights are evaluated in the precision of the inputs. Log-likelihoods are differences of large terms and are summed
+over many observations, they are evaluated and returned in at least double precision, see accumulation_dtype().
+"""
+import numpy as np
+import scipy.special
+
+from .external import is_sparse, accumulation_dtype, _nonzeros
+
+
+# Scale above which log-likelihood terms are evaluated in a form that avoids the cancellation of large terms, see
+# _r_log_r_over_r_plus_mu() and _gammaln_ratio().
+_SCALE_LARGE = 1e6
+
+
+def _r_log_r_over_r_plus_mu(eta_scale, log_r_plus_mu, loc, scale):
+    """
+    r * log(r / (r + mu)), evaluated as -r * log1p(mu / r) where r is large.
+
+    :return: observations x features
+    """
+    y = np.multiply(scale, eta_scale - log_r_plus_mu)
+    large = scale > _SCALE_LARGE
+    if np.any(large):
+        y[large] = - scale[large] * np.log1p(loc[large] / scale[large])
+    return y
+
+
+def _gammaln_ratio(scale, x):
+    """
+    log(Gamma(r + x) / Gamma(r)) for arrays of scale and counts of the same shape, evaluated as
+    log(Gamma(x)) - log(B(r, x)) where r is large, so that log(Gamma(r)) does not cancel.
+    """
+    y = scipy.special.gammaln(scale + x) - scipy.special.gammaln(scale)
+    large = np.logical_and(scale > _SCALE_LARGE, x > 0)
+    if np.any(large):
+        y[large] = scipy.special.gammaln(x[large]) - scipy.special.betaln(scale[large], x[large])
+    return y
+
+
+def ll(x, eta_loc, eta_scale, loc, scale):
+    """
+    Log-likelihood by observation without the term -log(x!), not clipped.
+
+    The omitted term only depends on the count data, see InputDataBase.feature_sum_log_factorial.
+
+    :return: observations x features
+    """
+    dtype = accumulation_dtype(loc.dtype)
+    eta_loc, eta_scale, loc, scale = [np.asarray(v).astype(dtype, copy=False) for v in (eta_loc, eta_scale, loc, scale)]
+    log_r_plus_mu = np.log(scale + loc)
+    if is_sparse(x):
+        # Zero counts: log-likelihood reduces to r * (log(r) - log(r + mu)).
+        ll = _r_log_r_over_r_plus_mu(eta_scale, log_r_plus_mu, loc, scale)
+        row, col, x_nz = _nonzeros(x, dtype=ll.dtype)
+        ll[row, col] += _gammaln_ratio(scale[row, col], x_nz) + \
+            x_nz * (eta_loc[row, col] - log_r_plus_mu[row, col])
+    else:
+        x = np.asarray(x).astype(dtype, copy=False)
+        ll = _gammaln_ratio(scale, x) + \
+            x * (eta_loc - log_r_plus_mu) + \
+            _r_log_r_over_r_plus_mu(eta_scale, log_r_plus_mu, loc, scale)
+    return ll
+
+
+def ybar(x, loc):
+    """
+    Working residual of the location model, (x - mu) / mu.
+
+    :return: observations x features
+    """
+    if is_sparse(x):
+        ybar = - np.ones_like(loc)
+        row, col, x_nz = _nonzeros(x, dtype=ybar.dtype)
+        ybar[row, col] += x_nz / loc[row, col]
+    else:
+        ybar = (np.asarray(x) - loc) / loc
+    return ybar
+
+
+def jac_weight_b(x, loc, scale):
+    """
+    Observation-wise weight of the scale model jacobian with respect to log(r).
+
+    :return: observations x features
+    """
+    r_plus_mu = scale + loc
+    const3 = np.log(scale) + np.ones_like(scale) - np.log(r_plus_mu)
+    if is_sparse(x):
+        # Digamma terms cancel for zero counts.
+        w = scale * (const3 - scale / r_plus_mu)
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        scale_nz = scale[row, col]
+        w[row, col] += scale_nz * (
+            scipy.special.digamma(scale_nz + x_nz) -
+            scipy.special.digamma(scale_nz) -
+            x_nz / r_plus_mu[row, col]
+        )
+    else:
+        scale_plus_x = scale + np.asarray(x)
+        const1 = scipy.special.digamma(scale_plus_x) - scipy.special.digamma(scale)
+        const2 = - scale_plus_x / r_plus_mu
+        w = scale * (const1 + const2 + const3)
+    return w
+
+
+def hessian_weight_bb(x, loc, scale):
+    """
+    Observation-wise weight of the scale-scale hessian block with respect to log(r).
+
+    :return: observations x features
+    """
+    scale_plus_loc = scale + loc
+    const4 = np.log(scale) + np.ones_like(scale) * 2. - np.log(scale_plus_loc)
+    if is_sparse(x):
+        # Digamma and trigamma terms cancel for zero counts.
+        w = scale * (const4 - (loc * scale + 2. * scale * scale_plus_loc) / np.square(scale_plus_loc))
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        scale_nz = scale[row, col]
+        scale_plus_x_nz = scale_nz + x_nz
+        w[row, col] += scale_nz * (
+            scipy.special.digamma(scale_plus_x_nz) +
+            scale_nz * scipy.special.polygamma(n=1, x=scale_plus_x_nz) -
+            scipy.special.digamma(scale_nz) -
+            scale_nz * scipy.special.polygamma(n=1, x=scale_nz) -
+            loc[row, col] * x_nz / np.square(scale_plus_loc[row, col])
+        )
+    else:
+        scale_plus_x = scale + np.asarray(x)
+        const1 = scipy.special.digamma(scale_plus_x) + scale * scipy.special.polygamma(n=1, x=scale_plus_x)
+        const2 = - scipy.special.digamma(scale) - scale * scipy.special.polygamma(n=1, x=scale)
+        const3 = - (loc * scale_plus_x + np.ones_like(scale) * 2. * scale * scale_plus_loc) / \
+            np.square(scale_plus_loc)
+        w = scale * (const1 + const2 + const3 + const4)
+    return w
+
+
+def hessian_weight_aa(x, loc, scale):
+    """
+    Observation-wise weight of the location-location hessian block.
+
+    :return: observations x features
+    """
+    denominator = np.square((loc / scale) + np.ones_like(loc))
+    if is_sparse(x):
+        w = - loc / denominator
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        w[row, col] -= loc[row, col] * x_nz / scale[row, col] / denominator[row, col]
+    else:
+        w = - loc * (np.asarray(x) / scale + np.ones_like(scale)) / denominator
+    return w
+
+
+def hessian_weight_ab(x, loc, scale):
+    """
+    Observation-wise weight of the location-scale hessian block.
+
+    :return: observations x features
+    """
+    loc_scale_by_denominator = loc * scale / np.square(loc + scale)
+    if is_sparse(x):
+        w = - loc * loc_scale_by_denominator
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        w[row, col] += x_nz * loc_scale_by_denominator[row, col]
+    else:
+        w = np.multiply(loc * scale, (np.asarray(x) - loc) / np.square(loc + scale))
+    return w
+
+
+def ll_grouped(x_sum, n, eta_loc, eta_scale, loc, scale):
+    """
+    Terms of the log-likelihood that are linear in the counts, summed over groups of observations with equal
+    location and scale.
+
+    The terms gammaln(r + x), see ll_nonsufficient(), and -log(x!) are omitted.
+
+    :param x_sum: Sum of counts by group (groups x features).
+    :param n: Number of observations by group (groups x 1).
+    :return: groups x features
+    """
+    dtype = accumulation_dtype(loc.dtype)
+    eta_loc, eta_scale, loc, scale = [np.asarray(v).astype(dtype, copy=False) for v in (eta_loc, eta_scale, loc, scale)]
+    log_r_plus_mu = np.log(scale + loc)
+    return x_sum * (eta_loc - log_r_plus_mu) + \
+        n * (_r_log_r_over_r_plus_mu(eta_scale, log_r_plus_mu, loc, scale) - scipy.special.gammaln(scale))
+
+
+def ll_nonsufficient(x, scale):
+    """
+    Term of the log-likelihood by observation that is not a function of sums of counts, gammaln(r + x).
+
+    :return: observations x features
+    """
+    dtype = accumulation_dtype(scale.dtype)
+    return scipy.special.gammaln(np.asarray(scale).astype(dtype, copy=False) + np.asarray(x).astype(dtype, copy=False))
+
+
+def iwls_weights_grouped(x_sum, n, loc, scale):
+    """
+    Location model IWLS weights and weighted working residuals, summed over groups of observations with equal
+    location and scale.
+
+    :param x_sum: Sum of counts by group (groups x features).
+    :param n: Number of observations by group (groups x 1).
+    :return: Tuple (weights, weighted working residuals) (groups x features)
+    """
+    w = - loc * scale / (scale + loc)
+    return n * w, w * (x_sum - n * loc) / loc
@@ -1,18 +1,36 @@
-import dask.array
+import functools
 import logging
 import numpy as np
-import scipy.sparse
-import scipy.special
-import sparse
 
 from .external import Model, ModelIwls, InputDataGLM
 from .processModel import ProcessModel
+from . import kernels
 
 logger = logging.getLogger(__name__)
 
 
+def ll_nb(x, eta_loc, b_var, xh_scale, ll_min):
+    """
+    Log-likelihood of negative binomial data as a function of the scale model parameters.
+
+    The term -log(x!), which only depends on the count data, is omitted.
+    This is defined on module level so that it can be shipped to worker processes without the model.
+
+    :param x: Count data (observations x features).
+    :param eta_loc: Location model linear predictor (observations x features).
+    :param b_var: Scale model parameters (inferred param x features).
+    :param xh_scale: Scale model design matrix with constraints applied (observations x inferred param).
+    :param ll_min: Lower bound of log-likelihood by observation.
+    :return: observations x features
+    """
+    eta_scale = np.matmul(xh_scale, b_var)
+    ll = kernels.ll(x=x, eta_loc=eta_loc, eta_scale=eta_scale, loc=np.exp(eta_loc), scale=np.exp(eta_scale))
+    return np.maximum(ll, ll_min)
+
+
 class ModelIwlsNb(ModelIwls, Model, ProcessModel):
 
+    count_data = True
     compute_mu: bool
     compute_r: bool
 
@@ -49,14 +67,16 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
 
         :return: observations x features
         """
-        return np.asarray(self.x - self.location) / self.location
+        return self._apply_kernel(kernels.ybar, self.x, self.location)
 
     def fim_weight_aa_j(self, j):
         """
 
         :return: observations x features
         """
-        return - self.location_j(j=j) * self.scale_j(j=j) / (self.scale_j(j=j) + self.location_j(j=j))
+        loc = self.location_j(j=j)
+        scale = self.scale_j(j=j)
+        return - loc * scale / (scale + loc)
 
     def ybar_j(self, j) -> np.ndarray:
         """
@@ -66,10 +86,7 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
         # Make sure that dimensionality of sliced array is kept:
         if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
             j = [j]
-        if isinstance(self.x, np.ndarray) or isinstance(self.x, dask.array.core.Array):
-            return (self.x[:, j] - self.location_j(j=j)) / self.location_j(j=j)
-        else:
-            return np.asarray(self.x[:, j] - self.location_j(j=j)) / self.location_j(j=j)
+        return self._apply_kernel(kernels.ybar, self.x_j(j=j), self.location_j(j=j))
 
     @property
     def jac_weight_b(self):
@@ -77,19 +94,7 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
 
         :return: observations x features
         """
-        scale = self.scale
-        loc = self.location
-        if isinstance(self.x, scipy.sparse.csr_matrix):
-            scale_plus_x = np.asarray(scale + self.x)
-        else:
-            scale_plus_x = scale + self.x
-        r_plus_mu = scale + loc
-
-        # Define graphs for individual terms of constant term of hessian:
-        const1 = scipy.special.digamma(scale_plus_x) - scipy.special.digamma(scale)
-        const2 = - scale_plus_x / r_plus_mu
-        const3 = np.log(scale) + np.ones_like(scale) - np.log(r_plus_mu)
-        return scale * (const1 + const2 + const3)
+        return self._apply_kernel(kernels.jac_weight_b, self.x, self.location, self.scale)
 
     def jac_weight_b_j(self, j):
         """
@@ -99,19 +104,7 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
         # Make sure that dimensionality of sliced array is kept:
         if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
             j = [j]
-        scale = self.scale_j(j=j)
-        loc = self.location_j(j=j)
-        if isinstance(self.x, scipy.sparse.csr_matrix):
-            scale_plus_x = np.asarray(scale + self.x[:, j])
-        else:
-            scale_plus_x = scale + self.x[:, j]
-        r_plus_mu = scale + loc
-
-        # Define graphs for individual terms of constant term of hessian:
-        const1 = scipy.special.digamma(scale_plus_x) - scipy.special.digamma(scale)
-        const2 = - scale_plus_x / r_plus_mu
-        const3 = np.log(scale) + np.ones_like(scale) - np.log(r_plus_mu)
-        return scale * (const1 + const2 + const3)
+        return self._apply_kernel(kernels.jac_weight_b, self.x_j(j=j), self.location_j(j=j), self.scale_j(j=j))
 
     @property
     def fim_ab(self) -> np.ndarray:
@@ -127,7 +120,7 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
 
         :return: (features x inferred param x inferred param)
         """
-        return np.zeros([self.b_var.shape[1], 0, 0])
+        return np.zeros([self.b_var.shape[1], self.a_var.shape[0], 0])
 
     @property
     def fim_bb(self) -> np.ndarray:
@@ -147,112 +140,96 @@ class ModelIwlsNb(ModelIwls, Model, ProcessModel):
 
     @property
     def hessian_weight_ab(self):
-        scale = self.scale
-        loc = self.location
-        return np.multiply(
-            loc * scale,
-            np.asarray(self.x - loc) / np.square(loc + scale)
-        )
+        return self._apply_kernel(kernels.hessian_weight_ab, self.x, self.location, self.scale)
 
     @property
     def hessian_weight_aa(self):
-        scale = self.scale
-        loc = self.location
-        if isinstance(self.x, np.ndarray) or isinstance(self.x, dask.array.core.Array):
-            x_by_scale_plus_one = self.x / scale + np.ones_like(scale)
-        else:
-            x_by_scale_plus_one = np.asarray(self.x.divide(scale) + np.ones_like(scale))
-
-        return - loc * x_by_scale_plus_one / np.square((loc / scale) + np.ones_like(loc))
+        return self._apply_kernel(kernels.hessian_weight_aa, self.x, self.location, self.scale)
 
     @property
     def hessian_weight_bb(self):
-        scale = self.scale
-        loc = self.location
-        scale_plus_x = np.asarray(self.x + scale)
-        scale_plus_loc = scale + loc
-        # Define graphs for individual terms of constant term of hessian:
-        const1 = scipy.special.digamma(scale_plus_x) + scale * scipy.special.polygamma(n=1, x=scale_plus_x)
-        const2 = - scipy.special.digamma(scale) + scale * scipy.special.polygamma(n=1, x=scale)
-        const3 = - loc * scale_plus_x + np.ones_like(scale) * 2. * scale * scale_plus_loc / np.square(scale_plus_loc)
-        const4 = np.log(scale) + np.ones_like(scale) * 2. - np.log(scale_plus_loc)
-        return scale * (const1 + const2 + const3 + const4)
+        return self._apply_kernel(kernels.hessian_weight_bb, self.x, self.location, self.scale)
+
+    def _clip_ll(self, ll):
+        # Only bounded from below: The omitted term -log(x!) can make values positive.
+        bounds_min, _ = self.param_bounds(dtype=ll.dtype)
+        return np.maximum(ll, bounds_min["ll"])
+
+    def _ll_inputs(self, j=None):
+        """
+        Location and scale model linear predictors and location and scale used to evaluate the log-likelihood.
+
+        With single precision parameters, these are recomputed in double precision: Rounding of the linear predictors
+        by observation perturbs the log-likelihood of large counts by more than the changes caused by updates close
+        to convergence, which would then not be detected reliably.
+
+        :param j: Features, all features if None.
+        :return: Tuple (eta_loc, eta_scale, location, scale) (observations x features)
+        """
+        dtype = kernels.accumulation_dtype(self.model_vars.dtype)
+        if np.dtype(self.model_vars.dtype) == dtype:
+            if j is None:
+                return self.eta_loc, self.eta_scale, self.location, self.scale
+            return self.eta_loc_j(j=j), self.eta_scale_j(j=j), self.location_j(j=j), self.scale_j(j=j)
+        a = self.a if j is None else self.a[:, j]
+        b = self.b if j is None else self.b[:, j]
+        eta_loc = np.matmul(self.design_loc.astype(dtype), a.astype(dtype))
+        if self.size_factors is not None:
+            eta_loc += self.size_factors.astype(dtype)
+        eta_scale = np.matmul(self.design_scale.astype(dtype), b.astype(dtype))
+        eta_loc = self.np_clip_param(eta_loc, "eta_loc")
+        eta_scale = self.np_clip_param(eta_scale, "eta_scale")
+        return eta_loc, eta_scale, self.inverse_link_loc(eta_loc), self.inverse_link_scale(eta_scale)
 
     @property
     def ll(self):
-        scale = self.scale
-        loc = self.location
-        log_r_plus_mu = np.log(scale + loc)
-        if isinstance(self.x, np.ndarray) or isinstance(self.x, dask.array.core.Array):
-            # dense numpy or dask
-            ll = scipy.special.gammaln(scale + self.x) - \
-                 scipy.special.gammaln(self.x + np.ones_like(scale)) - \
-                 scipy.special.gammaln(scale) + \
-                 self.x * (self.eta_loc - log_r_plus_mu) + \
-                 np.multiply(scale, self.eta_scale - log_r_plus_mu)
-        else:
-            # sparse scipy
-            ll = scipy.special.gammaln(np.asarray(scale + self.x)) - \
-                scipy.special.gammaln(self.x + np.ones_like(scale)) - \
-                scipy.special.gammaln(scale) + \
-                np.asarray(self.x.multiply(self.eta_loc - log_r_plus_mu) +
-                           np.multiply(scale, self.eta_scale - log_r_plus_mu))
-            ll = np.asarray(ll)
-        return self.np_clip_param(ll, "ll")
+        ll = self._apply_kernel(kernels.ll, self.x, *self._ll_inputs())
+        return self._clip_ll(ll)
 
     def ll_j(self, j):
         # Make sure that dimensionality of sliced array is kept:
         if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
             j = [j]
-        scale = self.scale_j(j=j)
-        loc = self.location_j(j=j)
-        log_r_plus_mu = np.log(scale + loc)
-        if isinstance(self.x, np.ndarray) or isinstance(self.x, dask.array.core.Array):
-            # dense numpy or dask
-            ll = scipy.special.gammaln(scale + self.x[:, j]) - \
-                 scipy.special.gammaln(self.x[:, j] + np.ones_like(scale)) - \
-                 scipy.special.gammaln(scale) + \
-                 self.x[:, j] * (self.eta_loc_j(j=j) - log_r_plus_mu) + \
-                 np.multiply(scale, self.eta_scale_j(j=j) - log_r_plus_mu)
-        else:
-            # sparse scipy
-            ll = scipy.special.gammaln(np.asarray(scale + self.x[:, j])) - \
-                 scipy.special.gammaln(self.x + np.ones_like(scale)) - \
-                 scipy.special.gammaln(scale) + \
-                 np.asarray(self.x[:, j].multiply(self.eta_loc_j(j=j) - log_r_plus_mu) +
-                            np.multiply(scale, self.eta_scale_j(j=j) - log_r_plus_mu))
-            ll = np.asarray(ll)
-        return self.np_clip_param(ll, "ll")
+        ll = self._apply_kernel(kernels.ll, self.x_j(j=j), *self._ll_inputs(j=j))
+        return self._clip_ll(ll)
+
+    @property
+    def ll_constant_byfeature(self) -> np.ndarray:
+        return - self.input_data.feature_sum_log_factorial
+
+    def ll_grouped(self, x_sum, group_size, eta_loc, eta_scale) -> np.ndarray:
+        return kernels.ll_grouped(
+            x_sum=x_sum,
+            n=group_size,
+            eta_loc=eta_loc,
+            eta_scale=eta_scale,
+            loc=self.inverse_link_loc(eta_loc),
+            scale=self.inverse_link_scale(eta_scale)
+        )
+
+    def ll_nonsufficient(self, x, eta_scale) -> np.ndarray:
+        return kernels.ll_nonsufficient(x=x, scale=self.inverse_link_scale(eta_scale))
+
+    def iwls_weights_grouped(self, x_sum, group_size, eta_loc, eta_scale):
+        return kernels.iwls_weights_grouped(
+            x_sum=x_sum,
+            n=group_size,
+            loc=self.inverse_link_loc(eta_loc),
+            scale=self.inverse_link_scale(eta_scale)
+        )
 
     def ll_handle(self):
+        bounds_min, _ = self.param_bounds(dtype=self.model_vars.dtype)
+        return functools.partial(ll_nb, ll_min=bounds_min["ll"])
+
+    def jac_b_handle(self):
         def fun(x, eta_loc, b_var, xh_scale):
-            eta_scale = np.matmul(xh_scale, b_var)
-            scale = np.exp(eta_scale)
-            loc = np.exp(eta_loc)
-            log_r_plus_mu = np.log(scale + loc)
-            if isinstance(x, np.ndarray) or isinstance(x, dask.array.core.Array):
-                # dense numpy or dask
-                ll = scipy.special.gammaln(scale + x) - \
-                     scipy.special.gammaln(x + np.ones_like(scale)) - \
-                     scipy.special.gammaln(scale) + \
-                     x * (eta_loc - log_r_plus_mu) + \
-                     np.multiply(scale, eta_scale - log_r_plus_mu)
-            else:
-                raise ValueError("type x %s not supported" % type(x))
-            return self.np_clip_param(ll, "ll")
+            return kernels.jac_weight_b(x=x, loc=np.exp(eta_loc), scale=np.exp(np.matmul(xh_scale, b_var)))
+
         return fun
 
-    def jac_b_handle(self):
+    def hessian_b_handle(self):
         def fun(x, eta_loc, b_var, xh_scale):
-            scale = np.exp(b_var)
-            loc = np.exp(eta_loc)
-            scale_plus_x = scale + x
-            r_plus_mu = scale + loc
-
-            # Define graphs for individual terms of constant term of hessian:
-            const1 = scipy.special.digamma(scale_plus_x) - scipy.special.digamma(scale)
-            const2 = - scale_plus_x / r_plus_mu
-            const3 = np.log(scale) + np.ones_like(scale) - np.log(r_plus_mu)
-            return scale * (const1 + const2 + const3)
+            return kernels.hessian_weight_bb(x=x, loc=np.exp(eta_loc), scale=np.exp(np.matmul(xh_scale, b_var)))
 
         return fun
@@ -2,6 +2,7 @@ import numpy as np
 
 from .external import ProcessModelGlm
 from .external import pkg_constants
+from .kernels import accumulation_dtype
 
 
 class ProcessModel(ProcessModelGlm):
@@ -13,18 +14,26 @@ class ProcessModel(ProcessModelGlm):
         dtype = np.dtype(dtype)
         dmin = np.finfo(dtype).min
         dmax = np.finfo(dtype).max
+        # Log-likelihoods are evaluated in double precision also if parameters are single precision:
+        ll_min = np.log(np.nextafter(0, np.inf, dtype=accumulation_dtype(dtype)))
+        # Lower bounds of single precision quantities are kept out of the subnormal range, in which elementwise
+        # arithmetic is slow and inaccurate:
+        if dtype.itemsize < 8:
+            dmin_positive = np.finfo(dtype).tiny
+        else:
+            dmin_positive = np.nextafter(0, np.inf, dtype=dtype)
         dtype = dtype.type
 
         sf = dtype(pkg_constants.ACCURACY_MARGIN_RELATIVE_TO_LIMIT)
         bounds_min = {
-            "a_var": np.log(np.nextafter(0, np.inf, dtype=dtype)) / sf,
-            "b_var": np.log(np.nextafter(0, np.inf, dtype=dtype)) / sf,
-            "eta_loc": np.log(np.nextafter(0, np.inf, dtype=dtype)) / sf,
-            "eta_scale": np.log(np.nextafter(0, np.inf, dtype=dtype)) / sf,
-            "loc": np.nextafter(0, np.inf, dtype=dtype),
-            "scale": np.nextafter(0, np.inf, dtype=dtype),
+            "a_var": np.log(dmin_positive) / sf,
+            "b_var": np.log(dmin_positive) / sf,
+            "eta_loc": np.log(dmin_positive) / sf,
+            "eta_scale": np.log(dmin_positive) / sf,
+            "loc": dmin_positive,
+            "scale": dmin_positive,
             "likelihood": dtype(0),
-            "ll": np.log(np.nextafter(0, np.inf, dtype=dtype)),
+            "ll": ll_min,
         }
         bounds_max = {
             "a_var": np.nextafter(np.log(dmax), -np.inf, dtype=dtype) / sf,
@@ -0,0 +1,11 @@
+import batchglm.data as data_utils
+
+from batchglm.models.glm_norm import _EstimatorGLM, InputDataGLM, Model
+from batchglm.models.glm_norm.utils import init_par, param_bounds
+
+from batchglm.utils.linalg import batched_xtwx
+from batchglm import pkg_constants
+
+# import necessary base_glm layers
+from batchglm.train.numpy.base_glm import EstimatorGlm, ModelIwls, ModelVarsGlm, ProcessModelGlm
+from batchglm.train.numpy.base_glm.kernels import is_sparse, accumulation_dtype, _nonzeros
@@ -0,0 +1,78 @@
+"""
+Observation-wise quantities of the normal model with identity link for the mean and log link for the standard
+deviation.
+
+All kernels operate on blocks of data x (observations x features) that are either dense numpy arrays or
+scipy.sparse matrices, together with dense location and scale arrays of the same shape.
+For sparse data, each quantity is evaluated in closed form for zero entries on all cells first and is then
+corrected on the stored nonzero entries only, so that sparse data are never densified, see base_glm.kernels.
+
+Log-likelihoods are evaluated and returned in at least double precision, see accumulation_dtype().
+"""
+import numpy as np
+
+from .external import is_sparse, accumulation_dtype, _nonzeros
+
+
+def ll(x, eta_scale, loc, scale):
+    """
+    Log-likelihood by observation without the constant -log(2 pi) / 2, not clipped.
+
+    :return: observations x features
+    """
+    dtype = accumulation_dtype(loc.dtype)
+    eta_scale, loc, scale = [np.asarray(v).astype(dtype, copy=False) for v in (eta_scale, loc, scale)]
+    if is_sparse(x):
+        # Zero entries: squared residual reduces to mu^2.
+        ll = - eta_scale - 0.5 * np.square(loc / scale)
+        row, col, x_nz = _nonzeros(x, dtype=ll.dtype)
+        ll[row, col] -= 0.5 * x_nz * (x_nz - 2. * loc[row, col]) / np.square(scale[row, col])
+    else:
+        x = np.asarray(x).astype(dtype, copy=False)
+        ll = - eta_scale - 0.5 * np.square((x - loc) / scale)
+    return ll
+
+
+def residual(x, loc):
+    """
+    Residual x - mu.
+
+    :return: observations x features
+    """
+    if is_sparse(x):
+        residual = - np.array(loc, copy=True)
+        row, col, x_nz = _nonzeros(x, dtype=residual.dtype)
+        residual[row, col] += x_nz
+    else:
+        residual = np.asarray(x) - loc
+    return residual
+
+
+def jac_weight_b(x, loc, scale):
+    """
+    Observation-wise weight of the scale model jacobian with respect to log(sd), ((x - mu) / sd)^2 - 1.
+
+    :return: observations x features
+    """
+    if is_sparse(x):
+        w = np.square(loc / scale) - 1.
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        w[row, col] += x_nz * (x_nz - 2. * loc[row, col]) / np.square(scale[row, col])
+    else:
+        w = np.square((np.asarray(x) - loc) / scale) - 1.
+    return w
+
+
+def hessian_weight_bb(x, loc, scale):
+    """
+    Observation-wise weight of the scale-scale hessian block with respect to log(sd), -2 ((x - mu) / sd)^2.
+
+    :return: observations x features
+    """
+    if is_sparse(x):
+        w = - 2. * np.square(loc / scale)
+        row, col, x_nz = _nonzeros(x, dtype=w.dtype)
+        w[row, col] -= 2. * x_nz * (x_nz - 2. * loc[row, col]) / np.square(scale[row, col])
+    else:
+        w = - 2. * np.square((np.asarray(x) - loc) / scale)
+    return w
@@ -0,0 +1,195 @@
+import functools
+import logging
+import numpy as np
+
+from .external import Model, ModelIwls, InputDataGLM
+from .external import batched_xtwx
+from .processModel import ProcessModel
+from . import kernels
+
+logger = logging.getLogger(__name__)
+
+
+def ll_norm(x, eta_loc, b_var, xh_scale, ll_min):
+    """
+    Log-likelihood of normal data as a function of the scale model parameters.
+
+    The constant -log(2 pi) / 2 is omitted.
+    This is defined on module level so that it can be shipped to worker processes without the model.
+
+    :param x: Data (observations x features).
+    :param eta_loc: Location model linear predictor, which is the mean (observations x features).
+    :param b_var: Scale model parameters (inferred param x features).
+    :param xh_scale: Scale model design matrix with constraints applied (observations x inferred param).
+    :param ll_min: Lower bound of log-likelihood by observation.
+    :return: observations x features
+    """
+    eta_scale = np.matmul(xh_scale, b_var)
+    ll = kernels.ll(x=x, eta_scale=eta_scale, loc=eta_loc, scale=np.exp(eta_scale))
+    return np.maximum(ll, ll_min)
+
+
+class ModelIwlsNorm(ModelIwls, Model, ProcessModel):
+    """
+    Normal model with identity link for the mean and log link for the standard deviation.
+
+    The location model is linear given the scale model, so that one IWLS step is the exact weighted least squares
+    solution. Size factors scale the mean, mu = size factor * (X a), and enter the weights and working residuals
+    of the location model accordingly.
+    """
+
+    def __init__(
+            self,
+            input_data: InputDataGLM,
+            model_vars,
+            dtype,
+    ):
+        super(Model, self).__init__(
+            input_data=input_data
+        )
+        ModelIwls.__init__(
+            self=self,
+            model_vars=model_vars
+        )
+
+    def _weight_aa(self, scale):
+        w = - 1. / np.square(scale)
+        if self.size_factors is not None:
+            w = w * np.square(self.size_factors)
+        return w
+
+    def _ybar(self, residual):
+        if self.size_factors is not None:
+            residual = residual / self.size_factors
+        return residual
+
+    @property
+    def fim_weight_aa(self):
+        """
+
+        :return: observations x features
+        """
+        return self._weight_aa(self.scale)
+
+    @property
+    def ybar(self) -> np.ndarray:
+        """
+
+        :return: observations x features
+        """
+        return self._ybar(self._apply_kernel(kernels.residual, self.x, self.location))
+
+    def fim_weight_aa_j(self, j):
+        """
+
+        :return: observations x features
+        """
+        return self._weight_aa(self.scale_j(j=j))
+
+    def ybar_j(self, j) -> np.ndarray:
+        """
+
+        :return: observations x features
+        """
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._ybar(self._apply_kernel(kernels.residual, self.x_j(j=j), self.location_j(j=j)))
+
+    @property
+    def jac_weight_b(self):
+        """
+
+        :return: observations x features
+        """
+        return self._apply_kernel(kernels.jac_weight_b, self.x, self.location, self.scale)
+
+    def jac_weight_b_j(self, j):
+        """
+
+        :return: observations x features
+        """
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        return self._apply_kernel(kernels.jac_weight_b, self.x_j(j=j), self.location_j(j=j), self.scale_j(j=j))
+
+    @property
+    def fim_ab(self) -> np.ndarray:
+        """
+        Location-scale coefficient block of FIM
+
+        The expected location-scale hessian block is zero for the normal model.
+
+        :return: (features x inferred param x inferred param)
+        """
+        return np.zeros([self.b_var.shape[1], self.a_var.shape[0], self.b_var.shape[0]])
+
+    @property
+    def fim_bb(self) -> np.ndarray:
+        """
+        Scale-scale coefficient block of FIM
+
+        :return: (features x inferred param x inferred param)
+        """
+        w = - 2. * np.ones_like(self.scale)
+        xh = np.matmul(self.design_scale, self.constraints_scale)
+        return batched_xtwx(xh_a=xh, w=w)
+
+    @property
+    def hessian_weight_ab(self):
+        residual = self._apply_kernel(kernels.residual, self.x, self.location)
+        w = - 2. * residual / np.square(self.scale)
+        if self.size_factors is not None:
+            w = w * self.size_factors
+        return w
+
+    @property
+    def hessian_weight_aa(self):
+        return self.fim_weight_aa
+
+    @property
+    def hessian_weight_bb(self):
+        return self._apply_kernel(kernels.hessian_weight_bb, self.x, self.location, self.scale)
+
+    def _clip_ll(self, ll):
+        bounds_min, _ = self.param_bounds(dtype=ll.dtype)
+        return np.maximum(ll, bounds_min["ll"])
+
+    @property
+    def ll(self):
+        ll = self._apply_kernel(kernels.ll, self.x, self.eta_scale, self.location, self.scale)
+        return self._clip_ll(ll)
+
+    def ll_j(self, j):
+        # Make sure that dimensionality of sliced array is kept:
+        if isinstance(j, int) or isinstance(j, np.int32) or isinstance(j, np.int64):
+            j = [j]
+        ll = self._apply_kernel(
+            kernels.ll,
+            self.x_j(j=j),
+            self.eta_scale_j(j=j),
+            self.location_j(j=j),
+            self.scale_j(j=j)
+        )
+        return self._clip_ll(ll)
+
+    @property
+    def ll_constant_byfeature(self) -> np.ndarray:
+        return np.full([self.model_vars.n_features], - 0.5 * np.log(2. * np.pi) * self.input_data.num_observations)
+
+    def ll_handle(self):
+        bounds_min, _ = self.param_bounds(dtype=self.model_vars.dtype)
+        return functools.partial(ll_norm, ll_min=bounds_min["ll"])
+
+    def jac_b_handle(self):
+        def fun(x, eta_loc, b_var, xh_scale):
+            return kernels.jac_weight_b(x=x, loc=eta_loc, scale=np.exp(np.matmul(xh_scale, b_var)))
+
+        return fun
+
+    def hessian_b_handle(self):
+        def fun(x, eta_loc, b_var, xh_scale):
+            return kernels.hessian_weight_bb(x=x, loc=eta_loc, scale=np.exp(np.matmul(xh_scale, b_var)))
+
+        return fun
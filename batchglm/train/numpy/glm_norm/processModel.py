@@ -0,0 +1,11 @@
+from .external import ProcessModelGlm
+from .external import param_bounds
+
+
+class ProcessModel(ProcessModelGlm):
+
+    def param_bounds(
+            self,
+            dtype
+    ):
+        return param_bounds(dtype=dtype)
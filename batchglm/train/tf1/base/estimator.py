@@ -8,6 +8,7 @@ import time
 from typing import Dict, Any, Union, Iterable
 
 from .external import _EstimatorBase, pkg_constants
+from .external import PhaseTimer, iteration_record
 
 logger = logging.getLogger("batchglm")
 
@@ -113,6 +114,7 @@ class _TFEstimator(metaclass=abc.ABCMeta):
             require_hessian=False,
             require_fim=False,
             is_batched=False,
+            callbacks: list = None,
             **kwargs
     ):
         """
@@ -132,6 +134,13 @@ class _TFEstimator(metaclass=abc.ABCMeta):
             See parameter `convergence_criteria` for exact meaning
         :param loss_window_size: specifies `N` in `convergence_criteria`.
         :param train_op: uses this training operation if specified
+        :param callbacks: Functions that are called with a telemetry record after each iteration, see
+            batchglm.utils.telemetry.iteration_record() and TrainingRecorder. In addition to the common fields,
+            records of this estimator contain the loss "ll", the number of features that were not converged
+            before the iteration "n_active", the number of features whose update was accepted "n_updated" and
+            rejected "n_reverted" and the fraction of converged features "converged".
+            Times are recorded for the phases "reduction" (reduction of data into the model), "solve"
+            (computation of the trial update), "update" (trust region acceptance step) and "likelihood".
         """
         # Set default values:
         if stopping_criteria is None:
@@ -170,6 +179,14 @@ class _TFEstimator(metaclass=abc.ABCMeta):
         # Set all to convergence status to False, this is need if multiple training strategies are run:
         converged_current = np.repeat(False, repeats=self.model.model_vars.converged.shape[0])
         train_step = 0
+        # Continue from the state of an interrupted call that was saved in a checkpoint, see resume_sequence():
+        resume_state = self._pop_resume_state()
+        if resume_state is not None:
+            converged_current = resume_state["converged"].astype(bool)
+            train_step = resume_state["iteration"]
+            self.session.run((self.model.model_vars.convergence_update), feed_dict={
+                self.model.model_vars.convergence_status: converged_current
+            })
 
         def convergence_decision(convergence_status, step_counter):
             if convergence_criteria == "step":
@@ -179,58 +196,67 @@ class _TFEstimator(metaclass=abc.ABCMeta):
             else:
                 raise ValueError("convergence_criteria %s not recognized." % convergence_criteria)
 
+        timer = PhaseTimer()
         while convergence_decision(converged_current, train_step):
             t0 = time.time()
+            t0_cpu = time.process_time()
+            timer.reset()
             converged_prev = converged_current.copy()
             ll_prev = ll_current.copy()
 
             ## Run update.
             t_a = time.time()
-            if is_batched:
-                _ = self.session.run(self.model.batched_data_model.train_set)
-            else:
-                _ = self.session.run(self.model.full_data_model.train_set)
+            with timer.phase("reduction"):
+                if is_batched:
+                    _ = self.session.run(self.model.batched_data_model.train_set)
+                else:
+                    _ = self.session.run(self.model.full_data_model.train_set)
 
             if trustregion_mode:
                 t_b = time.time()
-                _, x_step = self.session.run(
-                    (train_op["train"]["trial_op"],
-                     train_op["update"]),
-                    feed_dict=feed_dict
-                )
+                with timer.phase("solve"):
+                    _, x_step = self.session.run(
+                        (train_op["train"]["trial_op"],
+                         train_op["update"]),
+                        feed_dict=feed_dict
+                    )
                 t_c = time.time()
-                _ = self.session.run(self.model.full_data_model.eval0_set)
+                with timer.phase("likelihood"):
+                    _ = self.session.run(self.model.full_data_model.eval0_set)
                 t_d = time.time()
-                train_step, _, features_updated = self.session.run(
-                    (self.model.global_step,
-                     train_op["train"]["update_op"],
-                     self.model.model_vars.updated),
-                    feed_dict=feed_dict
-                )
+                with timer.phase("update"):
+                    train_step, _, features_updated = self.session.run(
+                        (self.model.global_step,
+                         train_op["train"]["update_op"],
+                         self.model.model_vars.updated),
+                        feed_dict=feed_dict
+                    )
                 t_e = time.time()
             else:
                 t_b = time.time()
-                train_step, _, x_step, features_updated = self.session.run(
-                    (self.model.global_step,
-                     train_op["train"],
-                     train_op["update"],
-                     self.model.model_vars.updated),
-                    feed_dict=feed_dict
-                )
+                with timer.phase("solve"):
+                    train_step, _, x_step, features_updated = self.session.run(
+                        (self.model.global_step,
+                         train_op["train"],
+                         train_op["update"],
+                         self.model.model_vars.updated),
+                        feed_dict=feed_dict
+                    )
                 t_c = time.time()
 
-            if pkg_constants.EVAL_ON_BATCHED and is_batched:
-                _ = self.session.run(self.model.batched_data_model.eval_set)
-                ll_current, jac_train = self.session.run(
-                    (self.model.batched_data_model.norm_neg_log_likelihood,
-                     self.model.batched_data_model.neg_jac_train_eval)
-                )
-            else:
-                _ = self.session.run(self.model.full_data_model.eval1_set)
-                ll_current, jac_train = self.session.run(
-                    (self.model.full_data_model.norm_neg_log_likelihood_eval1,
-                     self.model.full_data_model.neg_jac_train_eval)
-                )
+            with timer.phase("likelihood"):
+                if pkg_constants.EVAL_ON_BATCHED and is_batched:
+                    _ = self.session.run(self.model.batched_data_model.eval_set)
+                    ll_current, jac_train = self.session.run(
+                        (self.model.batched_data_model.norm_neg_log_likelihood,
+                         self.model.batched_data_model.neg_jac_train_eval)
+                    )
+                else:
+                    _ = self.session.run(self.model.full_data_model.eval1_set)
+                    ll_current, jac_train = self.session.run(
+                        (self.model.full_data_model.norm_neg_log_likelihood_eval1,
+                         self.model.full_data_model.neg_jac_train_eval)
+                    )
             t_f = time.time()
 
             if trustregion_mode:
@@ -340,3 +366,22 @@ class _TFEstimator(metaclass=abc.ABCMeta):
                 np.sum(np.logical_and(np.logical_not(converged_prev), features_updated)).astype("int32"),
                 np.sum(converged_f), np.sum(converged_g), np.sum(converged_x)
             )
+            if callbacks is not None:
+                record = iteration_record(
+                    iteration=train_step,
+                    timer=timer,
+                    time_wall=time.time() - t0,
+                    time_cpu=time.process_time() - t0_cpu,
+                    ll=np.sum(ll_current),
+                    n_active=np.sum(np.logical_not(converged_prev)),
+                    n_updated=np.sum(np.logical_and(np.logical_not(converged_prev), features_updated)),
+                    n_reverted=np.sum(np.logical_and(np.logical_not(converged_prev), np.logical_not(features_updated))),
+                    converged=np.mean(converged_current)
+                )
+                for callback in callbacks:
+                    callback(record)
+            if self._checkpoint_due(iteration=train_step):
+                self._write_checkpoint(train_state={
+                    "iteration": train_step,
+                    "converged": converged_current
+                })
@@ -1,2 +1,3 @@
 from batchglm.models.base import _EstimatorBase
+from batchglm.utils.telemetry import PhaseTimer, iteration_record
 from batchglm import pkg_constants
@@ -317,6 +317,43 @@ class TFEstimatorGLM(_TFEstimator, _EstimatorGLM, metaclass=abc.ABCMeta):
                 **kwargs
             )
 
+    def _checkpoint_state(self) -> dict:
+        # Trust region radii are kept so that trust region optimizers do not restart from the initial radius.
+        params, global_step, nr_tr_radius, irls_tr_radius = self.session.run((
+            self.model.model_vars.params,
+            self.model.global_step,
+            self.model.nr_tr_radius,
+            self.model.irls_tr_radius
+        ))
+        return {
+            "a_var": params[self.model.model_vars.idx_train_loc],
+            "b_var": params[self.model.model_vars.idx_train_scale],
+            "global_step": global_step,
+            "nr_tr_radius": nr_tr_radius,
+            "irls_tr_radius": irls_tr_radius,
+            "train_loc": self._train_loc,
+            "train_scale": self._train_scale
+        }
+
+    def _restore_checkpoint(self, checkpoint: dict):
+        """
+        Load parameters, step counter and trust region radii into the variables of the current session.
+
+        The session has to be set up with initialize() first.
+        """
+        if bool(checkpoint["train_loc"]) != self._train_loc or bool(checkpoint["train_scale"]) != self._train_scale:
+            logging.getLogger("batchglm").warning(
+                "checkpoint was written by an estimator that trained location model: %s, scale model: %s" %
+                (str(bool(checkpoint["train_loc"])), str(bool(checkpoint["train_scale"])))
+            )
+        self.model.model_vars.params.load(
+            np.concatenate([checkpoint["a_var"], checkpoint["b_var"]], axis=0),
+            self.session
+        )
+        self.model.global_step.load(checkpoint["global_step"], self.session)
+        self.model.nr_tr_radius.load(checkpoint["nr_tr_radius"], self.session)
+        self.model.irls_tr_radius.load(checkpoint["irls_tr_radius"], self.session)
+
     def finalize(self):
         """
         Evaluate all tensors that need to be exported from session and save these as class attributes
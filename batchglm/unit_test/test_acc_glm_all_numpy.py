@@ -1,6 +1,10 @@
+import io
 import logging
 import numpy as np
+import os
+import patsy
 import scipy.sparse
+import tempfile
 import unittest
 
 import batchglm.api as glm
@@ -17,13 +21,22 @@ class _TestAccuracyGlmAllEstim:
             quick_scale,
             noise_model,
             sparse,
-            init_mode
+            init_mode,
+            training_strategy="DEFAULT",
+            train_args=None,
+            chunk_size_cells=int(1e9),
+            dtype="float64",
+            sparse_csc=False
     ):
         if noise_model is None:
             raise ValueError("noise_model is None")
         else:
             if noise_model == "nb":
                 from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+            elif noise_model == "norm":
+                from batchglm.api.models.numpy.glm_norm import Estimator, InputDataGLM
+            elif noise_model == "beta":
+                from batchglm.api.models.numpy.glm_beta import Estimator, InputDataGLM
             else:
                 raise ValueError("noise_model not recognized")
 
@@ -37,8 +50,10 @@ class _TestAccuracyGlmAllEstim:
                 constraints_loc=simulator.input_data.constraints_loc,
                 constraints_scale=simulator.input_data.constraints_scale,
                 size_factors=simulator.input_data.size_factors,
-                chunk_size_cells=int(1e9),
-                chunk_size_genes=2
+                chunk_size_cells=chunk_size_cells,
+                chunk_size_genes=2,
+                cast_dtype=dtype,
+                sparse_csc=sparse_csc
             )
         else:
             input_data = InputDataGLM(
@@ -50,23 +65,27 @@ class _TestAccuracyGlmAllEstim:
                 constraints_loc=simulator.input_data.constraints_loc,
                 constraints_scale=simulator.input_data.constraints_scale,
                 size_factors=simulator.input_data.size_factors,
-                chunk_size_cells=int(1e9),
-                chunk_size_genes=2
+                chunk_size_cells=chunk_size_cells,
+                chunk_size_genes=2,
+                cast_dtype=dtype
             )
 
         self.estimator = Estimator(
             input_data=input_data,
             quick_scale=quick_scale,
             init_a=init_mode,
-            init_b=init_mode
+            init_b=init_mode,
+            dtype=dtype
         )
         self.sim = simulator
+        self.training_strategy = training_strategy
+        self.train_args = dict(train_args) if train_args is not None else {}
 
     def estimate(
             self
     ):
         self.estimator.initialize()
-        self.estimator.train_sequence(training_strategy="DEFAULT")
+        self.estimator.train_sequence(training_strategy=self.training_strategy, **self.train_args)
 
     def eval_estimation(
             self,
@@ -133,6 +152,14 @@ class _TestAccuracyGlmAll(
     """
     noise_model: str
     optims_tested: dict
+    training_strategy: str = "DEFAULT"
+    train_args: dict = None
+    chunk_size_cells: int = int(1e9)
+    dtype: str = "float64"
+    intercept_scale: bool = True
+    init_mode: str = "standard"
+    sparse_csc: bool = False
+    continuous_covariate: bool = False
 
     def simulate(self):
         self.simulate1()
@@ -145,7 +172,7 @@ class _TestAccuracyGlmAll(
             if self.noise_model == "nb":
                 from batchglm.api.models.numpy.glm_nb import Simulator
             elif self.noise_model == "norm":
-                from batchglm.api.models import Simulator
+                from batchglm.api.models.numpy.glm_norm import Simulator
             elif self.noise_model == "beta":
                 from batchglm.api.models.numpy.glm_beta import Simulator
             else:
@@ -153,15 +180,27 @@ class _TestAccuracyGlmAll(
 
         return Simulator(num_observations=1000, num_features=10)
 
+    def _add_covariate(self, sim):
+        """
+        Appends a continuous covariate to the location model design of a simulator if continuous_covariate is set.
+        """
+        if not self.continuous_covariate:
+            return
+        sim.sample_description["covariate"] = np.random.uniform(-1, 1, [sim.nobs])
+        sim.sim_design_loc = patsy.dmatrix("~1+condition+batch+covariate", sim.sample_description)
+        if not self.intercept_scale:
+            sim.sim_design_scale = sim.sim_design_loc
+
     def simulate1(self):
         self.sim1 = self.get_simulator()
-        self.sim1.generate_sample_description(num_batches=2, num_conditions=2, intercept_scale=True)
+        self.sim1.generate_sample_description(num_batches=2, num_conditions=2, intercept_scale=self.intercept_scale)
+        self._add_covariate(self.sim1)
 
         def rand_fn_ave(shape):
             if self.noise_model in ["nb", "norm"]:
                 theta = np.random.uniform(10, 1000, shape)
             elif self.noise_model in ["beta"]:
-                theta = np.random.uniform(0.1, 0.7, shape)
+                theta = np.random.uniform(0.1, 0.3, shape)
             else:
                 raise ValueError("noise model not recognized")
             return theta
@@ -170,7 +209,7 @@ class _TestAccuracyGlmAll(
             if self.noise_model in ["nb", "norm"]:
                 theta = np.random.uniform(1, 3, shape)
             elif self.noise_model in ["beta"]:
-                theta = np.random.uniform(0, 0.15, shape)
+                theta = np.random.uniform(0.5, 1.5, shape)
             else:
                 raise ValueError("noise model not recognized")
             return theta
@@ -181,7 +220,7 @@ class _TestAccuracyGlmAll(
             elif self.noise_model in ["norm"]:
                 theta = np.random.uniform(1, 3, shape)
             elif self.noise_model in ["beta"]:
-                theta = np.random.uniform(0, 0.15, shape)
+                theta = np.random.uniform(1, 3, shape)
             else:
                 raise ValueError("noise model not recognized")
             return theta
@@ -195,7 +234,8 @@ class _TestAccuracyGlmAll(
 
     def simulate2(self):
         self.sim2 = self.get_simulator()
-        self.sim2.generate_sample_description(num_batches=0, num_conditions=2, intercept_scale=True)
+        self.sim2.generate_sample_description(num_batches=0, num_conditions=2, intercept_scale=self.intercept_scale)
+        self._add_covariate(self.sim2)
 
         def rand_fn_ave(shape):
             if self.noise_model in ["nb", "norm"]:
@@ -221,7 +261,7 @@ class _TestAccuracyGlmAll(
             elif self.noise_model in ["norm"]:
                 theta = np.ones(shape)
             elif self.noise_model in ["beta"]:
-                theta = np.ones(shape) - 0.8
+                theta = np.ones(shape)
             else:
                 raise ValueError("noise model not recognized")
             return theta
@@ -251,7 +291,7 @@ class _TestAccuracyGlmAll(
             "beta": ["IRLS"],
             "norm": ["IRLS"]
         }
-        init_mode = "standard"
+        init_mode = self.init_mode
 
         for algo in self.optims_tested[self.noise_model]:
             logger.info("algorithm: %s" % algo)
@@ -268,7 +308,12 @@ class _TestAccuracyGlmAll(
                 quick_scale=False if train_scale else True,
                 noise_model=self.noise_model,
                 sparse=sparse,
-                init_mode=init_mode
+                init_mode=init_mode,
+                training_strategy=self.training_strategy,
+                train_args=self.train_args,
+                chunk_size_cells=self.chunk_size_cells,
+                dtype=self.dtype,
+                sparse_csc=self.sparse_csc
             )
             estimator.estimate()
             estimator.estimator.finalize()
@@ -328,6 +373,25 @@ class _TestAccuracyGlmAll(
             sparse=sparse
         )
 
+    def _initialized_estimator(self, sparse):
+        """
+        Initialized estimator of location and scale model on the first simulated data set with the settings of
+        this test.
+        """
+        estimator = _TestAccuracyGlmAllEstim(
+            simulator=self.sim1,
+            quick_scale=False,
+            noise_model=self.noise_model,
+            sparse=sparse,
+            init_mode=self.init_mode,
+            training_strategy=self.training_strategy,
+            chunk_size_cells=self.chunk_size_cells,
+            dtype=self.dtype,
+            sparse_csc=self.sparse_csc
+        ).estimator
+        estimator.initialize()
+        return estimator
+
     def _test_full(self, sparse):
         self._test_full_a_and_b(sparse=sparse)
         self._test_full_a_only(sparse=sparse)
@@ -357,6 +421,617 @@ class TestAccuracyGlmNb(
         self._test_full(sparse=False)
         self._test_full(sparse=True)
 
+    def test_full_nb_newton(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_newton()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.training_strategy = "NEWTON"
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+
+    def test_full_nb_active_set(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_active_set()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.train_args = {"active_set_threshold": 0.95}
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+        for sparse in [False, True]:
+            estimator = self._initialized_estimator(sparse=sparse)
+            working_sets = []
+            parameters = []
+
+            def record_working_set(record):
+                # Parameters of all features, features outside of the working set are held by the full model:
+                idx = np.arange(estimator.model.model_vars.n_features) if estimator._idx_active is None \
+                    else estimator._idx_active
+                a_var = estimator.model.a_var if estimator._idx_active is None else estimator._model_full.a_var
+                b_var = estimator.model.b_var if estimator._idx_active is None else estimator._model_full.b_var
+                a_var = np.array(a_var)
+                b_var = np.array(b_var)
+                a_var[:, idx] = estimator.model.a_var
+                b_var[:, idx] = estimator.model.b_var
+                assert record["n_working_set"] == len(idx)
+                working_sets.append(idx.copy())
+                parameters.append((a_var, b_var))
+
+            estimator.train_sequence(
+                training_strategy="DEFAULT",
+                active_set_threshold=0.95,
+                callbacks=[record_working_set]
+            )
+            # The working set shrinks to non-converged features and features never re-enter it:
+            n_features = self.sim1.input_data.num_features
+            assert len(working_sets[-1]) < n_features
+            for working_set_prev, working_set in zip(working_sets[:-1], working_sets[1:]):
+                assert np.all(np.isin(working_set, working_set_prev))
+            # Parameters of features outside of the working set are frozen:
+            for working_set, (a_var, b_var) in zip(working_sets, parameters):
+                idx_frozen = np.setdiff1d(np.arange(n_features), working_set)
+                assert np.all(a_var[:, idx_frozen] == estimator.model.a_var[:, idx_frozen])
+                assert np.all(b_var[:, idx_frozen] == estimator.model.b_var[:, idx_frozen])
+
+    def test_full_nb_count_histogram(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_count_histogram()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.train_args = {"count_histogram": True}
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+        x = np.asarray(self.sim1.input_data.x)
+        n_obs, n_features = x.shape
+        for sparse in [False, True]:
+            estimator = self._initialized_estimator(sparse=sparse)
+            histogram = estimator._init_histogram()
+            # Entries are unique combinations of count and group, weighted by their number of observations:
+            assert np.sum(histogram.n_entries) < n_obs * n_features
+            for j in range(n_features):
+                value, group, weight = histogram.entries(j)
+                assert len(np.unique(np.stack([value, group]), axis=1).T) == len(value)
+                assert np.all(np.bincount(group, weights=weight, minlength=histogram.n_groups) == histogram.group_size)
+                assert np.abs(np.sum(weight * value) - np.sum(x[:, j])) < 1e-6
+            # Scale model updates on histograms reach the same likelihood as updates on all observations:
+            idx = np.arange(n_features)
+            b_var = estimator.model.b_var.copy()
+            for method in ["brent", "newton"]:
+                steps = []
+                lls = []
+                for use_histogram in [False, True]:
+                    estimator._use_histogram = use_histogram
+                    estimator._histogram = histogram if use_histogram else None
+                    steps.append(estimator.b_step(
+                        idx_update=idx,
+                        method=method,
+                        ftol=1e-8,
+                        lr=None,
+                        max_iter=1000,
+                        nproc=1
+                    ))
+                    estimator._use_histogram = False
+                    estimator.model.b_var = b_var + steps[-1]
+                    lls.append(estimator._ll_byfeature_j(j=idx))
+                    estimator.model.b_var = b_var
+                assert np.max(np.abs(steps[1] - steps[0])) < 1e-5, method
+                assert np.max(np.abs(lls[1] - lls[0]) / np.abs(lls[0])) < 1e-10, method
+
+    def test_full_nb_grouped_statistics(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_grouped_statistics()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.train_args = {"grouped_statistics": True}
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+        design = np.hstack([
+            np.asarray(self.sim1.input_data.design_loc),
+            np.asarray(self.sim1.input_data.design_scale)
+        ])
+        for sparse in [False, True]:
+            estimator = self._initialized_estimator(sparse=sparse)
+            histogram = estimator._init_histogram()
+            # Groups are the unique rows of the design matrices:
+            assert histogram.n_groups == len(np.unique(design, axis=0))
+            # Likelihoods and location model updates on grouped statistics equal those on all observations:
+            idx = np.arange(self.sim1.input_data.num_features)
+            estimator.model.a_var = estimator.model.a_var + np.random.uniform(-0.1, 0.1, estimator.model.a_var.shape)
+            estimator.model.b_var = estimator.model.b_var + np.random.uniform(-0.1, 0.1, estimator.model.b_var.shape)
+            lls = []
+            steps = []
+            for use_grouped in [False, True]:
+                estimator._use_grouped = use_grouped
+                estimator._use_histogram = use_grouped
+                estimator._histogram = histogram if use_grouped else None
+                lls.append(estimator._ll_byfeature_j(j=idx))
+                steps.append(estimator.iwls_step(idx_update=idx))
+            assert np.max(np.abs(lls[1] - lls[0]) / np.abs(lls[0])) < 1e-10
+            assert np.max(np.abs(steps[1] - steps[0])) < 1e-8
+
+    def test_full_nb_stream_observations(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_stream_observations()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.train_args = {"stream_observations": True}
+        self.chunk_size_cells = 300
+        self.simulate()
+        self._test_full(sparse=False)
+        import dask.array
+        for sparse in [False, True]:
+            estimator = self._initialized_estimator(sparse=sparse)
+            assert isinstance(estimator.x, dask.array.core.Array)
+            # Chunks of observations are loaded into memory one at a time:
+            estimator._stream_observations = True
+            n_obs = []
+            for model in estimator._observation_chunks():
+                assert not isinstance(model.input_data.x, dask.array.core.Array)
+                n_obs.append(model.input_data.num_observations)
+            assert n_obs == [300, 300, 300, 100]
+            # Sums over chunks equal sums over all observations:
+            idx = np.arange(self.sim1.input_data.num_features)
+            lls = []
+            steps = []
+            hessians = []
+            for stream_observations in [False, True]:
+                estimator._stream_observations = stream_observations
+                lls.append(estimator._ll_byfeature_j(j=idx))
+                steps.append(estimator.iwls_step(idx_update=idx))
+                estimator.finalize()
+                hessians.append(estimator.hessian)
+            assert np.max(np.abs(lls[1] - lls[0]) / np.abs(lls[0])) < 1e-12
+            assert np.max(np.abs(steps[1] - steps[0])) < 1e-10
+            assert np.max(np.abs(hessians[1] - hessians[0]) / np.abs(hessians[0])) < 1e-10
+
+    def test_full_nb_checkpoint(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_checkpoint()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.train_args = {"checkpoint_path": os.path.join(tmp_dir, "checkpoint.npz"), "checkpoint_every": 2}
+            self.simulate()
+            self._test_full(sparse=False)
+            checkpoint = glm.utils.checkpoint.load_checkpoint(self.train_args["checkpoint_path"])
+            assert checkpoint["step_complete"] == 1
+
+    def test_full_nb_resume(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_resume()")
+
+        from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+
+        def estimator():
+            input_data = InputDataGLM(
+                data=self.sim1.input_data.x,
+                design_loc=self.sim1.input_data.design_loc,
+                design_scale=self.sim1.input_data.design_scale,
+                as_dask=False
+            )
+            estim = Estimator(input_data=input_data, init_a="standard", init_b="standard")
+            estim.initialize()
+            return estim
+
+        def interrupt(record):
+            if record["iteration"] == 5:
+                raise KeyboardInterrupt()
+
+        reference = estimator()
+        reference.train_sequence(training_strategy="DEFAULT", nproc=1, callbacks=[])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint_path = os.path.join(tmp_dir, "checkpoint.npz")
+            interrupted = estimator()
+            try:
+                interrupted.train_sequence(
+                    training_strategy="DEFAULT",
+                    checkpoint_path=checkpoint_path,
+                    checkpoint_every=2,
+                    nproc=1,
+                    callbacks=[interrupt]
+                )
+            except KeyboardInterrupt:
+                pass
+            checkpoint = glm.utils.checkpoint.load_checkpoint(checkpoint_path)
+            assert checkpoint["step_complete"] == 0
+            assert checkpoint["iteration"] == 4
+            resumed = estimator()
+            recorder = glm.utils.telemetry.TrainingRecorder()
+            resumed.resume_sequence(
+                checkpoint_path=checkpoint_path,
+                training_strategy="DEFAULT",
+                checkpoint_every=2,
+                nproc=1,
+                callbacks=[recorder]
+            )
+        # Training continues after the checkpointed iteration:
+        assert recorder.records[0]["iteration"] == 5
+        assert np.all(resumed.model.a_var == reference.model.a_var)
+        assert np.all(resumed.model.b_var == reference.model.b_var)
+
+    def test_full_nb_pool_progress(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_pool_progress()")
+
+        from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+        input_data = InputDataGLM(
+            data=self.sim1.input_data.x,
+            design_loc=self.sim1.input_data.design_loc,
+            design_scale=self.sim1.input_data.design_scale,
+            as_dask=False
+        )
+        estimator = Estimator(input_data=input_data, init_a="standard", init_b="standard")
+        estimator.initialize()
+        with self.assertLogs("batchglm", level="DEBUG") as logs:
+            estimator.train_sequence(training_strategy="DEFAULT", nproc=2, callbacks=[])
+        # Scale model updates on the worker pool report progress after each chunk of features:
+        progress = [x for x in logs.output if "scale models in" in x and "/" in x]
+        n_features = self.sim1.input_data.num_features
+        assert len(progress) > 0
+        assert any(["fitted %i/%i" % (n_features, n_features) not in x for x in progress])
+
+    def test_full_nb_telemetry(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_telemetry()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        recorder = glm.utils.telemetry.TrainingRecorder()
+        stream = io.StringIO()
+        self.train_args = {"callbacks": [recorder, glm.utils.telemetry.ProgressPrinter(stream=stream)]}
+        self.simulate()
+        self._test_full(sparse=False)
+        assert len(recorder.records) > 0
+        assert np.all([x["time_wall"] >= x["time_wall_likelihood"] for x in recorder.records])
+        # Progress is reported through callbacks only, one line per iteration:
+        assert len(stream.getvalue().splitlines()) == len(recorder.records)
+
+    def test_full_nb_float32(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_float32()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.dtype = "float32"
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+
+    def test_full_nb_multi_scale(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_multi_scale()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.intercept_scale = False
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+
+    def test_full_nb_lstsq(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_lstsq()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.init_mode = "auto"
+        self.continuous_covariate = True
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+
+        # The continuous covariate makes "auto" choose the least squares init:
+        from batchglm.models.glm_nb.utils import init_par
+        input_data = self.sim1.input_data
+        init_auto = init_par(input_data=input_data, init_a="auto", init_b="auto", init_model=None)
+        init_lstsq = init_par(input_data=input_data, init_a="lstsq", init_b="lstsq", init_model=None)
+        init_standard = init_par(input_data=input_data, init_a="standard", init_b="standard", init_model=None)
+        assert np.all(init_auto[0] == init_lstsq[0]) and np.all(init_auto[1] == init_lstsq[1])
+        assert not np.all(init_lstsq[0] == init_standard[0])
+
+    def test_init_nb_lstsq_scale_intercept(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_init_nb_lstsq_scale_intercept()")
+
+        from batchglm.models.glm_nb import InputDataGLM
+        from batchglm.models.glm_nb.utils import init_par
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.continuous_covariate = True
+        self.simulate1()
+        x = self.sim1.input_data.x
+        design_loc = self.sim1.input_data.design_loc
+        covariate = self.sim1.sample_description[["covariate"]].values
+        ones = np.ones_like(covariate)
+
+        def init_b(design_scale, init):
+            input_data = InputDataGLM(data=x, design_loc=design_loc, design_scale=design_scale)
+            return init_par(input_data=input_data, init_a="lstsq", init_b=init, init_model=None)[1]
+
+        # The least squares scale init is written to the intercept, wherever it is in the scale model design:
+        init_intercept_first = init_b(design_scale=np.hstack([ones, covariate]), init="lstsq")
+        init_intercept_last = init_b(design_scale=np.hstack([covariate, ones]), init="lstsq")
+        assert np.all(init_intercept_first[1] == 0) and np.all(init_intercept_last[0] == 0)
+        assert np.all(init_intercept_first[0] == init_intercept_last[1])
+        # Scale models without intercept fall back to the standard init:
+        design_scale = patsy.dmatrix("~0+condition", self.sim1.sample_description)
+        assert np.all(init_b(design_scale=design_scale, init="lstsq") == init_b(design_scale=design_scale, init="standard"))
+
+    def test_full_nb_sparse_csc(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_sparse_csc()")
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.sparse_csc = True
+        self.simulate()
+        self._test_full(sparse=True)
+        x = np.asarray(self.sim1.input_data.x)
+        estimator = self._initialized_estimator(sparse=True)
+        input_data = estimator.input_data
+        # The copy in compressed sparse column format is built on first use:
+        assert input_data._x_csc is None
+        x_csc = input_data.x_csc
+        assert isinstance(x_csc, scipy.sparse.csc_matrix) and x_csc.has_sorted_indices
+        assert np.all(x_csc.toarray() == x)
+        # Features are fetched from the copy without densifying them, also after subsetting features:
+        for idx in [[3], [0, 4, 9]]:
+            x_j = estimator.model.x_j(j=idx)
+            assert isinstance(x_j, scipy.sparse.csc_matrix)
+            assert np.all(x_j.toarray() == x[:, idx])
+        input_data_subset = input_data.subset_features(idx=np.array([1, 2, 5]))
+        assert np.all(input_data_subset.fetch_x_features([1]).toarray() == x[:, [2]])
+        # Scale model updates on the copy equal updates on the blocks in compressed sparse row format:
+        idx = np.arange(self.sim1.input_data.num_features)
+        for method in ["brent", "newton"]:
+            steps = []
+            for sparse_csc in [False, True]:
+                input_data.sparse_csc = sparse_csc
+                input_data._x_csc = x_csc if sparse_csc else None
+                steps.append(estimator.b_step(
+                    idx_update=idx,
+                    method=method,
+                    ftol=1e-8,
+                    lr=None,
+                    max_iter=1000,
+                    nproc=1
+                ))
+            assert np.max(np.abs(steps[1] - steps[0])) < 1e-10, method
+
+    def test_full_nb_backed(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_backed()")
+
+        import anndata
+        import h5py
+        import zarr
+        from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+        x = np.asarray(self.sim1.input_data.x)
+        design_loc = np.asarray(self.sim1.input_data.design_loc)
+        design_scale = np.asarray(self.sim1.input_data.design_scale)
+
+        def fit(data):
+            input_data = InputDataGLM(
+                data=data,
+                design_loc=design_loc,
+                design_scale=design_scale,
+                chunk_size_cells=300,
+                chunk_size_genes=3
+            )
+            estimator = Estimator(input_data=input_data, init_a="standard", init_b="standard")
+            estimator.initialize()
+            # The default training strategy fits the scale model on a pool of worker processes:
+            estimator.train_sequence(training_strategy="DEFAULT")
+            return estimator
+
+        reference = fit(x)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with h5py.File(os.path.join(tmp_dir, "x.h5"), "w") as f:
+                f.create_dataset("x", data=x)
+            zarr.save_array(os.path.join(tmp_dir, "x.zarr"), x)
+            anndata.AnnData(X=scipy.sparse.csr_matrix(x)).write_h5ad(os.path.join(tmp_dir, "x.h5ad"))
+            with h5py.File(os.path.join(tmp_dir, "x.h5"), "r") as f:
+                backed = [
+                    f["x"],
+                    zarr.open_array(os.path.join(tmp_dir, "x.zarr"), mode="r"),
+                    anndata.read_h5ad(os.path.join(tmp_dir, "x.h5ad"), backed="r").X
+                ]
+                for data in backed:
+                    estimator = fit(data)
+                    assert np.max(np.abs(estimator.model.a_var - reference.model.a_var)) < 1e-4
+                    assert np.max(np.abs(estimator.model.b_var - reference.model.b_var)) < 1e-4
+
+    def test_full_nb_cache(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_cache()")
+
+        from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+        input_data = InputDataGLM(
+            data=self.sim1.input_data.x,
+            design_loc=self.sim1.input_data.design_loc,
+            design_scale=self.sim1.input_data.design_scale,
+            as_dask=False
+        )
+        model = Estimator(input_data=input_data, init_a="standard", init_b="standard").model
+        eta_loc = model.eta_loc
+        for j in range(input_data.num_features):
+            assert np.all(model.eta_loc_j(j=j) == eta_loc[:, [j]])
+        # Only the most recent subset of features is kept in addition to the values for all features:
+        assert len(model._cache) == 2
+
+    def test_full_nb_sharded(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_sharded()")
+
+        from batchglm.api.models.numpy.glm_nb import Estimator, InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+
+        def estimator():
+            input_data = InputDataGLM(
+                data=self.sim1.input_data.x,
+                design_loc=self.sim1.input_data.design_loc,
+                design_scale=self.sim1.input_data.design_scale,
+                as_dask=False
+            )
+            return Estimator(input_data=input_data, init_a="standard", init_b="standard")
+
+        reference = estimator()
+        reference.initialize()
+        reference.train_sequence(training_strategy="DEFAULT", nproc=1)
+        reference.finalize()
+        sharded = estimator()
+        sharded.initialize()
+        sharded.train_sharded(n_workers=2, shard_size=3, training_strategy="DEFAULT")
+        # Scale model updates are brought forward once all location models of a fit are converged, so that
+        # parameters agree up to the convergence tolerance of the scale model line search only:
+        assert np.max(np.abs(sharded.model.a_var - reference.model.a_var)) < 1e-6
+        assert np.max(np.abs(sharded.model.b_var - reference.model.b_var)) < 1e-4
+        assert np.max(np.abs(sharded.log_likelihood - reference.log_likelihood) /
+                      np.abs(reference.log_likelihood)) < 1e-9
+        assert np.max(np.abs(sharded.fisher_inv - reference.fisher_inv)) < 1e-6
+
+    def test_balance_shards(self):
+        logger.error("TestAccuracyGlmNb.test_balance_shards()")
+
+        from batchglm.train.numpy.base_glm.sharding import balance_shards
+
+        np.random.seed(1)
+        cost = np.random.exponential(1., [1000])
+        shards = balance_shards(cost=cost, n_shards=7)
+        assert len(shards) == 7
+        assert np.all(np.sort(np.concatenate(shards)) == np.arange(len(cost)))
+        shard_cost = np.array([np.sum(cost[idx]) for idx in shards])
+        # Shards are in order of decreasing cost and differ by at most the cost of one feature:
+        assert np.all(np.diff(shard_cost) <= 0)
+        assert shard_cost[0] - shard_cost[-1] <= np.max(cost)
+
+    def test_full_nb_feature_statistics(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNb.test_full_nb_feature_statistics()")
+
+        from batchglm.api.models.numpy.glm_nb import InputDataGLM
+
+        np.random.seed(1)
+        self.noise_model = "nb"
+        self.simulate()
+        x = np.asarray(self.sim1.input_data.x)
+        design_loc = np.asarray(self.sim1.input_data.design_loc)
+        grouping = np.unique(design_loc, axis=0, return_inverse=True)[1].flatten()
+        for data in [x, scipy.sparse.csr_matrix(x)]:
+            for as_dask in [False, True]:
+                input_data = InputDataGLM(
+                    data=data,
+                    design_loc=design_loc,
+                    design_scale=design_loc[:, [0]],
+                    chunk_size_cells=300,
+                    chunk_size_genes=3,
+                    as_dask=as_dask
+                )
+                stats = input_data.feature_statistics
+                assert np.allclose(stats["sum"], np.sum(x, axis=0))
+                assert np.allclose(stats["var"], np.var(x, axis=0))
+                assert np.all(stats["nnz"] == np.sum(x != 0, axis=0))
+                assert np.all(stats["max"] == np.max(x, axis=0))
+                stats_by_group = input_data.feature_statistics_by_group(grouping)
+                assert np.allclose(stats_by_group["mean"][1], np.mean(x[grouping == 1], axis=0))
+                # The single group of all observations is taken from feature_statistics:
+                stats_all = input_data.feature_statistics_by_group(np.zeros([x.shape[0]], dtype=int))
+                assert np.allclose(stats_all["sum_sq"][0], stats["sum_sq"])
+
+
+class TestAccuracyGlmNorm(
+    _TestAccuracyGlmAll,
+    unittest.TestCase
+):
+    """
+    Test whether optimizers yield exact results for normal distributed data.
+    """
+
+    def test_full_norm(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNorm.test_full_norm()")
+
+        np.random.seed(1)
+        self.noise_model = "norm"
+        self.simulate()
+        self._test_full(sparse=False)
+        self._test_full(sparse=True)
+
+    def test_full_norm_grouped_statistics(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmNorm.test_full_norm_grouped_statistics()")
+
+        np.random.seed(1)
+        self.noise_model = "norm"
+        self.simulate()
+        # Count histograms and grouped statistics are only available for count data:
+        for train_args in [{"count_histogram": True}, {"grouped_statistics": True}]:
+            self.train_args = train_args
+            with self.assertRaises(ValueError):
+                self._test_full_a_and_b(sparse=False)
+
+
+class TestAccuracyGlmBeta(
+    _TestAccuracyGlmAll,
+    unittest.TestCase
+):
+    """
+    Test whether optimizers yield exact results for beta distributed data.
+    """
+
+    def test_full_beta(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmBeta.test_full_beta()")
+
+        np.random.seed(1)
+        self.noise_model = "beta"
+        self.simulate()
+        # Beta distributed data have no zero entries, sparse data are not supported.
+        self._test_full(sparse=False)
+
+    def test_full_beta_grouped_statistics(self):
+        logging.getLogger("batchglm").setLevel(logging.INFO)
+        logger.error("TestAccuracyGlmBeta.test_full_beta_grouped_statistics()")
+
+        np.random.seed(1)
+        self.noise_model = "beta"
+        self.simulate()
+        # Count histograms and grouped statistics are only available for count data:
+        for train_args in [{"count_histogram": True}, {"grouped_statistics": True}]:
+            self.train_args = train_args
+            with self.assertRaises(ValueError):
+                self._test_full_a_and_b(sparse=False)
+
 
 if __name__ == '__main__':
     unittest.main()
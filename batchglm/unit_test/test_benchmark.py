@@ -0,0 +1,57 @@
+import logging
+import os
+import tempfile
+import unittest
+
+import batchglm.api as glm
+from batchglm.benchmark import benchmark_cases, compare_results, read_results, run_benchmarks, run_case
+
+glm.setup_logging(verbosity="WARNING", stream="STDOUT")
+logger = logging.getLogger(__name__)
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Smoke test of benchmark runs and result files.
+    """
+
+    def test_grids(self):
+        logger.error("TestBenchmark.test_grids()")
+
+        for grid in ["quick", "full"]:
+            cases = benchmark_cases(grid=grid)
+            assert len(cases) > 0
+            # Zeros are not in the support of the beta distribution:
+            assert not any([x["noise_model"] == "beta" and x["sparsity"] > 0 for x in cases])
+
+    def test_run(self):
+        logger.error("TestBenchmark.test_run()")
+
+        cases = benchmark_cases(
+            grid="quick",
+            backend=["numpy"],
+            n_obs=[200],
+            n_features=[5],
+            sparsity=[0.]
+        )
+        assert len(cases) == 1
+        result = run_case(cases[0])
+        assert result["status"] == "ok", result.get("error")
+        assert result["n_iterations"] > 0
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "results.json")
+            document = run_benchmarks(cases=cases, isolate=False, path=path)
+            baseline = read_results(path)
+        assert baseline["results"][0]["case_id"] == result["case_id"]
+        assert baseline["results"][0]["status"] == "ok"
+        assert compare_results(baseline=baseline, current=document) == []
+        # A slower run of the same case is reported as regression:
+        slower = dict(document)
+        slower["results"] = [dict(document["results"][0], time_train=2. * document["results"][0]["time_train"])]
+        regressions = compare_results(baseline=baseline, current=slower, tolerance=0.5)
+        assert [x[:2] for x in regressions] == [(result["case_id"], "time_train")]
+
+
+if __name__ == '__main__':
+    unittest.main()
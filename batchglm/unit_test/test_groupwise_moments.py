@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+import scipy.sparse
+import unittest
+
+import batchglm.api as glm
+
+glm.setup_logging(verbosity="WARNING", stream="STDOUT")
+logger = logging.getLogger(__name__)
+
+
+class TestGroupwiseMoments(unittest.TestCase):
+    """
+    Test group-wise moments of the closed-form initialisations against per-group numpy reductions.
+    """
+
+    def _data(self):
+        np.random.seed(1)
+        x = np.random.poisson(2, [1000, 7]).astype(np.float64)
+        x[np.random.uniform(0, 1, x.shape) < 0.5] = 0
+        grouping = np.random.randint(0, 4, [1000])
+        size_factors = np.random.uniform(0.5, 2, [1000, 1])
+        return x, grouping, size_factors
+
+    def _reference(self, x, grouping, size_factors):
+        if size_factors is not None:
+            x = x / size_factors
+        groups = np.arange(np.max(grouping) + 1)
+        group_size = np.array([np.sum(grouping == g) for g in groups])
+        sums = np.stack([np.sum(x[grouping == g], axis=0) for g in groups])
+        sums_sq = np.stack([np.sum(np.square(x[grouping == g]), axis=0) for g in groups])
+        return group_size, sums, sums_sq
+
+    def test_groupwise_moments(self):
+        logger.error("TestGroupwiseMoments.test_groupwise_moments()")
+
+        import dask.array
+        from batchglm.models.base_glm.utils import groupwise_moments
+
+        x, grouping, size_factors = self._data()
+        inputs = {
+            "dense": x,
+            "csr": scipy.sparse.csr_matrix(x),
+            "dask": dask.array.from_array(x, chunks=(300, 3)),
+            "dask_csr": dask.array.from_array(
+                scipy.sparse.csr_matrix(x),
+                chunks=(300, 3),
+                asarray=False,
+                fancy=False
+            )
+        }
+        for sf in [None, size_factors]:
+            reference = self._reference(x=x, grouping=grouping, size_factors=sf)
+            for name, x_input in inputs.items():
+                moments = groupwise_moments(x=x_input, grouping=grouping, size_factors=sf)
+                for value, value_ref in zip(moments, reference):
+                    assert value.shape == value_ref.shape, name
+                    assert np.max(np.abs(value - value_ref)) < 1e-10, name
+
+    def test_groupwise_moments_cached(self):
+        logger.error("TestGroupwiseMoments.test_groupwise_moments_cached()")
+
+        from batchglm.models.base_glm.utils import _groupwise_moments_cached
+
+        x, grouping, size_factors = self._data()
+        cache = {}
+        fine = _groupwise_moments_cached(x=x, grouping=grouping, size_factors=size_factors, moments=cache)
+        assert len(cache) == 1
+        # Coarser groupings are merged from the cached grouping without a pass over the data:
+        for grouping_coarse in [grouping // 2, np.zeros_like(grouping)]:
+            coarse = _groupwise_moments_cached(x=None, grouping=grouping_coarse, size_factors=None, moments=cache)
+            reference = self._reference(x=x, grouping=grouping_coarse, size_factors=size_factors)
+            for value, value_ref in zip(coarse, reference):
+                assert value.shape == value_ref.shape
+                assert np.max(np.abs(value - value_ref)) < 1e-10
+        assert len(cache) == 3
+        # Groupings are kept in compact form, the single group of all observations without group indices:
+        assert all([v[0] is None or v[0].dtype == np.uint8 for v in cache.values()])
+        assert sum([v[0] is None for v in cache.values()]) == 1
+        # Repeated calls return the cached moments:
+        fine_cached = _groupwise_moments_cached(x=None, grouping=grouping, size_factors=None, moments=cache)
+        assert all(np.all(a == b) for a, b in zip(fine, fine_cached))
+
+
+    def test_groupwise_moments_feature_statistics(self):
+        logger.error("TestGroupwiseMoments.test_groupwise_moments_feature_statistics()")
+
+        from batchglm.api.models.numpy.glm_nb import InputDataGLM
+        from batchglm.models.base_glm.utils import _groupwise_moments_cached
+
+        x, _, _ = self._data()
+        input_data = InputDataGLM(
+            data=x,
+            design_loc=np.ones([x.shape[0], 1]),
+            design_scale=np.ones([x.shape[0], 1]),
+            as_dask=False
+        )
+        assert len(input_data.groupwise_moments) == 0
+        _ = input_data.feature_statistics
+        # The single group of all observations is taken from the feature statistics without a pass over the data:
+        group_size, sums, sums_sq = _groupwise_moments_cached(
+            x=None,
+            grouping=np.zeros([x.shape[0]], dtype=int),
+            size_factors=None,
+            moments=input_data.groupwise_moments
+        )
+        reference = self._reference(x=x, grouping=np.zeros([x.shape[0]], dtype=int), size_factors=None)
+        for value, value_ref in zip((group_size, sums, sums_sq), reference):
+            assert np.max(np.abs(value - value_ref)) < 1e-10
+        assert len(input_data.groupwise_moments) == 1
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import logging
+import numpy as np
+import unittest
+
+import batchglm.api as glm
+
+glm.setup_logging(verbosity="WARNING", stream="STDOUT")
+logger = logging.getLogger(__name__)
+
+
+class TestNormalEquations(unittest.TestCase):
+    """
+    Test precision of the assembly of normal equations.
+    """
+
+    def test_single_precision_weights(self):
+        logger.error("TestNormalEquations.test_single_precision_weights()")
+
+        from batchglm.utils.linalg import batched_xtwx, batched_xtwy
+
+        np.random.seed(1)
+        n_obs = 1000000
+        xh = np.concatenate([np.ones([n_obs, 1]), np.random.uniform(0, 1, [n_obs, 1])], axis=1)
+        w = np.random.uniform(1, 100, [n_obs, 3]).astype(np.float32)
+        y = np.random.uniform(1, 100, [n_obs, 3]).astype(np.float32)
+        # Reference in double precision on the same single precision inputs:
+        w64 = w.astype(np.float64)
+        xtwx_ref = np.stack([np.matmul(xh.T * w64[:, f], xh) for f in range(w.shape[1])])
+        xtwy_ref = np.matmul((w64 * y.astype(np.float64)).T, xh)
+
+        xtwx = batched_xtwx(xh_a=xh, w=w)
+        xtwy = batched_xtwy(xh=xh, w=w, y=y)
+        assert xtwx.dtype == np.float64 and xtwy.dtype == np.float64
+        assert np.max(np.abs(xtwx - xtwx_ref) / np.abs(xtwx_ref)) < 1e-12
+        assert np.max(np.abs(xtwy - xtwy_ref) / np.abs(xtwy_ref)) < 1e-12
+
+
+if __name__ == '__main__':
+    unittest.main()
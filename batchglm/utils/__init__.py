@@ -0,0 +1,3 @@
+from . import checkpoint
+from . import linalg
+from . import telemetry
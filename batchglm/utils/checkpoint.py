@@ -0,0 +1,36 @@
+import numpy as np
+import os
+
+
+def save_checkpoint(
+        path: str,
+        state: dict
+):
+    """
+    Write training state to a numpy .npz archive.
+
+    The archive is first written to a temporary file next to path and then moved to path, so that an interrupted
+    write never replaces the last complete checkpoint.
+
+    :param path: File to write to.
+    :param state: Dictionary of arrays and scalars.
+    """
+    path_tmp = path + ".tmp"
+    with open(path_tmp, "wb") as f:
+        np.savez(f, **dict([(k, np.asarray(v)) for k, v in state.items() if v is not None]))
+    os.replace(path_tmp, path)
+
+
+def load_checkpoint(
+        path: str
+) -> dict:
+    """
+    Read training state written by save_checkpoint().
+
+    Zero-dimensional arrays are returned as python scalars.
+
+    :param path: File to read from.
+    :return: Dictionary of arrays and scalars.
+    """
+    with np.load(path, allow_pickle=False) as f:
+        return dict([(k, f[k].item() if f[k].ndim == 0 else f[k]) for k in f.files])
@@ -3,6 +3,8 @@ import numpy as np
 
 import logging
 
+from batchglm import pkg_constants
+
 logger = logging.getLogger("batchglm")
 
 
@@ -33,6 +35,184 @@ def stacked_lstsq(L, b, rcond=1e-10):
     return np.conj(x, out=x)
 
 
+def _block_size_observations(memory_budget, n_columns, dtype):
+    if memory_budget is None:
+        memory_budget = pkg_constants.NORMAL_EQUATIONS_MEMORY_BUDGET
+    return int(max(1, memory_budget // (np.dtype(dtype).itemsize * max(n_columns, 1))))
+
+
+def batched_xtwx(xh_a, w, xh_b=None, memory_budget=None):
+    r"""
+    Assemble the weighted cross-products `X_a^T diag(w_f) X_b` of two design matrices for all features `f` at once.
+
+    This is computed as a single matrix product of the feature weights with the row-wise Khatri-Rao product of the
+    design matrices, `w^T (X_a * X_b)`. For dense weights, this is blocked over observations so that the
+    Khatri-Rao product of one block of observations fits into memory_budget. Peak memory is therefore
+    O(observations x P x Q + features x P x Q) instead of O(features x observations x P) for a broadcasted product.
+    Products of blocks are computed and accumulated in at least double precision, single precision weights are cast
+    block by block.
+
+    :param xh_a: design matrix of shape (observations, P)
+    :param w: weights of shape (observations, features)
+    :param xh_b: design matrix of shape (observations, Q), defaults to xh_a
+    :param memory_budget: Memory in bytes available to the Khatri-Rao product of one block of observations.
+        Defaults to pkg_constants.NORMAL_EQUATIONS_MEMORY_BUDGET.
+    :return: tensor of shape (features, P, Q), a dask array if w is a dask array
+    """
+    if xh_b is None:
+        xh_b = xh_a
+    if isinstance(xh_a, dask.array.core.Array):
+        xh_a = xh_a.compute()
+    if isinstance(xh_b, dask.array.core.Array):
+        xh_b = xh_b.compute()
+    xh_a = np.asarray(xh_a)
+    xh_b = np.asarray(xh_b)
+    n_obs, p = xh_a.shape
+    q = xh_b.shape[1]
+    n_features = w.shape[1]
+
+    def khatri_rao(start, end):
+        return np.reshape(np.einsum('op,oq->opq', xh_a[start:end], xh_b[start:end]), [end - start, p * q])
+
+    if isinstance(w, dask.array.core.Array):
+        kr = khatri_rao(0, n_obs).astype(np.result_type(xh_a, xh_b, w, np.float64), copy=False)
+        kr = dask.array.from_array(kr, chunks=(w.chunks[0], (p * q,)))
+        return dask.array.matmul(w.T, kr).reshape((n_features, p, q))
+    else:
+        w = np.asarray(w)
+        dtype = np.result_type(xh_a, xh_b, w, np.float64)
+        # The budget also covers the cast copy of a block of weights if these are of lower precision:
+        n_columns = p * q + (n_features if w.dtype != dtype else 0)
+        block_size = _block_size_observations(memory_budget=memory_budget, n_columns=n_columns, dtype=dtype)
+        xtwx = np.zeros([n_features, p * q], dtype=dtype)
+        for start in range(0, n_obs, block_size):
+            end = min(start + block_size, n_obs)
+            xtwx += np.matmul(
+                w[start:end].T.astype(dtype, copy=False),
+                khatri_rao(start, end).astype(dtype, copy=False)
+            )
+        return np.reshape(xtwx, [n_features, p, q])
+
+
+def batched_xtwy(xh, w, y=None, memory_budget=None):
+    r"""
+    Assemble the weighted cross-products `X^T diag(w_f) y_f` of a design matrix for all features `f` at once.
+
+    This is computed as matrix product `(w y)^T X`, blocked over observations for dense inputs.
+    Products of blocks are computed and accumulated in at least double precision, single precision weights and
+    responses are cast block by block.
+
+    :param xh: design matrix of shape (observations, P)
+    :param w: weights of shape (observations, features)
+    :param y: response of shape (observations, features), taken to be one if not supplied
+    :param memory_budget: Memory in bytes available to the elementwise product of weights and response of one block
+        of observations. Defaults to pkg_constants.NORMAL_EQUATIONS_MEMORY_BUDGET.
+    :return: tensor of shape (features, P), a dask array if w or y are dask arrays
+    """
+    if isinstance(xh, dask.array.core.Array):
+        xh = xh.compute()
+    xh = np.asarray(xh)
+    if isinstance(w, dask.array.core.Array) or isinstance(y, dask.array.core.Array):
+        wy = w if y is None else w * y
+        return dask.array.matmul(wy.T, xh.astype(np.result_type(xh, wy, np.float64), copy=False))
+    else:
+        w = np.asarray(w)
+        y = np.asarray(y) if y is not None else None
+        n_obs = xh.shape[0]
+        dtype = np.result_type(xh, w, np.float64)
+        block_size = _block_size_observations(memory_budget=memory_budget, n_columns=w.shape[1], dtype=dtype)
+        xtwy = np.zeros([w.shape[1], xh.shape[1]], dtype=dtype)
+        for start in range(0, n_obs, block_size):
+            end = min(start + block_size, n_obs)
+            wy = w[start:end].astype(dtype, copy=False)
+            if y is not None:
+                wy = wy * y[start:end]
+            xtwy += np.matmul(wy.T, xh[start:end].astype(dtype, copy=False))
+        return xtwy
+
+
+# Status codes of batched_spd_solve() by problem:
+SPD_SOLVE_CHOLESKY = 0  # solved via Cholesky factorization
+SPD_SOLVE_PINV = 1  # factorization failed, solved via pseudo-inverse
+SPD_SOLVE_FAILED = 2  # no finite solution found, solution set to zero
+
+
+def batched_cholesky(a, rcond=None):
+    r"""
+    Cholesky factorization of a stack of symmetric positive definite matrices.
+
+    In contrast to `np.linalg.cholesky`, this does not fail for the whole stack if one matrix is not
+    positive definite but reports success by matrix. The factorization is vectorized over the stack
+    and loops over the (usually small) matrix dimension.
+
+    :param a: tensor of shape (..., K, K)
+    :param rcond: Pivots smaller than rcond times the largest diagonal element of a matrix are considered singular.
+        Defaults to K times the machine precision of the data type of a.
+    :return: tuple (L, success) of the lower triangular factor of shape (..., K, K) and
+        a boolean tensor of shape (...) that indicates whether a matrix was positive definite.
+    """
+    k = a.shape[-1]
+    if rcond is None:
+        rcond = k * np.finfo(a.dtype).eps
+    l = np.zeros_like(a)
+    tol = rcond * np.max(np.diagonal(a, axis1=-2, axis2=-1), axis=-1)
+    success = np.isfinite(tol)
+    for j in range(k):
+        d = a[..., j, j] - np.sum(np.square(l[..., j, :j]), axis=-1)
+        success = np.logical_and(success, d > tol)
+        l[..., j, j] = np.sqrt(np.where(success, d, 1.))
+        l[..., (j + 1):, j] = (a[..., (j + 1):, j] - np.einsum(
+            '...ik,...k->...i',
+            l[..., (j + 1):, :j],
+            l[..., j, :j]
+        )) / l[..., j, j][..., None]
+    return l, success
+
+
+def batched_spd_solve(a, b, rcond=1e-10):
+    r"""
+    Solve `ax = b` for a stack of symmetric positive definite matrices `a`.
+
+    All problems are solved via a batched Cholesky factorization. Only problems for which the factorization fails
+    are solved via a pseudo-inverse instead, see `stacked_lstsq`.
+
+    :param a: tensor of shape (..., K, K)
+    :param b: tensor of shape (..., K) or (..., K, N)
+    :param rcond: threshold for inverse of pseudo-inverse fallback
+    :return: tuple (x, status) of the solution with the shape of b and an integer tensor of shape (...) with
+        the status of each problem: SPD_SOLVE_CHOLESKY, SPD_SOLVE_PINV or SPD_SOLVE_FAILED.
+    """
+    vector = b.ndim == a.ndim - 1
+    if vector:
+        b = b[..., None]
+    l, success = batched_cholesky(a)
+    # Forward substitution for l y = b, then backward substitution for l^T x = y:
+    k = a.shape[-1]
+    y = np.zeros(np.broadcast_shapes(a.shape[:-2], b.shape[:-2]) + b.shape[-2:], dtype=np.result_type(a, b))
+    for i in range(k):
+        y[..., i, :] = (b[..., i, :] - np.einsum('...k,...kn->...n', l[..., i, :i], y[..., :i, :])) / \
+            l[..., i, i][..., None]
+    x = np.zeros_like(y)
+    for i in reversed(range(k)):
+        x[..., i, :] = (y[..., i, :] - np.einsum('...k,...kn->...n', l[..., (i + 1):, i], x[..., (i + 1):, :])) / \
+            l[..., i, i][..., None]
+
+    status = np.where(success, SPD_SOLVE_CHOLESKY, SPD_SOLVE_PINV).astype(np.int8)
+    finite = np.logical_and(
+        np.all(np.isfinite(a), axis=(-2, -1)),
+        np.all(np.isfinite(b), axis=(-2, -1))
+    )
+    idx_fallback = np.where(np.logical_and(np.logical_not(success), finite))
+    if len(idx_fallback[0]) > 0:
+        x[idx_fallback] = stacked_lstsq(a[idx_fallback], b[idx_fallback], rcond=rcond)
+    failed = np.logical_not(np.all(np.isfinite(x), axis=(-2, -1)))
+    x[failed] = 0.
+    status[failed] = SPD_SOLVE_FAILED
+    if vector:
+        x = x[..., 0]
+    return x, status
+
+
 def groupwise_solve_lm(
         dmat,
         apply_fun: callable,
@@ -0,0 +1,191 @@
+import contextlib
+import csv
+import json
+import numpy as np
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PHASES = ["location_update", "scale_update", "likelihood", "reduction", "solve"]
+
+
+def peak_memory() -> int:
+    """
+    Peak resident memory of this process in bytes, None if not available on this platform.
+
+    Memory of worker processes is not included.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on linux and in bytes on macOS.
+    return int(max_rss) if sys.platform == "darwin" else int(max_rss) * 1024
+
+
+class PhaseTimer:
+    """
+    Wall and CPU time by phase of a training iteration.
+
+    Phases can be nested, times are exclusive: While a nested phase runs, time is not counted towards the
+    enclosing phase. CPU time is measured for this process only, time spent in worker processes is not counted.
+
+        timer = PhaseTimer()
+        with timer.phase("location_update"):
+            with timer.phase("solve"):
+                ...
+        timer.record()  # {"time_wall_location_update": ..., "time_cpu_location_update": ..., ...}
+    """
+
+    def __init__(self):
+        self.wall = dict([(x, 0.) for x in PHASES])
+        self.cpu = dict([(x, 0.) for x in PHASES])
+        self._stack = []
+        self._t_wall = None
+        self._t_cpu = None
+
+    def _charge(self):
+        t_wall = time.perf_counter()
+        t_cpu = time.process_time()
+        if len(self._stack) > 0:
+            name = self._stack[-1]
+            self.wall[name] = self.wall.get(name, 0.) + t_wall - self._t_wall
+            self.cpu[name] = self.cpu.get(name, 0.) + t_cpu - self._t_cpu
+        self._t_wall = t_wall
+        self._t_cpu = t_cpu
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        self._charge()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._charge()
+            self._stack.pop()
+
+    def reset(self):
+        """
+        Set all times to zero, phases that are running continue to be timed.
+        """
+        self.wall = dict([(x, 0.) for x in PHASES])
+        self.cpu = dict([(x, 0.) for x in PHASES])
+
+    def record(self) -> dict:
+        """
+        Times by phase as flat dictionary with keys time_wall_<phase> and time_cpu_<phase> in seconds.
+        """
+        record = {}
+        for name in self.wall.keys():
+            record["time_wall_" + name] = self.wall[name]
+            record["time_cpu_" + name] = self.cpu[name]
+        return record
+
+
+def iteration_record(
+        iteration: int,
+        timer: PhaseTimer,
+        time_wall: float,
+        time_cpu: float,
+        **kwargs
+) -> dict:
+    """
+    Telemetry record of a training iteration as passed to training callbacks.
+
+    Records are flat dictionaries with the keys:
+
+        - "timestamp": time at the end of the iteration in seconds since the epoch.
+        - "iteration": iteration counter of the training step.
+        - "time_wall", "time_cpu": total wall and CPU time of the iteration in seconds.
+        - "time_wall_<phase>", "time_cpu_<phase>": wall and CPU time by phase in seconds, see PhaseTimer.
+        - "peak_memory": peak resident memory of the training process in bytes so far, see peak_memory().
+        - backend-specific counters passed as kwargs, such as the log-likelihood, the number of active features,
+          the number of reverted updates and the number of singular linear systems.
+
+    :param iteration: Iteration counter.
+    :param timer: Timer of the phases of the iteration.
+    :param time_wall: Wall time of the iteration in seconds.
+    :param time_cpu: CPU time of the iteration in seconds.
+    :return: Record.
+    """
+    record = {
+        "timestamp": time.time(),
+        "iteration": iteration,
+        "time_wall": time_wall,
+        "time_cpu": time_cpu
+    }
+    record.update(timer.record())
+    record["peak_memory"] = peak_memory()
+    for k, v in kwargs.items():
+        record[k] = v.item() if isinstance(v, np.generic) else v
+    return record
+
+
+class TrainingRecorder:
+    """
+    Training callback that keeps telemetry records of all iterations.
+
+    Pass an instance as callback to train() or train_sequence():
+
+        recorder = TrainingRecorder()
+        estimator.train_sequence(training_strategy="DEFAULT", callbacks=[recorder])
+        recorder.to_csv("telemetry.csv")
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record: dict):
+        self.records.append(record)
+
+    def to_json(self, path: str):
+        """
+        Write records to a JSON file as list of objects.
+        """
+        with open(path, "w") as f:
+            json.dump(self.records, f, indent=1)
+
+    def to_csv(self, path: str):
+        """
+        Write records to a CSV file with one row per record.
+
+        Columns are the union of the keys of all records, missing values are left empty.
+        """
+        columns = []
+        for record in self.records:
+            columns.extend([k for k in record.keys() if k not in columns])
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+
+class ProgressPrinter:
+    """
+    Training callback that writes one line of progress per iteration, this is the default callback of train().
+
+    Pass an instance together with other callbacks to keep the progress output:
+
+        estimator.train_sequence(training_strategy="DEFAULT", callbacks=[ProgressPrinter(), TrainingRecorder()])
+    """
+
+    def __init__(self, stream=None):
+        """
+        :param stream: Text stream to write to, sys.stdout at the time of writing if None.
+        """
+        self.stream = stream
+
+    def __call__(self, record: dict):
+        stream = self.stream if self.stream is not None else sys.stdout
+        stream.write("iter %3i: ll=%f, converged: %.2f%% (loc: %.2f%%, scale update: %s), in %.2fsec\n" % (
+            record["iteration"],
+            record.get("ll", np.nan),
+            record.get("converged", np.nan) * 100,
+            record.get("converged_loc", np.nan) * 100,
+            str(record.get("scale_update", False)),
+            record["time_wall"]
+        ))
+        stream.flush()